@@ -2,16 +2,27 @@ import discord
 from discord.ext import commands, tasks
 import asyncio
 import os
+import signal
 from dotenv import load_dotenv
 import logging
 import google.generativeai as genai
 
-from utils.db import db_manager
-
+# Load .env before importing modules that read their settings at import time
 load_dotenv()
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
+from utils.log import bind_command, log_command, setup_logging
+
+# Before the other imports, so records they log at import time are queued too
+setup_logging()
+
+from utils.db import db_manager
+from utils.dispatcher import dispatcher
+from utils.join_writer import join_writer
+from utils.names import member_cache_options, name_resolver
+from utils.scheduler import SchedulerBusy, scheduler
+from utils.throttle import Throttled, throttle
+from utils.watchdog import install_event_loop, watchdog
+
 logger = logging.getLogger(__name__)
 
 # Bot setup
@@ -19,8 +30,60 @@ intents = discord.Intents.default()
 intents.message_content = True
 intents.guilds = True
 intents.members = True 
-bot = commands.Bot(command_prefix='!', intents=intents)
+
+
+class AccountabilityBot(commands.Bot):
+    async def setup_hook(self):
+        """Shut down cleanly on SIGTERM (`docker stop`), not just Ctrl+C"""
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, lambda: asyncio.create_task(self.close()))
+        except NotImplementedError:
+            # No signal handlers on Windows event loops
+            pass
+
+    async def invoke(self, ctx):
+        """Tag log records from this command's task with its guild, name and elapsed time, and free its scheduler slot"""
+        if ctx.command is not None:
+            bind_command(ctx.guild.id if ctx.guild else None, ctx.command.qualified_name)
+        if isinstance(ctx.author, discord.Member):
+            # Keeps stored names current even when member updates aren't delivered (lean member cache)
+            name_resolver.note(ctx.author)
+        try:
+            await super().invoke(ctx)
+        finally:
+            # A subcommand that fails its checks never reaches the after-invoke hook
+            scheduler.finish(ctx)
+
+    async def close(self):
+        """Flush background writers before the connection goes away"""
+        await watchdog.stop()
+        await join_writer.stop()
+        await name_resolver.stop()
+        await dispatcher.drain()
+        await super().close()
+        await db_manager.save_warm_state()
+        await db_manager.close()
+
+
+bot = AccountabilityBot(command_prefix='!', intents=intents, **member_cache_options(intents))
 bot.remove_command('help')
+bot.add_check(throttle.check)
+
+
+@bot.before_invoke
+async def before_command(ctx):
+    """Wait for the guild's fair share of command slots"""
+    if log_command.get() is None:
+        # Slash invocations of hybrid commands don't pass through Bot.invoke
+        bind_command(ctx.guild.id if ctx.guild else None, ctx.command.qualified_name)
+    await scheduler.before_invoke(ctx)
+
+
+@bot.after_invoke
+async def after_command(ctx):
+    """Free the command's slot and log its completion with its latency"""
+    await scheduler.after_invoke(ctx)
+    logger.info("Finished command %s", ctx.command.qualified_name)
 
 
 async def init_default_categories(guild_id: int):
@@ -40,11 +103,15 @@ async def init_default_categories(guild_id: int):
                 'INSERT INTO categories (guild_id, name, description) VALUES ($1, $2, $3) ON CONFLICT (guild_id, name) DO NOTHING',
                 guild_id, name, description
             )
+    await db_manager.invalidate_categories(guild_id)
 
 @bot.event
 async def on_ready():
-    logger.info(f'{bot.user} is now online!')
+    logger.info('%s is now online!', bot.user)
     await db_manager.init_db()
+    watchdog.start()
+    join_writer.start()
+    name_resolver.start()
 
     if os.getenv("GEMINI_API_KEY"):
         genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
@@ -55,16 +122,17 @@ async def on_ready():
     # Initialize default categories and ensure all members are in the DB
     for guild in bot.guilds:
         await init_default_categories(guild.id)
-        for member in guild.members:
-            if not member.bot:
-                await db_manager.ensure_user_exists(member.id, guild.id)
+        await db_manager.ensure_users_exist(
+            (guild.id, member.id) for member in guild.members if not member.bot
+        )
+        name_resolver.note_many(guild.members)
     logger.info("Finished ensuring all existing members are in the database.")
     
     # Load cogs
     for filename in os.listdir('./cogs'):
         if filename.endswith('.py'):
             await bot.load_extension(f'cogs.{filename[:-3]}')
-            logger.info(f"Loaded cog: {filename}")
+            logger.info("Loaded cog: %s", filename)
 
     # Sync slash commands
     await bot.tree.sync()
@@ -81,15 +149,42 @@ async def on_guild_join(guild):
 async def on_member_join(member):
     """Adds a user to the database when they join a guild."""
     if not member.bot:
-        await db_manager.ensure_user_exists(member.id, member.guild.id)
-        logger.info(f"Added new member '{member.display_name}' to the database.")
+        await join_writer.enqueue(member.guild.id, member.id)
+        name_resolver.note(member)
+
+
+@bot.event
+async def on_member_update(before, after):
+    """Keep the stored display name current when a nickname changes"""
+    if before.display_name != after.display_name:
+        name_resolver.note(after)
+
+
+@bot.event
+async def on_user_update(before, after):
+    """A global name change renames the user in every server where they have no nickname"""
+    if before.display_name != after.display_name:
+        for guild in after.mutual_guilds:
+            member = guild.get_member(after.id)
+            if member is not None:
+                name_resolver.note(member)
 
 
 @bot.event
 async def on_command_error(ctx, error):
     """Handle command errors"""
+    if isinstance(error, commands.HybridCommandError):
+        error = error.original
     if isinstance(error, commands.CommandNotFound):
         return
+    elif isinstance(error, Throttled):
+        who = "This server is" if error.scope == 'guild' else "You're"
+        await ctx.send(
+            f"⏳ {who} using this command too often. Try again in {max(1, round(error.retry_after))}s.",
+            ephemeral=True
+        )
+    elif isinstance(error, SchedulerBusy):
+        await ctx.send("⏳ This server has too many commands waiting. Try again in a moment.", ephemeral=True)
     elif isinstance(error, commands.MissingRequiredArgument):
         await ctx.send(f"❌ Missing required argument: {error.param.name}")
     elif isinstance(error, commands.BadArgument):
@@ -97,9 +192,11 @@ async def on_command_error(ctx, error):
     elif isinstance(error, commands.MissingPermissions):
         await ctx.send("❌ You do not have the required permissions to run this command.")
     else:
-        logger.error(f"Unhandled error in command {ctx.command}: {error}")
+        logger.error("Unhandled error in command %s: %s", ctx.command, error)
         await ctx.send("❌ An unexpected error occurred. Please check the logs.")
 
 
 if __name__ == "__main__":
-    bot.run(os.getenv('DISCORD_BOT_TOKEN'))
\ No newline at end of file
+    install_event_loop()
+    # Logging is already set up; stop discord.py from adding its own root handler
+    bot.run(os.getenv('DISCORD_BOT_TOKEN'), log_handler=None)
\ No newline at end of file
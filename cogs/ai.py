@@ -105,7 +105,7 @@ class AICog(commands.Cog, name="AI"):
             await ctx.send(embed=embed)
             
         except Exception as e:
-            logger.error(f"Error in summarization: {e}")
+            logger.error("Error in summarization: %s", e)
             await ctx.send("❌ Error occurred while generating summary")
 
 async def setup(bot):
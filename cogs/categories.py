@@ -30,6 +30,7 @@ class CategoriesCog(commands.Cog, name="Categories"):
                         'INSERT INTO categories (guild_id, name, description) VALUES ($1, $2, $3)',
                         ctx.guild.id, name, description
                     )
+                    await db_manager.invalidate_categories(ctx.guild.id)
                     await ctx.send(f"✅ Category '{name}' created successfully!")
                 except Exception as e:
                     if 'unique constraint' in str(e).lower():
@@ -71,6 +72,7 @@ class CategoriesCog(commands.Cog, name="Categories"):
                     'DELETE FROM categories WHERE id = $1',
                     category['id']
                 )
+                await db_manager.invalidate_categories(ctx.guild.id)
                 
                 await ctx.send(f"✅ Category '{category_name}' removed successfully!")
         
@@ -80,11 +82,7 @@ class CategoriesCog(commands.Cog, name="Categories"):
     @commands.command(name='categories')
     async def list_categories(self, ctx):
         """List all available challenge categories"""
-        async with db_manager.db_pool.acquire() as conn:
-            categories = await conn.fetch(
-                'SELECT name, description FROM categories WHERE guild_id = $1 ORDER BY name',
-                ctx.guild.id
-            )
+        categories = (await db_manager.get_categories(ctx.guild.id)).rows
         
         if not categories:
             await ctx.send("No categories found. Use `!category add <name> [description]` to create one.")
@@ -1,17 +1,31 @@
 import discord
+from discord import app_commands
 from discord.ext import commands
 from datetime import datetime
 from utils.db import db_manager
+from utils import queries, rollups
+from utils.dispatcher import dispatcher
 from utils.elo import ELOEngine
-from utils.ui import DifficultyVotingView
+from utils.names import name_resolver
+from utils.ui import DifficultyVotingView, SearchResultsView
+
+CHALLENGE_STATUSES = ['pending_difficulty', 'active', 'pending_review', 'completed', 'failed', 'rejected']
+SEARCH_PAGE_SIZE = 10
 
 class ChallengesCog(commands.Cog, name="Challenges"):
     def __init__(self, bot):
         self.bot = bot
 
-    @commands.command(name='challenge')
+    @commands.hybrid_command(name='challenge')
+    @commands.guild_only()
+    @app_commands.describe(
+        category="Challenge category",
+        difficulty="Base difficulty in ELO (100-2000)",
+        description="What you are committing to do"
+    )
     async def issue_challenge(self, ctx, category: str, difficulty: int, *, description: str):
         """Issue a new challenge with difficulty voting"""
+        await ctx.defer()
         if difficulty < 100 or difficulty > 2000:
             await ctx.send("❌ Difficulty must be between 100 and 2000")
             return
@@ -22,15 +36,12 @@ class ChallengesCog(commands.Cog, name="Challenges"):
         
         await db_manager.ensure_user_exists(ctx.author.id, ctx.guild.id)
         
-        async with db_manager.db_pool.acquire() as conn:
-            category_id = await conn.fetchval(
-                'SELECT id FROM categories WHERE guild_id = $1 AND name = $2',
-                ctx.guild.id, category
-            )
-            
-            if not category_id:
-                await ctx.send(f"❌ Category '{category}' not found. Use `!categories` to see available categories.")
-                return
+        category_row = (await db_manager.get_categories(ctx.guild.id)).resolve(category)
+        if not category_row:
+            await ctx.send(f"❌ Category '{category}' not found. Use `!categories` to see available categories.")
+            return
+        category_id = category_row['id']
+        category = category_row['name']
         
         sprint = await db_manager.get_active_sprint(ctx.guild.id)
         if not sprint:
@@ -42,16 +53,16 @@ class ChallengesCog(commands.Cog, name="Challenges"):
         challenge_id = await db_manager.generate_challenge_id()
         
         async with db_manager.db_pool.acquire() as conn:
-            await conn.execute(
-                '''INSERT INTO challenges (challenge_id, user_id, guild_id, sprint_id, category_id, title, description, base_difficulty_elo)
-                   VALUES ($1, $2, $3, $4, $5, $6, $7, $8)''',
-                challenge_id, ctx.author.id, ctx.guild.id, sprint_id, category_id, description, description, difficulty
-            )
-            
-            await conn.execute(
-                'UPDATE users SET total_challenges = total_challenges + 1 WHERE user_id = $1 AND guild_id = $2',
-                ctx.author.id, ctx.guild.id
-            )
+            async with conn.transaction():
+                await conn.execute(
+                    queries.ISSUE_CHALLENGE,
+                    challenge_id, ctx.author.id, ctx.guild.id, sprint_id, category_id, description, description, difficulty
+                )
+                
+                await conn.execute(queries.COUNT_ISSUED, ctx.author.id, ctx.guild.id)
+                await rollups.record_issued(conn, ctx.guild.id, sprint_id, category_id)
+        db_manager.challenge_index.set_status(ctx.guild.id, challenge_id, 'pending_difficulty', ctx.author.id)
+        await db_manager.invalidate_challenge_views(ctx.guild.id, ctx.author.id)
         
         config = await db_manager.get_guild_config(ctx.guild.id)
         voting_channel_id = config.get('difficulty_voting_channel_id')
@@ -68,13 +79,16 @@ class ChallengesCog(commands.Cog, name="Challenges"):
                 embed.add_field(name="Voting", value="Use the buttons below to vote on difficulty adjustment:\n-10 ELO | +10 ELO\n\nYou can only vote once!", inline=False)
                 
                 view = DifficultyVotingView(challenge_id, difficulty)
-                voting_message = await voting_channel.send(embed=embed, view=view)
-                
-                async with db_manager.db_pool.acquire() as conn:
-                    await conn.execute(
-                        'UPDATE challenges SET difficulty_voting_message_id = $1 WHERE challenge_id = $2',
-                        voting_message.id, challenge_id
-                    )
+
+                async def record_voting_message(voting_message):
+                    async with db_manager.db_pool.acquire() as conn:
+                        await conn.execute(
+                            'UPDATE challenges SET difficulty_voting_message_id = $1 WHERE challenge_id = $2',
+                            voting_message.id, challenge_id
+                        )
+                    db_manager.mark_write(ctx.guild.id)
+
+                dispatcher.send(voting_channel, embed=embed, view=view, on_sent=record_voting_message)
         
         embed = discord.Embed(title="🎯 New Challenge Issued!", color=0xe74c3c)
         embed.add_field(name="ID", value=challenge_id, inline=True)
@@ -88,35 +102,35 @@ class ChallengesCog(commands.Cog, name="Challenges"):
         else:
             embed.add_field(name="Status", value="✅ Active (no voting channel configured)", inline=False)
             async with db_manager.db_pool.acquire() as conn:
-                await conn.execute(
-                    'UPDATE challenges SET status = $1, final_difficulty_elo = $2, difficulty_voting_active = $3 WHERE challenge_id = $4',
-                    'active', difficulty, False, challenge_id
-                )
+                async with conn.transaction():
+                    await conn.execute(
+                        'UPDATE challenges SET status = $1, final_difficulty_elo = $2, difficulty_voting_active = $3 WHERE challenge_id = $4',
+                        'active', difficulty, False, challenge_id
+                    )
+                    # Finalized at the base difficulty, so rollups count it as voted with no drift, as a rebuild would
+                    await rollups.record_voting(conn, ctx.guild.id, sprint_id, category_id, difficulty, difficulty)
+            db_manager.mark_write(ctx.guild.id)
+            db_manager.challenge_index.set_status(ctx.guild.id, challenge_id, 'active')
         
         await ctx.send(embed=embed)
 
+    @issue_challenge.autocomplete('category')
+    async def category_autocomplete(self, interaction: discord.Interaction, current: str):
+        # Served from whatever is in memory; never waits on the database
+        categories = db_manager.categories.peek(interaction.guild_id)
+        if not categories:
+            return []
+        return [app_commands.Choice(name=name, value=name) for name in categories.suggest(current)]
+
     @commands.command(name='challenges')
     async def list_challenges(self, ctx, status: str = "active"):
         """List challenges by status"""
-        valid_statuses = ['pending_difficulty', 'active', 'pending_review', 'completed', 'failed', 'rejected']
-        if status not in valid_statuses:
-            await ctx.send(f"❌ Invalid status. Use: {', '.join(valid_statuses)}")
+        if status not in CHALLENGE_STATUSES:
+            await ctx.send(f"❌ Invalid status. Use: {', '.join(CHALLENGE_STATUSES)}")
             return
         
-        async with db_manager.db_pool.acquire() as conn:
-            challenges = await conn.fetch(
-                '''SELECT c.challenge_id, c.title, 
-                          COALESCE(c.final_difficulty_elo, c.base_difficulty_elo) as difficulty_elo, 
-                          c.status, c.created_at, 
-                          cat.name as category, u.user_id
-                   FROM challenges c
-                   JOIN categories cat ON c.category_id = cat.id
-                   JOIN users u ON c.user_id = u.user_id AND c.guild_id = u.guild_id
-                   WHERE c.guild_id = $1 AND c.status = $2
-                   ORDER BY c.created_at DESC
-                   LIMIT 10''',
-                ctx.guild.id, status
-            )
+        async with db_manager.acquire_read(ctx.guild.id) as conn:
+            challenges = await conn.fetch(queries.LIST_CHALLENGES, ctx.guild.id, status)
         
         if not challenges:
             await ctx.send(f"No {status} challenges found.")
@@ -124,9 +138,9 @@ class ChallengesCog(commands.Cog, name="Challenges"):
         
         embed = discord.Embed(title=f"🎯 {status.title().replace('_', ' ')} Challenges", color=0x3498db)
         
+        names = await name_resolver.resolve(ctx.guild, (challenge['user_id'] for challenge in challenges))
         for challenge in challenges:
-            user = self.bot.get_user(challenge['user_id'])
-            username = user.display_name if user else "Unknown User"
+            username = names[challenge['user_id']]
             
             embed.add_field(
                 name=f"[{challenge['challenge_id']}] {challenge['title'][:50]}...",
@@ -136,9 +150,70 @@ class ChallengesCog(commands.Cog, name="Challenges"):
         
         await ctx.send(embed=embed)
 
-    @commands.command(name='complete')
+    @commands.command(name='search')
+    @commands.guild_only()
+    async def search_challenges(self, ctx, *, query: str = None):
+        """Search challenge titles and descriptions, optionally ending with a category and/or status"""
+        terms = (query or '').split()
+        status = None
+        if terms and terms[-1].lower() in CHALLENGE_STATUSES:
+            status = terms.pop().lower()
+
+        category = None
+        categories = await db_manager.get_categories(ctx.guild.id)
+        # Longest trailing run of words naming a category, leaving at least one search term
+        for start in range(1, len(terms)):
+            category = categories.resolve(' '.join(terms[start:]))
+            if category:
+                del terms[start:]
+                break
+
+        if not terms:
+            await ctx.send("Usage: `!search <terms> [category] [status]`")
+            return
+
+        text = ' '.join(terms)
+        category_id = category['id'] if category else None
+        filters = ', '.join(value for value in (category and category['name'], status) if value)
+
+        async def load_page(cursor):
+            rows, next_cursor = await self.search_page(ctx.guild.id, text, status, category_id, cursor)
+            title = f"🔎 Results for \"{text[:100]}\"" + (f" ({filters})" if filters else "")
+            embed = discord.Embed(title=title, color=0x3498db)
+            names = await name_resolver.resolve(ctx.guild, (row['user_id'] for row in rows))
+            for row in rows:
+                embed.add_field(
+                    name=f"[{row['challenge_id']}] {row['title'][:50]}...",
+                    value=f"**Category:** {row['category']} | **Status:** {row['status']} | **Difficulty:** {row['difficulty_elo']} | **User:** {names[row['user_id']]}",
+                    inline=False
+                )
+            return embed, next_cursor
+
+        embed, cursor = await load_page(None)
+        if not embed.fields:
+            await ctx.send(f"No challenges match \"{text[:100]}\".")
+            return
+        await ctx.send(embed=embed, view=SearchResultsView(ctx.author.id, load_page, cursor) if cursor else None)
+
+    async def search_page(self, guild_id: int, text: str, status: str, category_id: int, cursor):
+        """One page of ranked matches after `cursor` (rank, id); returns (rows, next cursor or None)"""
+        last_rank, last_id = cursor or (None, None)
+        async with db_manager.acquire_read(guild_id) as conn:
+            rows = await conn.fetch(
+                queries.SEARCH_CHALLENGES,
+                guild_id, text, status, category_id, last_rank, last_id, SEARCH_PAGE_SIZE + 1
+            )
+        if len(rows) > SEARCH_PAGE_SIZE:
+            last = rows[SEARCH_PAGE_SIZE - 1]
+            return rows[:SEARCH_PAGE_SIZE], (last['rank'], last['id'])
+        return rows, None
+
+    @commands.hybrid_command(name='complete')
+    @commands.guild_only()
+    @app_commands.describe(challenge_id="One of your active challenges", proof="Link or description of what you did")
     async def submit_completion(self, ctx, challenge_id: str, *, proof: str):
         """Submit a challenge for review"""
+        await ctx.defer()
         if not proof.strip():
             await ctx.send("❌ Proof cannot be empty")
             return
@@ -150,10 +225,7 @@ class ChallengesCog(commands.Cog, name="Challenges"):
         await db_manager.ensure_user_exists(ctx.author.id, ctx.guild.id)
         
         async with db_manager.db_pool.acquire() as conn:
-            challenge = await conn.fetchrow(
-                'SELECT * FROM challenges WHERE challenge_id = $1 AND user_id = $2 AND guild_id = $3',
-                challenge_id, ctx.author.id, ctx.guild.id
-            )
+            challenge = await conn.fetchrow(queries.OWN_CHALLENGE, challenge_id, ctx.author.id, ctx.guild.id)
             
             if not challenge:
                 await ctx.send(f"❌ Challenge {challenge_id} not found or doesn't belong to you.")
@@ -174,10 +246,11 @@ class ChallengesCog(commands.Cog, name="Challenges"):
                     )
             
             await conn.execute(
-                '''UPDATE challenges SET status = $1, proof_description = $2, completed_at = $3 
-                   WHERE challenge_id = $4''',
+                queries.SUBMIT_COMPLETION,
                 'pending_review', proof, datetime.utcnow(), challenge_id
             )
+        db_manager.challenge_index.set_status(ctx.guild.id, challenge_id, 'pending_review')
+        await db_manager.invalidate_profiles(ctx.guild.id, ctx.author.id)
         
         config = await db_manager.get_guild_config(ctx.guild.id)
         if config.get('review_channel_id'):
@@ -188,29 +261,47 @@ class ChallengesCog(commands.Cog, name="Challenges"):
                 embed.add_field(name="User", value=ctx.author.mention, inline=True)
                 embed.add_field(name="Proof", value=proof, inline=False)
                 embed.add_field(name="Review Commands", value=f"`!approve {challenge_id}` or `!reject {challenge_id}`", inline=False)
-                await review_channel.send(embed=embed)
+                dispatcher.send(review_channel, embed=embed)
         
         await ctx.send(f"✅ Challenge {challenge_id} submitted for review!")
 
-    @commands.command(name='approve')
+    @commands.hybrid_command(name='approve')
+    @commands.guild_only()
+    @app_commands.describe(challenge_id="A challenge pending review", comment="Optional comment for the challenger")
     async def approve_challenge(self, ctx, challenge_id: str, *, comment: str = None):
         """Approve a challenge submission"""
+        await ctx.defer()
         await self.process_review(ctx, challenge_id, 'approve', comment)
 
-    @commands.command(name='reject')
+    @commands.hybrid_command(name='reject')
+    @commands.guild_only()
+    @app_commands.describe(challenge_id="A challenge pending review", reason="Why the proof was not accepted")
     async def reject_challenge(self, ctx, challenge_id: str, *, reason: str = None):
         """Reject a challenge submission"""
+        await ctx.defer()
         await self.process_review(ctx, challenge_id, 'reject', reason)
 
+    @submit_completion.autocomplete('challenge_id')
+    async def own_open_challenge_autocomplete(self, interaction: discord.Interaction, current: str):
+        challenge_ids = db_manager.challenge_index.suggest(
+            interaction.guild_id, ('active', 'pending_difficulty'), current, owner_id=interaction.user.id
+        )
+        return [app_commands.Choice(name=challenge_id, value=challenge_id) for challenge_id in challenge_ids]
+
+    @approve_challenge.autocomplete('challenge_id')
+    @reject_challenge.autocomplete('challenge_id')
+    async def pending_review_autocomplete(self, interaction: discord.Interaction, current: str):
+        challenge_ids = db_manager.challenge_index.suggest(
+            interaction.guild_id, ('pending_review',), current, exclude_owner_id=interaction.user.id
+        )
+        return [app_commands.Choice(name=challenge_id, value=challenge_id) for challenge_id in challenge_ids]
+
     async def process_review(self, ctx, challenge_id: str, vote_type: str, comment: str = None):
         """Process challenge review vote"""
         await db_manager.ensure_user_exists(ctx.author.id, ctx.guild.id)
         
         async with db_manager.db_pool.acquire() as conn:
-            challenge = await conn.fetchrow(
-                'SELECT * FROM challenges WHERE challenge_id = $1 AND guild_id = $2',
-                challenge_id, ctx.guild.id
-            )
+            challenge = await conn.fetchrow(queries.REVIEWED_CHALLENGE, challenge_id, ctx.guild.id)
             
             if not challenge:
                 await ctx.send(f"❌ Challenge {challenge_id} not found.")
@@ -226,7 +317,7 @@ class ChallengesCog(commands.Cog, name="Challenges"):
             
             try:
                 await conn.execute(
-                    'INSERT INTO approvals (challenge_id, voter_id, guild_id, vote_type, comment) VALUES ($1, $2, $3, $4, $5)',
+                    queries.RECORD_REVIEW_VOTE,
                     challenge['id'], ctx.author.id, ctx.guild.id, vote_type, comment
                 )
             except Exception as e:
@@ -234,71 +325,79 @@ class ChallengesCog(commands.Cog, name="Challenges"):
                     await ctx.send(f"❌ You have already voted on challenge {challenge_id}.")
                     return
                 raise
+            db_manager.mark_write(ctx.guild.id)
             
             config = await db_manager.get_guild_config(ctx.guild.id)
             approvals_needed = config['approvals_needed']
             
-            votes = await conn.fetch(
-                'SELECT vote_type FROM approvals WHERE challenge_id = $1',
-                challenge['id']
-            )
+            votes = await conn.fetch(queries.REVIEW_VOTES, challenge['id'])
             
             approve_count = sum(1 for vote in votes if vote['vote_type'] == 'approve')
             reject_count = sum(1 for vote in votes if vote['vote_type'] == 'reject')
             
             if approve_count >= approvals_needed:
-                await self.finalize_challenge(challenge, 'completed', conn)
-                await ctx.send(f"✅ Challenge {challenge_id} approved and completed!")
+                if await self.finalize_challenge(challenge, 'completed', conn):
+                    await ctx.send(f"✅ Challenge {challenge_id} approved and completed!")
+                else:
+                    await ctx.send(f"✅ Vote recorded. Challenge {challenge_id} was already finalized.")
             elif reject_count > 0:
-                await self.finalize_challenge(challenge, 'rejected', conn)
-                await ctx.send(f"❌ Challenge {challenge_id} rejected.")
+                if await self.finalize_challenge(challenge, 'rejected', conn):
+                    await ctx.send(f"❌ Challenge {challenge_id} rejected.")
+                else:
+                    await ctx.send(f"✅ Vote recorded. Challenge {challenge_id} was already finalized.")
             else:
                 await ctx.send(f"✅ Vote recorded. Need {approvals_needed - approve_count} more approvals.")
 
     async def finalize_challenge(self, challenge, final_status: str, conn):
-        """Finalize a challenge and update ELO"""
-        await conn.execute(
-            'UPDATE challenges SET status = $1, reviewed_at = $2 WHERE id = $3',
-            final_status, datetime.utcnow(), challenge['id']
-        )
-        
-        if final_status == 'completed':
-            user = await conn.fetchrow(
-                'SELECT * FROM users WHERE user_id = $1 AND guild_id = $2',
-                challenge['user_id'], challenge['guild_id']
+        """Finalize a challenge and update ELO; returns False if another review already finalized it"""
+        async with conn.transaction():
+            reviewed_at = datetime.utcnow()
+            finalized = await conn.fetchval(queries.FINALIZE_REVIEW, final_status, reviewed_at, challenge['id'])
+            if finalized is None:
+                return False
+            latency = (reviewed_at - challenge['completed_at']).total_seconds() if challenge['completed_at'] else None
+            await rollups.record_review(
+                conn, challenge['guild_id'], challenge['sprint_id'], challenge['category_id'], final_status, latency
             )
+        
+            if final_status == 'completed':
+                user = await conn.fetchrow(queries.USER, challenge['user_id'], challenge['guild_id'])
             
-            config = await db_manager.get_guild_config(challenge['guild_id'])
+                config = await db_manager.get_guild_config(challenge['guild_id'])
             
-            k_factor = ELOEngine.get_k_factor(
-                user['total_challenges'],
-                config['k_factor_new'],
-                config['k_factor_stable'],
-                config['stable_user_threshold']
-            )
+                k_factor = ELOEngine.get_k_factor(
+                    user['total_challenges'],
+                    config['k_factor_new'],
+                    config['k_factor_stable'],
+                    config['stable_user_threshold']
+                )
             
-            challenge_difficulty = challenge.get('final_difficulty_elo') or challenge.get('base_difficulty_elo')
+                challenge_difficulty = challenge.get('final_difficulty_elo') or challenge.get('base_difficulty_elo')
             
-            expected_score = ELOEngine.calculate_expected_score(
-                user['current_elo'], challenge_difficulty
-            )
+                expected_score = ELOEngine.calculate_expected_score(
+                    user['current_elo'], challenge_difficulty
+                )
             
-            new_elo = ELOEngine.calculate_new_elo(
-                user['current_elo'], expected_score, 1, k_factor
-            )
+                new_elo = ELOEngine.calculate_new_elo(
+                    user['current_elo'], expected_score, 1, k_factor
+                )
             
-            elo_change = new_elo - user['current_elo']
+                elo_change = new_elo - user['current_elo']
             
-            await conn.execute(
-                'UPDATE users SET current_elo = $1, completed_challenges = completed_challenges + 1 WHERE user_id = $2 AND guild_id = $3',
-                new_elo, challenge['user_id'], challenge['guild_id']
-            )
+                await conn.execute(
+                    queries.AWARD_ELO,
+                    new_elo, challenge['user_id'], challenge['guild_id']
+                )
             
-            await conn.execute(
-                'INSERT INTO elo_history (user_id, guild_id, challenge_id, elo_before, elo_after, elo_change, reason) VALUES ($1, $2, $3, $4, $5, $6, $7)',
-                challenge['user_id'], challenge['guild_id'], challenge['id'],
-                user['current_elo'], new_elo, elo_change, 'challenge_completed'
-            )
+                await conn.execute(
+                    queries.RECORD_ELO_CHANGE,
+                    challenge['user_id'], challenge['guild_id'], challenge['id'],
+                    user['current_elo'], new_elo, elo_change, 'challenge_completed'
+                )
+        db_manager.challenge_index.set_status(challenge['guild_id'], challenge['challenge_id'], final_status)
+
+        await db_manager.invalidate_challenge_views(challenge['guild_id'], challenge['user_id'])
+        return True
 
 async def setup(bot):
     await bot.add_cog(ChallengesCog(bot)) 
\ No newline at end of file
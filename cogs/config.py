@@ -28,6 +28,7 @@ class ConfigCog(commands.Cog, name="Config"):
                         f'UPDATE guild_config SET {key} = $1 WHERE guild_id = $2',
                         int_value, ctx.guild.id
                     )
+                await db_manager.invalidate_guild_config(ctx.guild.id)
                 await ctx.send(f"✅ Set {key} = {int_value}")
             except ValueError:
                 await ctx.send("❌ Value must be an integer")
@@ -45,6 +46,7 @@ class ConfigCog(commands.Cog, name="Config"):
                         'UPDATE guild_config SET review_channel_id = $1 WHERE guild_id = $2',
                         channel_id, ctx.guild.id
                     )
+                await db_manager.invalidate_guild_config(ctx.guild.id)
                 await ctx.send(f"✅ Set review channel to <#{channel_id}>")
             except ValueError:
                 await ctx.send("❌ Invalid channel")
@@ -62,10 +64,29 @@ class ConfigCog(commands.Cog, name="Config"):
                         'UPDATE guild_config SET difficulty_voting_channel_id = $1 WHERE guild_id = $2',
                         channel_id, ctx.guild.id
                     )
+                await db_manager.invalidate_guild_config(ctx.guild.id)
                 await ctx.send(f"✅ Set difficulty voting channel to <#{channel_id}>")
             except ValueError:
                 await ctx.send("❌ Invalid channel")
         
+        elif action == "channel" and key == "reminders" and value:
+            try:
+                channel_id = int(value.strip('<#>'))
+                channel = self.bot.get_channel(channel_id)
+                if not channel:
+                    await ctx.send("❌ Channel not found")
+                    return
+                    
+                async with db_manager.db_pool.acquire() as conn:
+                    await conn.execute(
+                        'UPDATE guild_config SET reminder_channel_id = $1 WHERE guild_id = $2',
+                        channel_id, ctx.guild.id
+                    )
+                await db_manager.invalidate_guild_config(ctx.guild.id)
+                await ctx.send(f"✅ Set sprint reminder channel to <#{channel_id}>")
+            except ValueError:
+                await ctx.send("❌ Invalid channel")
+        
         elif action == "show":
             config = await db_manager.get_guild_config(ctx.guild.id)
             embed = discord.Embed(title="⚙️ Guild Configuration", color=0x95a5a6)
@@ -77,7 +98,7 @@ class ConfigCog(commands.Cog, name="Config"):
             await ctx.send(embed=embed)
         
         else:
-            await ctx.send("Usage: `!config set <key> <value>` or `!config channel review #channel` or `!config channel voting #channel` or `!config show`")
+            await ctx.send("Usage: `!config set <key> <value>` or `!config channel review #channel` or `!config channel voting #channel` or `!config channel reminders #channel` or `!config show`")
 
 async def setup(bot):
     await bot.add_cog(ConfigCog(bot)) 
\ No newline at end of file
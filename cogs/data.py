@@ -0,0 +1,474 @@
+import discord
+from discord.ext import commands
+import asyncio
+import csv
+import gzip
+import logging
+import os
+import re
+import shutil
+import tempfile
+from datetime import datetime
+from utils.db import db_manager
+from utils.dispatcher import dispatcher
+from utils.partitions import ensure_partitions
+from utils import rollups
+
+logger = logging.getLogger(__name__)
+
+# Exportable tables and the order their rows are written in; every one is filtered by guild_id
+EXPORT_TABLES = {
+    'users': 'user_id',
+    'categories': 'id',
+    'sprints': 'id',
+    'challenges': 'id',
+    'approvals': 'challenge_id, id',
+    'difficulty_votes': 'challenge_id, id',
+    'elo_history': 'created_at, id',
+    'sprint_results': 'sprint_id, final_rank',
+}
+EXPORT_FORMATS = ('csv', 'jsonl')
+
+# Headroom under the guild's upload limit for the multipart request itself
+UPLOAD_MARGIN = 64 * 1024
+
+# Server-side directory `!import from <name>` reads exports from
+IMPORT_DIR = os.getenv('IMPORT_DIR', 'data/imports')
+READ_CHUNK_SIZE = 1024 * 1024
+
+# <guild>-<date>-<table>.<format>.gz, optionally followed by a .NNN part number
+_EXPORT_NAME = re.compile(r'(?:^|-)([a-z_]+)\.(csv|jsonl)\.gz(?:\.(\d{3}))?$')
+
+# Sprint results, votes and rating history are replaced wholesale by `!import replace`, children first
+REPLACED_TABLES = ('sprint_results', 'approvals', 'difficulty_votes', 'elo_history', 'challenges', 'sprints')
+
+# Set-based merge of the staging tables into the live ones for guild $1, as
+# (table, statements...). IDs are remapped through map_* tables filled from the
+# live sequences, so no row is inserted one at a time. The last statement of
+# each step writes the live table and its row count is checked against the
+# staging table.
+MERGE_STEPS = [
+    ('categories', '''
+        INSERT INTO map_categories (old_id, new_id, is_new)
+        SELECT s.id, CASE WHEN c.id IS NULL THEN nextval('categories_id_seq') ELSE c.id END, c.id IS NULL
+        FROM stage_categories s LEFT JOIN categories c ON c.guild_id = $1 AND c.name = s.name
+    ''', '''
+        INSERT INTO categories (id, guild_id, name, description, created_at)
+        SELECT m.new_id, $1, s.name, s.description, s.created_at
+        FROM stage_categories s JOIN map_categories m ON m.old_id = s.id
+        WHERE m.is_new
+    '''),
+    ('sprints', '''
+        INSERT INTO map_sprints (old_id, new_id)
+        SELECT id, nextval('sprints_id_seq') FROM stage_sprints
+    ''', '''
+        INSERT INTO sprints (id, guild_id, start_date, end_date, status, created_at, results_snapshotted_at)
+        SELECT m.new_id, $1, s.start_date, s.end_date, s.status, s.created_at, s.results_snapshotted_at
+        FROM stage_sprints s JOIN map_sprints m ON m.old_id = s.id
+    '''),
+    ('users', '''
+        INSERT INTO users (user_id, guild_id, current_elo, k_factor, total_challenges,
+                           completed_challenges, created_at, updated_at)
+        SELECT user_id, $1, current_elo, k_factor, total_challenges, completed_challenges, created_at, updated_at
+        FROM stage_users
+        ON CONFLICT (user_id, guild_id) DO UPDATE SET
+            current_elo = EXCLUDED.current_elo,
+            k_factor = EXCLUDED.k_factor,
+            total_challenges = EXCLUDED.total_challenges,
+            completed_challenges = EXCLUDED.completed_challenges,
+            updated_at = CURRENT_TIMESTAMP
+    '''),
+    # Challenge IDs are unique across every guild; ones already taken become
+    # CHL-I<row id>. generate_challenge_id only makes digits and row IDs come
+    # from a sequence, so these never collide. Imported IDs already in that
+    # namespace are renamed too, to keep it that way.
+    ('challenges', '''
+        INSERT INTO map_challenges (old_id, new_id, challenge_id)
+        SELECT id, nextval('challenges_id_seq'), challenge_id FROM stage_challenges
+    ''', '''
+        UPDATE map_challenges m SET challenge_id = 'CHL-I' || m.new_id
+        WHERE m.challenge_id LIKE 'CHL-I%'
+           OR EXISTS (SELECT 1 FROM challenges c WHERE c.challenge_id = m.challenge_id)
+    ''', '''
+        INSERT INTO challenges (id, challenge_id, user_id, guild_id, sprint_id, category_id, title, description,
+                                base_difficulty_elo, final_difficulty_elo, difficulty_voting_active,
+                                difficulty_voting_message_id, status, proof_link, proof_description,
+                                created_at, completed_at, reviewed_at)
+        SELECT m.new_id, m.challenge_id, s.user_id, $1, ms.new_id, mc.new_id, s.title, s.description,
+               s.base_difficulty_elo, s.final_difficulty_elo, s.difficulty_voting_active,
+               s.difficulty_voting_message_id, s.status, s.proof_link, s.proof_description,
+               s.created_at, s.completed_at, s.reviewed_at
+        FROM stage_challenges s
+        JOIN map_challenges m ON m.old_id = s.id
+        LEFT JOIN map_sprints ms ON ms.old_id = s.sprint_id
+        LEFT JOIN map_categories mc ON mc.old_id = s.category_id
+    '''),
+    ('approvals', '''
+        INSERT INTO approvals (challenge_id, voter_id, guild_id, vote_type, comment, created_at)
+        SELECT m.new_id, s.voter_id, $1, s.vote_type, s.comment, s.created_at
+        FROM stage_approvals s JOIN map_challenges m ON m.old_id = s.challenge_id
+    '''),
+    ('difficulty_votes', '''
+        INSERT INTO difficulty_votes (challenge_id, voter_id, guild_id, vote_adjustment, created_at)
+        SELECT m.new_id, s.voter_id, $1, s.vote_adjustment, s.created_at
+        FROM stage_difficulty_votes s JOIN map_challenges m ON m.old_id = s.challenge_id
+    '''),
+    ('elo_history', '''
+        INSERT INTO elo_history (user_id, guild_id, challenge_id, elo_before, elo_after, elo_change, reason, created_at)
+        SELECT s.user_id, $1, m.new_id, s.elo_before, s.elo_after, s.elo_change, s.reason,
+               COALESCE(s.created_at, CURRENT_TIMESTAMP)
+        FROM stage_elo_history s LEFT JOIN map_challenges m ON m.old_id = s.challenge_id
+        WHERE s.challenge_id IS NULL OR m.old_id IS NOT NULL
+    '''),
+    ('sprint_results', '''
+        INSERT INTO sprint_results (sprint_id, guild_id, user_id, final_rank, elo_gain, final_elo,
+                                    completed, attempted, created_at)
+        SELECT m.new_id, $1, s.user_id, s.final_rank, s.elo_gain, s.final_elo, s.completed, s.attempted, s.created_at
+        FROM stage_sprint_results s JOIN map_sprints m ON m.old_id = s.sprint_id
+    '''),
+]
+
+
+class _SplitFile:
+    """Write-only file that rolls over to a new part file every `part_size` bytes"""
+
+    def __init__(self, base_path: str, part_size: int):
+        self.base_path = base_path
+        self.part_size = part_size
+        self.paths = []
+        self._file = None
+        self._written = 0
+
+    def _next_part(self):
+        if self._file is not None:
+            self._file.close()
+        path = f"{self.base_path}.{len(self.paths) + 1:03d}"
+        self.paths.append(path)
+        self._file = open(path, 'wb')
+        self._written = 0
+
+    def write(self, data: bytes) -> int:
+        view = memoryview(data)
+        while view:
+            if self._file is None or self._written >= self.part_size:
+                self._next_part()
+            take = min(len(view), self.part_size - self._written)
+            self._file.write(view[:take])
+            self._written += take
+            view = view[take:]
+        return len(data)
+
+    def flush(self):
+        if self._file is not None:
+            self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class _JoinedFile:
+    """Read-only file over part files in order, as if they had been concatenated"""
+
+    def __init__(self, paths):
+        self._paths = list(paths)
+        self._file = None
+
+    def read(self, size: int = -1) -> bytes:
+        while True:
+            if self._file is None:
+                if not self._paths:
+                    return b''
+                self._file = open(self._paths.pop(0), 'rb')
+            data = self._file.read(size)
+            if data or size == 0:
+                return data
+            self._file.close()
+            self._file = None
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def _find_export_files(names):
+    """Group export file names by table: {table: (format, [names in part order])}"""
+    found = {}
+    for name in names:
+        match = _EXPORT_NAME.search(os.path.basename(name))
+        if not match or match.group(1) not in EXPORT_TABLES:
+            continue
+        table, fmt, part = match.group(1), match.group(2), int(match.group(3) or 0)
+        if table in found and found[table][0] != fmt:
+            raise ValueError(f"`{table}` was supplied as both csv and jsonl")
+        found.setdefault(table, (fmt, []))[1].append((part, name))
+    return {table: (fmt, [name for _, name in sorted(parts)]) for table, (fmt, parts) in found.items()}
+
+
+async def _execute(conn, sql: str, guild_id: int) -> int:
+    """Run one merge statement, returning the number of rows it wrote"""
+    # Remap statements that never touch live guild rows take no parameters
+    status = await conn.execute(sql, guild_id) if '$1' in sql else await conn.execute(sql)
+    return int(status.split()[-1])
+
+
+def _export_query(table: str, fmt: str) -> str:
+    query = f'SELECT * FROM {table} WHERE guild_id = $1 ORDER BY {EXPORT_TABLES[table]}'
+    if fmt == 'jsonl':
+        return f'SELECT row_to_json(t)::text FROM ({query}) t'
+    return query
+
+
+class DataCog(commands.Cog, name="Data"):
+    def __init__(self, bot):
+        self.bot = bot
+        self.jobs_running = set()
+
+    async def export_table(self, guild_id: int, table: str, fmt: str, workdir: str, part_size: int):
+        """Stream one table's guild rows into gzip part files; returns (row count, part paths)"""
+        loop = asyncio.get_running_loop()
+        filename = f"{table}.{fmt}.gz"
+        parts = _SplitFile(os.path.join(workdir, filename), part_size)
+        gz = gzip.GzipFile(filename=filename[:-3], mode='wb', fileobj=parts)
+
+        async def write_chunk(chunk):
+            await loop.run_in_executor(None, gz.write, chunk)
+
+        if fmt == 'jsonl':
+            # One JSON document per line: CSV with a quote and delimiter that
+            # row_to_json always escapes, so nothing is quoted or escaped again
+            copy_options = {'format': 'csv', 'quote': '\x01', 'delimiter': '\x02'}
+        else:
+            copy_options = {'format': 'csv', 'header': True}
+
+        try:
+            # The connection goes back to the pool as soon as COPY finishes; uploading happens without it
+            async with db_manager.acquire_read(guild_id) as conn:
+                status = await conn.copy_from_query(
+                    _export_query(table, fmt), guild_id, output=write_chunk, **copy_options
+                )
+        finally:
+            await loop.run_in_executor(None, gz.close)
+            parts.close()
+
+        return int(status.split()[-1]), parts.paths
+
+    @commands.command(name='export')
+    @commands.has_permissions(administrator=True)
+    @commands.guild_only()
+    async def export(self, ctx, table: str = None, fmt: str = 'csv'):
+        """Export this server's data as gzip-compressed CSV or JSON lines (Admin only)"""
+        table = (table or '').lower()
+        fmt = fmt.lower()
+        if table != 'all' and table not in EXPORT_TABLES:
+            await ctx.send(f"Usage: `!export <table|all> [csv|jsonl]`\nTables: {', '.join(EXPORT_TABLES)}")
+            return
+        if fmt not in EXPORT_FORMATS:
+            await ctx.send(f"❌ Invalid format. Valid formats: {', '.join(EXPORT_FORMATS)}")
+            return
+        if ctx.guild.id in self.jobs_running:
+            await ctx.send("❌ An export or import for this server is already running.")
+            return
+
+        tables = list(EXPORT_TABLES) if table == 'all' else [table]
+        part_size = ctx.guild.filesize_limit - UPLOAD_MARGIN
+        workdir = tempfile.mkdtemp(prefix=f"export-{ctx.guild.id}-")
+        stamp = datetime.utcnow().strftime('%Y%m%d')
+        self.jobs_running.add(ctx.guild.id)
+
+        try:
+            await ctx.send(f"⏳ Exporting {', '.join(tables)} as {fmt}...")
+            for name in tables:
+                rows, paths = await self.export_table(ctx.guild.id, name, fmt, workdir, part_size)
+                filename = f"{ctx.guild.id}-{stamp}-{name}.{fmt}.gz"
+
+                if len(paths) == 1:
+                    await ctx.send(f"📦 `{name}`: {rows} rows", file=discord.File(paths[0], filename=filename))
+                else:
+                    for i, path in enumerate(paths, 1):
+                        await ctx.send(
+                            f"📦 `{name}`: part {i}/{len(paths)}",
+                            file=discord.File(path, filename=f"{filename}.{i:03d}")
+                        )
+                    await ctx.send(f"📦 `{name}`: {rows} rows in {len(paths)} parts. Reassemble with `cat {filename}.* > {filename}`")
+
+                for path in paths:
+                    os.remove(path)
+
+            await ctx.send("✅ Export complete!")
+        except Exception as e:
+            logger.error("Export of %s for guild %s failed: %s", table, ctx.guild.id, e)
+            await ctx.send("❌ Export failed. Please check the logs.")
+        finally:
+            self.jobs_running.discard(ctx.guild.id)
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    async def load_stage(self, conn, table: str, fmt: str, paths) -> int:
+        """COPY one table's export files into its staging table; returns the rows loaded"""
+        loop = asyncio.get_running_loop()
+        joined = _JoinedFile(paths)
+        gz = gzip.GzipFile(fileobj=joined, mode='rb')
+
+        async def chunks():
+            while True:
+                data = await loop.run_in_executor(None, gz.read, READ_CHUNK_SIZE)
+                if not data:
+                    return
+                yield data
+
+        try:
+            if fmt == 'jsonl':
+                await conn.copy_to_table(
+                    f'stage_{table}_json', source=chunks(), columns=['doc'],
+                    format='csv', quote='\x01', delimiter='\x02'
+                )
+                status = await conn.execute(
+                    f'''INSERT INTO stage_{table}
+                       SELECT r.* FROM stage_{table}_json j
+                       CROSS JOIN LATERAL jsonb_populate_record(NULL::stage_{table}, j.doc) r'''
+                )
+            else:
+                header = await loop.run_in_executor(None, gz.readline)
+                columns = next(csv.reader([header.decode().rstrip('\r\n')]), [])
+                known = {row['attname'] for row in await conn.fetch(
+                    '''SELECT attname FROM pg_attribute
+                       WHERE attrelid = $1::regclass AND attnum > 0 AND NOT attisdropped''',
+                    f'stage_{table}'
+                )}
+                unknown = [column for column in columns if column not in known]
+                if not columns or unknown:
+                    raise ValueError(f"`{table}` has unexpected columns: {', '.join(unknown) or 'no header'}")
+                status = await conn.copy_to_table(f'stage_{table}', source=chunks(), columns=columns, format='csv')
+        finally:
+            await loop.run_in_executor(None, gz.close)
+            joined.close()
+
+        return int(status.split()[-1])
+
+    async def merge_import(self, guild_id: int, files, replace: bool, progress):
+        """Load export files into staging tables and merge them into the guild in one transaction"""
+        loaded, merged = {}, {}
+        async with db_manager.db_pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute("SET LOCAL work_mem = '256MB'")
+
+                has_history = await conn.fetchval(
+                    '''SELECT EXISTS (SELECT 1 FROM challenges WHERE guild_id = $1)
+                           OR EXISTS (SELECT 1 FROM sprints WHERE guild_id = $1)''',
+                    guild_id
+                )
+                if has_history and not replace:
+                    raise ValueError("This server already has challenges or sprints. Use `!import replace` to overwrite them.")
+
+                for table in EXPORT_TABLES:
+                    await conn.execute(f'CREATE TEMP TABLE stage_{table} ON COMMIT DROP AS SELECT * FROM {table} WITH NO DATA')
+                    await conn.execute(f'CREATE TEMP TABLE stage_{table}_json (doc jsonb) ON COMMIT DROP')
+                await conn.execute('''
+                    CREATE TEMP TABLE map_categories (old_id INTEGER PRIMARY KEY, new_id INTEGER NOT NULL, is_new BOOLEAN NOT NULL) ON COMMIT DROP;
+                    CREATE TEMP TABLE map_sprints (old_id INTEGER PRIMARY KEY, new_id INTEGER NOT NULL) ON COMMIT DROP;
+                    CREATE TEMP TABLE map_challenges (old_id INTEGER PRIMARY KEY, new_id INTEGER NOT NULL, challenge_id VARCHAR(20) NOT NULL) ON COMMIT DROP;
+                ''')
+
+                for i, (table, (fmt, paths)) in enumerate(files.items(), 1):
+                    progress(f"⏳ Loading `{table}` ({i}/{len(files)})...")
+                    loaded[table] = await self.load_stage(conn, table, fmt, paths)
+                    await conn.execute(f'ANALYZE stage_{table}')
+
+                if replace:
+                    progress("⏳ Removing this server's existing history...")
+                    for table in REPLACED_TABLES:
+                        await conn.execute(f'DELETE FROM {table} WHERE guild_id = $1', guild_id)
+
+                for table, *statements in MERGE_STEPS:
+                    progress(f"⏳ Merging `{table}` ({loaded.get(table, 0)} rows)...")
+                    if table == 'approvals':
+                        # Votes and rating history can predate every partition that exists yet
+                        await ensure_partitions(
+                            conn,
+                            since=await conn.fetchval('SELECT min(created_at) FROM stage_elo_history'),
+                            first_challenge_id=await conn.fetchval('SELECT min(new_id) FROM map_challenges')
+                        )
+                    for sql in statements:
+                        merged[table] = await _execute(conn, sql, guild_id)
+
+                progress("⏳ Rebuilding statistics...")
+                await rollups.rebuild(conn, guild_id)
+
+                progress("⏳ Validating...")
+                expected = dict(loaded)
+                expected['categories'] = await conn.fetchval('SELECT count(*) FROM map_categories WHERE is_new')
+                mismatched = [
+                    f"`{table}`: {merged.get(table, 0)} of {count}"
+                    for table, count in expected.items() if merged.get(table, 0) != count
+                ]
+                if mismatched:
+                    # Rows left behind reference a challenge or sprint missing from the import
+                    raise ValueError(f"Rows could not be matched to the rest of the import: {', '.join(mismatched)}")
+
+        return loaded
+
+    @commands.command(name='import')
+    @commands.has_permissions(administrator=True)
+    @commands.guild_only()
+    async def import_data(self, ctx, *args: str):
+        """Import files made by !export into this server (Admin only)"""
+        words = [arg.lower() for arg in args]
+        replace = 'replace' in words
+        source = args[words.index('from') + 1] if 'from' in words[:-1] else None
+
+        if ctx.guild.id in self.jobs_running:
+            await ctx.send("❌ An export or import for this server is already running.")
+            return
+        if source is not None and not await self.bot.is_owner(ctx.author):
+            await ctx.send("❌ Only the bot owner can import from the server's disk.")
+            return
+        if source is None and not ctx.message.attachments:
+            await ctx.send("Usage: `!import [replace]` with the exported files attached, or `!import [replace] from <directory>`")
+            return
+
+        workdir = tempfile.mkdtemp(prefix=f"import-{ctx.guild.id}-")
+        self.jobs_running.add(ctx.guild.id)
+        message = await ctx.send("⏳ Preparing import...")
+        started = datetime.utcnow()
+
+        def progress(text: str):
+            dispatcher.edit(message, content=text)
+
+        try:
+            if source is not None:
+                directory = os.path.join(IMPORT_DIR, os.path.basename(source))
+                names = [os.path.join(directory, name) for name in os.listdir(directory)]
+            else:
+                names = []
+                for attachment in ctx.message.attachments:
+                    path = os.path.join(workdir, os.path.basename(attachment.filename))
+                    await attachment.save(path)
+                    names.append(path)
+
+            files = _find_export_files(names)
+            if not files:
+                progress("❌ No export files found. Expected names like `<server>-<date>-challenges.csv.gz`.")
+                return
+            # Merge order, not upload order
+            files = {table: files[table] for table in EXPORT_TABLES if table in files}
+
+            loaded = await self.merge_import(ctx.guild.id, files, replace, progress)
+            await db_manager.reload_guild(ctx.guild.id)
+
+            elapsed = (datetime.utcnow() - started).total_seconds()
+            summary = ", ".join(f"{table}: {count}" for table, count in loaded.items())
+            progress(f"✅ Import complete in {elapsed:.0f}s! {summary}")
+            logger.info("Imported guild %s in %.0fs: %s", ctx.guild.id, elapsed, summary)
+        except (ValueError, OSError) as e:
+            progress(f"❌ Import failed, nothing was changed: {e}")
+        except Exception as e:
+            logger.error("Import for guild %s failed: %s", ctx.guild.id, e)
+            progress("❌ Import failed, nothing was changed. Please check the logs.")
+        finally:
+            self.jobs_running.discard(ctx.guild.id)
+            shutil.rmtree(workdir, ignore_errors=True)
+
+async def setup(bot):
+    await bot.add_cog(DataCog(bot))
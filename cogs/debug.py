@@ -0,0 +1,108 @@
+import discord
+from discord.ext import commands
+import asyncio
+import inspect
+import os
+import time
+from utils.metrics import metrics
+from utils.profiler import profiler
+from utils.ui import DifficultyVotingView, SearchResultsView
+
+MAX_PROFILE_SECONDS = 300
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'data/profiles')
+
+class DebugCog(commands.Cog, name="Debug"):
+    def __init__(self, bot):
+        self.bot = bot
+
+    @commands.group(name='debug', hidden=True, invoke_without_command=True)
+    @commands.is_owner()
+    async def debug(self, ctx):
+        """Runtime diagnostics (Owner only)"""
+        await ctx.send("Usage: `!debug metrics` or `!debug profile <seconds>`")
+
+    @debug.command(name='metrics')
+    @commands.is_owner()
+    async def show_metrics(self, ctx):
+        """Show in-process counters, gauges and latency histograms"""
+        snapshot = metrics.snapshot()
+        embed = discord.Embed(title="🔧 Runtime Metrics", color=0x95a5a6)
+        embed.add_field(name="Uptime", value=f"{snapshot['uptime_seconds'] / 3600:.1f}h", inline=False)
+
+        if snapshot['counters']:
+            counters_text = "\n".join(f"{name}: {value}" for name, value in sorted(snapshot['counters'].items()))
+            embed.add_field(name="Counters", value=f"```{counters_text[:1000]}```", inline=False)
+
+        if snapshot['gauges']:
+            gauges_text = "\n".join(f"{name}: {value:g}" for name, value in sorted(snapshot['gauges'].items()))
+            embed.add_field(name="Gauges", value=f"```{gauges_text[:1000]}```", inline=False)
+
+        for name, summary in sorted(snapshot['histograms'].items())[:20]:
+            embed.add_field(
+                name=name,
+                value=f"n={summary['count']} p50={summary['p50']:.1f} p95={summary['p95']:.1f} p99={summary['p99']:.1f} max={summary['max']:.1f}",
+                inline=False
+            )
+
+        await ctx.send(embed=embed)
+
+    @debug.command(name='profile')
+    @commands.is_owner()
+    async def profile(self, ctx, seconds: int = 10):
+        """Sample the event loop for a while and attach a collapsed-stack profile"""
+        if profiler.running:
+            await ctx.send("❌ A profile is already being recorded.")
+            return
+        seconds = max(1, min(seconds, MAX_PROFILE_SECONDS))
+
+        await ctx.send(f"⏳ Profiling for {seconds}s...")
+        profiler.start(self.code_names())
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            result = await asyncio.get_running_loop().run_in_executor(None, profiler.stop)
+
+        path = os.path.join(PROFILE_DIR, f"profile-{time.strftime('%Y%m%d-%H%M%S')}.collapsed")
+        await asyncio.to_thread(self.write_profile, path, result)
+
+        embed = discord.Embed(title="🔬 Event-Loop Profile", color=0x95a5a6)
+        embed.add_field(
+            name="Window",
+            value=f"{result.duration:.1f}s, {result.total} samples every {result.interval * 1000:.0f}ms",
+            inline=False
+        )
+        total = result.total or 1
+        commands_text = "\n".join(
+            f"{name}: {count} ({count / total * 100:.1f}%)" for name, count in result.by_command().most_common(10)
+        )
+        if commands_text:
+            embed.add_field(name="By command", value=f"```{commands_text[:1000]}```", inline=False)
+        functions_text = "\n".join(
+            f"{count:>5} {name[:70]}" for name, count in result.top_functions(10)
+        )
+        if functions_text:
+            embed.add_field(name="Top functions (self)", value=f"```{functions_text[:1000]}```", inline=False)
+        embed.set_footer(text="Feed the attachment to flamegraph.pl or speedscope")
+
+        await ctx.send(embed=embed, file=discord.File(path))
+
+    @staticmethod
+    def write_profile(path: str, result):
+        """Render and save the collapsed stacks; run in a worker thread"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(result.collapsed())
+
+    def code_names(self):
+        """Map each command callback's and view callback's code object to a name to attribute samples to"""
+        names = {}
+        for command in self.bot.walk_commands():
+            names[command.callback.__code__] = command.qualified_name
+        for view in (DifficultyVotingView, SearchResultsView):
+            for attr, value in vars(view).items():
+                if inspect.iscoroutinefunction(value):
+                    names[value.__code__] = f"{view.__name__}.{attr}"
+        return names
+
+async def setup(bot):
+    await bot.add_cog(DebugCog(bot))
@@ -1,71 +1,97 @@
 import discord
 from discord.ext import commands
-from utils.db import db_manager
+from utils import queries
+from utils.db import db_manager, LEADERBOARD_CACHE_TTL
+from utils.names import name_resolver
 
 class LeaderboardCog(commands.Cog, name="Leaderboard"):
     def __init__(self, bot):
         self.bot = bot
 
     @commands.command(name='leaderboard', aliases=['lb'])
-    async def leaderboard(self, ctx, time_period: str = "weekly"):
-        """Show leaderboard for weekly or all-time"""
-        if time_period.lower() not in ['weekly', 'alltime', 'all-time']:
-            await ctx.send("❌ Use `weekly` or `alltime` for time period")
+    async def leaderboard(self, ctx, time_period: str = "weekly", sprint_id: int = None):
+        """Show leaderboard for weekly, all-time, or a finished sprint"""
+        if time_period.lower() not in ['weekly', 'alltime', 'all-time', 'sprint']:
+            await ctx.send("❌ Use `weekly`, `alltime` or `sprint [id]` for time period")
             return
         
-        async with db_manager.db_pool.acquire() as conn:
-            if time_period.lower() == 'weekly':
-                sprint = await db_manager.get_active_sprint(ctx.guild.id)
-                if not sprint:
-                    await ctx.send("No active sprint found.")
-                    return
-                
-                leaderboard_data = await conn.fetch(
-                    '''SELECT u.user_id, u.current_elo, 
-                              COALESCE(SUM(eh.elo_change), 0) as weekly_gain,
-                              COUNT(c.id) as weekly_challenges,
-                              COUNT(CASE WHEN c.status = 'completed' THEN 1 END) as weekly_completed
-                       FROM users u
-                       LEFT JOIN elo_history eh ON u.user_id = eh.user_id AND u.guild_id = eh.guild_id
-                       LEFT JOIN challenges c ON eh.challenge_id = c.id AND c.sprint_id = $1
-                       WHERE u.guild_id = $2
-                       GROUP BY u.user_id, u.current_elo
-                       ORDER BY weekly_gain DESC
-                       LIMIT 10''',
-                    sprint['id'], ctx.guild.id
-                )
-                
-                embed = discord.Embed(title="🏆 Weekly Sprint Leaderboard", color=0xf1c40f)
-                embed.add_field(name="Sprint Period", value=f"{sprint['start_date'].strftime('%Y-%m-%d')} to {sprint['end_date'].strftime('%Y-%m-%d')}", inline=False)
-            else:
-                leaderboard_data = await conn.fetch(
-                    '''SELECT u.user_id, u.current_elo, u.total_challenges, u.completed_challenges
-                       FROM users u
-                       WHERE u.guild_id = $1
-                       ORDER BY u.current_elo DESC
-                       LIMIT 10''',
-                    ctx.guild.id
-                )
+        if time_period.lower() == 'sprint':
+            await self.sprint_leaderboard(ctx, sprint_id)
+            return
+        
+        if time_period.lower() == 'weekly':
+            sprint = await db_manager.get_active_sprint(ctx.guild.id)
+            if not sprint:
+                await ctx.send("No active sprint found.")
+                return
+
+            leaderboard_data = await db_manager.cache.get_or_load(
+                ctx.guild.id, f"leaderboard:weekly:{sprint['id']}",
+                lambda: self.load_weekly(ctx.guild.id, sprint['id']),
+                LEADERBOARD_CACHE_TTL
+            )
+
+            embed = discord.Embed(title="🏆 Weekly Sprint Leaderboard", color=0xf1c40f)
+            embed.add_field(name="Sprint Period", value=f"{sprint['start_date'].strftime('%Y-%m-%d')} to {sprint['end_date'].strftime('%Y-%m-%d')}", inline=False)
+        else:
+            leaderboard_data = await db_manager.cache.get_or_load(
+                ctx.guild.id, 'leaderboard:alltime',
+                lambda: self.load_alltime(ctx.guild.id),
+                LEADERBOARD_CACHE_TTL
+            )
+
+            embed = discord.Embed(title="🏆 All-Time Leaderboard", color=0xe74c3c)
+
+        if not leaderboard_data:
+            embed.add_field(name="No Data", value="No users found on leaderboard", inline=False)
+        else:
+            names = await name_resolver.resolve(ctx.guild, (row['user_id'] for row in leaderboard_data))
+            leaderboard_text = ""
+            for i, row in enumerate(leaderboard_data, 1):
+                username = names[row['user_id']]
                 
-                embed = discord.Embed(title="🏆 All-Time Leaderboard", color=0xe74c3c)
+                if time_period.lower() == 'weekly':
+                    leaderboard_text += f"**{i}.** {username} - {row['current_elo']} ELO (+{row['weekly_gain']}) | {row['weekly_completed']}/{row['weekly_challenges']} completed\n"
+                else:
+                    completion_rate = (row['completed_challenges'] / row['total_challenges'] * 100) if row['total_challenges'] > 0 else 0
+                    leaderboard_text += f"**{i}.** {username} - {row['current_elo']} ELO | {row['completed_challenges']}/{row['total_challenges']} ({completion_rate:.1f}%)\n"
             
-            if not leaderboard_data:
-                embed.add_field(name="No Data", value="No users found on leaderboard", inline=False)
-            else:
-                leaderboard_text = ""
-                for i, row in enumerate(leaderboard_data, 1):
-                    user = self.bot.get_user(row['user_id'])
-                    username = user.display_name if user else "Unknown User"
-                    
-                    if time_period.lower() == 'weekly':
-                        leaderboard_text += f"**{i}.** {username} - {row['current_elo']} ELO (+{row['weekly_gain']}) | {row['weekly_completed']}/{row['weekly_challenges']} completed\n"
-                    else:
-                        completion_rate = (row['completed_challenges'] / row['total_challenges'] * 100) if row['total_challenges'] > 0 else 0
-                        leaderboard_text += f"**{i}.** {username} - {row['current_elo']} ELO | {row['completed_challenges']}/{row['total_challenges']} ({completion_rate:.1f}%)\n"
-                
-                embed.add_field(name="Rankings", value=leaderboard_text, inline=False)
+            embed.add_field(name="Rankings", value=leaderboard_text, inline=False)
         
         await ctx.send(embed=embed)
 
+    async def sprint_leaderboard(self, ctx, sprint_id: int = None):
+        """Render a finished sprint's leaderboard from its frozen results"""
+        sprint, results = await db_manager.get_sprint_results(ctx.guild.id, sprint_id)
+        if not sprint:
+            await ctx.send("❌ No finished sprint found." if sprint_id is None else f"❌ Sprint {sprint_id} not found or still active.")
+            return
+        
+        embed = discord.Embed(title=f"🏁 Sprint #{sprint['id']} Final Results", color=0x1abc9c)
+        embed.add_field(name="Sprint Period", value=f"{sprint['start_date'].strftime('%Y-%m-%d')} to {sprint['end_date'].strftime('%Y-%m-%d')}", inline=False)
+        
+        if not results:
+            embed.add_field(name="No Data", value="Nobody took on a challenge this sprint", inline=False)
+        else:
+            names = await name_resolver.resolve(ctx.guild, (row['user_id'] for row in results))
+            leaderboard_text = ""
+            for row in results:
+                username = names[row['user_id']]
+                gain = f"+{row['elo_gain']}" if row['elo_gain'] >= 0 else str(row['elo_gain'])
+                leaderboard_text += f"**{row['final_rank']}.** {username} - {gain} ELO | {row['completed']}/{row['attempted']} completed (ended at {row['final_elo']})\n"
+            embed.add_field(name="Rankings", value=leaderboard_text, inline=False)
+        
+        await ctx.send(embed=embed)
+
+    async def load_weekly(self, guild_id: int, sprint_id: int):
+        async with db_manager.acquire_read(guild_id) as conn:
+            rows = await conn.fetch(queries.LEADERBOARD_WEEKLY, sprint_id, guild_id)
+        return [dict(row) for row in rows]
+
+    async def load_alltime(self, guild_id: int):
+        async with db_manager.acquire_read(guild_id) as conn:
+            rows = await conn.fetch(queries.LEADERBOARD_ALLTIME, guild_id)
+        return [dict(row) for row in rows]
+
 async def setup(bot):
     await bot.add_cog(LeaderboardCog(bot)) 
\ No newline at end of file
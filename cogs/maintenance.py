@@ -0,0 +1,70 @@
+from discord.ext import commands, tasks
+import logging
+import os
+from utils.db import db_manager
+from utils.metrics import metrics
+from utils.partitions import ensure_partitions, archive_cold_partitions
+from utils import rollups
+
+logger = logging.getLogger(__name__)
+
+class MaintenanceCog(commands.Cog, name="Maintenance"):
+    def __init__(self, bot):
+        self.bot = bot
+        self.retention_days = int(os.getenv('ARCHIVE_RETENTION_DAYS', 180))
+        self.archive_dir = os.getenv('ARCHIVE_DIR', 'data/archive')
+        self.partition_maintenance.start()
+        self.rollup_verification.start()
+        self.write_log_compaction.start()
+
+    def cog_unload(self):
+        self.partition_maintenance.cancel()
+        self.rollup_verification.cancel()
+        self.write_log_compaction.cancel()
+
+    @tasks.loop(hours=24)
+    async def partition_maintenance(self):
+        """Create upcoming history partitions and archive ones past the retention window"""
+        try:
+            async with db_manager.db_pool.acquire() as conn:
+                await ensure_partitions(conn)
+
+            # Sprint snapshots read elo_history, so freeze any missing ones before old months go
+            snapshotted = await db_manager.snapshot_pending_sprints()
+            if snapshotted:
+                logger.info("Snapshotted %d ended sprints before archiving", snapshotted)
+            
+            archived = await archive_cold_partitions(db_manager.db_pool, self.retention_days, self.archive_dir)
+            if archived:
+                logger.info("Archived %d cold history partitions to %s", len(archived), self.archive_dir)
+        except Exception as e:
+            logger.error("Error in partition maintenance: %s", e)
+
+    @tasks.loop(hours=24)
+    async def rollup_verification(self):
+        """Recompute every guild's statistics rollups from scratch and report any drift"""
+        try:
+            async with db_manager.db_pool.acquire() as conn:
+                guild_ids = [row['guild_id'] for row in await conn.fetch('SELECT guild_id FROM guild_config')]
+            
+            for guild_id in guild_ids:
+                async with db_manager.db_pool.acquire() as conn:
+                    async with conn.transaction():
+                        mismatched = await rollups.rebuild(conn, guild_id)
+                db_manager.mark_write(guild_id)
+                if mismatched:
+                    metrics.incr('rollups.mismatched_rows', mismatched)
+        except Exception as e:
+            logger.error("Error in rollup verification: %s", e)
+
+    @tasks.loop(hours=1)
+    async def write_log_compaction(self):
+        """Fold the per-statement write log behind the warm-state watermarks into its totals"""
+        try:
+            folded = await db_manager.compact_write_log()
+            metrics.incr('warm_state.write_log_folded', folded)
+        except Exception as e:
+            logger.error("Error compacting the write log: %s", e)
+
+async def setup(bot):
+    await bot.add_cog(MaintenanceCog(bot))
@@ -56,6 +56,7 @@ class PrerequisiteModal(discord.ui.Modal, title="Add Prerequisite"):
                     prereq_message.channel.id,
                     prereq_message.id
                 )
+            db_manager.mark_write(interaction.guild.id)
             await interaction.response.send_message(f"✅ Prerequisite set: [this message]({self.target_message.jump_url}) now requires [this message]({prereq_message.jump_url}).", ephemeral=True)
         except Exception as e:
             if 'unique constraint' in str(e).lower():
@@ -1,6 +1,7 @@
 import discord
 from discord.ext import commands
-from utils.db import db_manager
+from utils import queries
+from utils.db import db_manager, PROFILE_CACHE_TTL
 
 class ProfileCog(commands.Cog, name="Profile"):
     def __init__(self, bot):
@@ -12,29 +13,19 @@ class ProfileCog(commands.Cog, name="Profile"):
         target_user = user or ctx.author
         await db_manager.ensure_user_exists(target_user.id, ctx.guild.id)
         
-        async with db_manager.db_pool.acquire() as conn:
-            user_data = await conn.fetchrow(
-                'SELECT * FROM users WHERE user_id = $1 AND guild_id = $2',
-                target_user.id, ctx.guild.id
-            )
-            
-            recent_challenges = await conn.fetch(
-                '''SELECT c.challenge_id, c.title, 
-                          COALESCE(c.final_difficulty_elo, c.base_difficulty_elo) as difficulty_elo, 
-                          c.status, c.created_at,
-                          cat.name as category
-                   FROM challenges c
-                   JOIN categories cat ON c.category_id = cat.id
-                   WHERE c.user_id = $1 AND c.guild_id = $2
-                   ORDER BY c.created_at DESC
-                   LIMIT 5''',
-                target_user.id, ctx.guild.id
-            )
-            
-            elo_history = await conn.fetch(
-                'SELECT elo_before, elo_after, elo_change, created_at FROM elo_history WHERE user_id = $1 AND guild_id = $2 ORDER BY created_at DESC LIMIT 10',
-                target_user.id, ctx.guild.id
-            )
+        snapshot = await db_manager.cache.get_or_load(
+            ctx.guild.id, f'profile:{target_user.id}',
+            lambda: self.load_profile(ctx.guild.id, target_user.id),
+            PROFILE_CACHE_TTL
+        )
+        user_data = snapshot['user']
+        if user_data is None:
+            await db_manager.cache.delete(ctx.guild.id, f'profile:{target_user.id}')
+            await ctx.send(f"❌ No profile found for {target_user.display_name}.")
+            return
+        recent_challenges = snapshot['recent_challenges']
+        elo_history = snapshot['elo_history']
+        sprint_history = snapshot.get('sprint_history', [])
         
         embed = discord.Embed(title=f"📊 {target_user.display_name}'s Profile", color=0x9b59b6)
         
@@ -60,7 +51,40 @@ class ProfileCog(commands.Cog, name="Profile"):
             
             embed.add_field(name="ELO Trend", value=elo_trend, inline=False)
         
+        if sprint_history:
+            sprints_text = ""
+            for entry in sprint_history:
+                gain = f"+{entry['elo_gain']}" if entry['elo_gain'] >= 0 else str(entry['elo_gain'])
+                sprints_text += f"Sprint #{entry['sprint_id']}: rank {entry['final_rank']}/{entry['participants']} ({gain} ELO, {entry['completed']}/{entry['attempted']} completed)\n"
+            
+            embed.add_field(name="Sprint History", value=sprints_text, inline=False)
+        
         await ctx.send(embed=embed)
 
+    async def load_profile(self, guild_id: int, user_id: int):
+        async with db_manager.acquire_read(guild_id) as conn:
+            profile = await self.fetch_profile(conn, guild_id, user_id)
+        if profile['user'] is None:
+            # The replica may not have the user row yet; the primary has it if anyone does
+            async with db_manager.db_pool.acquire() as conn:
+                profile = await self.fetch_profile(conn, guild_id, user_id)
+        profile['sprint_history'] = await db_manager.get_sprint_history(guild_id, user_id)
+        return profile
+
+    async def fetch_profile(self, conn, guild_id: int, user_id: int):
+        user_data = await conn.fetchrow(queries.USER, user_id, guild_id)
+        if user_data is None:
+            return {'user': None, 'recent_challenges': [], 'elo_history': []}
+        
+        recent_challenges = await conn.fetch(queries.PROFILE_RECENT_CHALLENGES, user_id, guild_id)
+        
+        elo_history = await conn.fetch(queries.PROFILE_ELO_HISTORY, user_id, guild_id)
+
+        return {
+            'user': dict(user_data),
+            'recent_challenges': [dict(row) for row in recent_challenges],
+            'elo_history': [dict(row) for row in elo_history],
+        }
+
 async def setup(bot):
     await bot.add_cog(ProfileCog(bot)) 
\ No newline at end of file
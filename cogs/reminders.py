@@ -0,0 +1,148 @@
+import discord
+from discord.ext import commands, tasks
+from datetime import datetime, timezone
+import logging
+import os
+from utils.db import db_manager
+from utils.dispatcher import dispatcher
+from utils.metrics import metrics
+from utils.timer_wheel import TimerWheel
+
+logger = logging.getLogger(__name__)
+
+# Remind this many hours before a sprint ends, e.g. REMINDER_LEAD_HOURS=24,1
+REMINDER_LEAD_HOURS = sorted(
+    {int(hours) for hours in os.getenv('REMINDER_LEAD_HOURS', '24,1').split(',') if hours.strip()},
+    reverse=True
+)
+REMINDER_TICK_SECONDS = 30
+DIGEST_LINE_LIMIT = 25
+
+OPEN_STATUSES = ('pending_difficulty', 'active')
+
+
+def _epoch(naive_utc: datetime) -> float:
+    return naive_utc.replace(tzinfo=timezone.utc).timestamp()
+
+
+class RemindersCog(commands.Cog, name="Reminders"):
+    """Reminds members about unfinished challenges as their sprint nears its end.
+
+    Each active sprint gets one timer per lead time in a single timer wheel,
+    so open challenges cost nothing until a reminder is due. When timers
+    fire, every due sprint of a guild is folded into one digest posted to
+    the guild's reminder channel, or sent as one DM per member if none is set.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.wheel = TimerWheel(tick=REMINDER_TICK_SECONDS)
+        self.sync_sprints.start()
+        self.reminder_tick.start()
+
+    def cog_unload(self):
+        self.sync_sprints.cancel()
+        self.reminder_tick.cancel()
+
+    @tasks.loop(minutes=10)
+    async def sync_sprints(self):
+        """Schedule reminders for active sprints; the first run rebuilds the wheel after a restart"""
+        try:
+            async with db_manager.db_pool.acquire() as conn:
+                sprints = await conn.fetch(
+                    "SELECT id, guild_id, end_date FROM sprints WHERE status = 'active' AND end_date > (now() AT TIME ZONE 'utc')"
+                )
+            now = datetime.now(timezone.utc).timestamp()
+            for sprint in sprints:
+                end = _epoch(sprint['end_date'])
+                for hours in REMINDER_LEAD_HOURS:
+                    fire_at = end - hours * 3600
+                    if fire_at > now:
+                        self.wheel.schedule((sprint['id'], hours), fire_at, (sprint['guild_id'], sprint['id'], hours))
+            metrics.gauge('reminders.timers', len(self.wheel))
+        except Exception as e:
+            logger.error("Error syncing sprint reminders: %s", e)
+
+    @tasks.loop(seconds=REMINDER_TICK_SECONDS)
+    async def reminder_tick(self):
+        """Fire due reminders, one digest per guild"""
+        due = self.wheel.advance()
+        if not due:
+            return
+        by_guild = {}
+        for guild_id, sprint_id, hours in due:
+            by_guild.setdefault(guild_id, []).append((sprint_id, hours))
+        for guild_id, sprints in by_guild.items():
+            try:
+                await self.send_digest(guild_id, sprints)
+            except Exception as e:
+                logger.error("Failed to send reminders for guild %s: %s", guild_id, e)
+
+    @reminder_tick.before_loop
+    async def before_reminder_tick(self):
+        await self.bot.wait_until_ready()
+
+    async def send_digest(self, guild_id: int, sprints):
+        guild = self.bot.get_guild(guild_id)
+        if guild is None:
+            return
+        sprint_ids = [sprint_id for sprint_id, _ in sprints]
+        async with db_manager.db_pool.acquire() as conn:
+            challenges = await conn.fetch(
+                '''SELECT c.challenge_id, c.user_id, c.title, c.sprint_id, s.end_date
+                   FROM challenges c
+                   JOIN sprints s ON s.id = c.sprint_id
+                   WHERE c.guild_id = $1 AND c.sprint_id = ANY($2::int[])
+                     AND s.status = 'active' AND c.status = ANY($3::varchar[])
+                   ORDER BY c.user_id, c.id''',
+                guild_id, sprint_ids, list(OPEN_STATUSES)
+            )
+        if not challenges:
+            return
+
+        config = await db_manager.get_guild_config(guild_id)
+        channel = guild.get_channel(config.get('reminder_channel_id') or 0)
+        if channel is not None:
+            lines = [
+                f"<@{row['user_id']}> `{row['challenge_id']}` {row['title'][:80]} - ends <t:{int(_epoch(row['end_date']))}:R>"
+                for row in challenges
+            ]
+            self._send_lines(channel, guild, lines, mention_users=list({row['user_id'] for row in challenges}))
+            metrics.incr('reminders.channel_digests')
+        else:
+            by_user = {}
+            for row in challenges:
+                by_user.setdefault(row['user_id'], []).append(
+                    f"`{row['challenge_id']}` {row['title'][:80]} - ends <t:{int(_epoch(row['end_date']))}:R>"
+                )
+            for user_id, lines in by_user.items():
+                member = guild.get_member(user_id) or self.bot.get_user(user_id)
+                if member is None:
+                    # Not cached, e.g. with MEMBER_CACHE_MODE=lean
+                    try:
+                        member = await self.bot.fetch_user(user_id)
+                    except discord.HTTPException:
+                        continue
+                self._send_lines(member, guild, lines)
+            metrics.incr('reminders.dm_digests', len(by_user))
+        metrics.incr('reminders.challenges', len(challenges))
+
+    def _send_lines(self, target, guild: discord.Guild, lines, mention_users=None):
+        shown = lines[:DIGEST_LINE_LIMIT]
+        if len(lines) > DIGEST_LINE_LIMIT:
+            shown.append(f"...and {len(lines) - DIGEST_LINE_LIMIT} more")
+        embed = discord.Embed(
+            title="⏰ Sprint ending soon",
+            description="These challenges are still open:\n" + "\n".join(shown),
+            color=0xe67e22
+        )
+        embed.set_footer(text=guild.name)
+        kwargs = {'embed': embed}
+        if mention_users:
+            kwargs['content'] = " ".join(f"<@{user_id}>" for user_id in mention_users[:50])
+            kwargs['allowed_mentions'] = discord.AllowedMentions(users=True)
+        dispatcher.send(target, **kwargs)
+
+
+async def setup(bot):
+    await bot.add_cog(RemindersCog(bot))
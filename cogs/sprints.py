@@ -24,12 +24,11 @@ class SprintsCog(commands.Cog, name="Sprints"):
             await ctx.send(f"✅ New sprint started! Sprint ID: {sprint_id}")
         
         elif action == "end":
-            async with db_manager.db_pool.acquire() as conn:
-                await conn.execute(
-                    'UPDATE sprints SET status = $1 WHERE guild_id = $2 AND status = $3',
-                    'ended', ctx.guild.id, 'active'
-                )
-            await ctx.send("✅ Current sprint ended!")
+            expired = await db_manager.end_active_sprints(ctx.guild.id)
+            if expired:
+                await ctx.send(f"✅ Current sprint ended! {expired} unfinished challenge(s) marked as failed.")
+            else:
+                await ctx.send("✅ Current sprint ended!")
         
         elif action == "status":
             sprint = await db_manager.get_active_sprint(ctx.guild.id)
@@ -69,18 +68,17 @@ class SprintsCog(commands.Cog, name="Sprints"):
                     
                     if current_sprint:
                         if datetime.utcnow() >= current_sprint['end_date']:
-                            await conn.execute(
-                                'UPDATE sprints SET status = $1 WHERE id = $2',
-                                'ended', current_sprint['id']
-                            )
-                            
+                            # create_sprint ends the current sprint and fails its unfinished challenges
                             await db_manager.create_sprint(guild_id, duration)
-                            logger.info(f"Auto-started new sprint for guild {guild_id}")
+                            logger.info("Auto-started new sprint for guild %s", guild_id)
                     else:
                         await db_manager.create_sprint(guild_id, duration)
-                        logger.info(f"Created initial sprint for guild {guild_id}")
+                        logger.info("Created initial sprint for guild %s", guild_id)
+
+                    # Catch challenges left open by sprints ended before expiry existed
+                    await db_manager.expire_ended_sprints(guild_id)
         except Exception as e:
-            logger.error(f"Error in auto sprint management: {e}")
+            logger.error("Error in auto sprint management: %s", e)
 
 async def setup(bot):
     await bot.add_cog(SprintsCog(bot)) 
\ No newline at end of file
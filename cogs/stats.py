@@ -0,0 +1,81 @@
+import discord
+from discord.ext import commands
+from utils.db import db_manager
+from utils import queries, rollups
+
+class StatsCog(commands.Cog, name="Stats"):
+    def __init__(self, bot):
+        self.bot = bot
+
+    @commands.command(name='stats')
+    @commands.guild_only()
+    async def stats(self, ctx, sprint: str = None):
+        """Show completion, review-time and difficulty-vote statistics for a sprint"""
+        if sprint == 'rebuild':
+            await self.rebuild(ctx)
+            return
+
+        if sprint is None:
+            async with db_manager.acquire_read(ctx.guild.id) as conn:
+                sprint_row = await conn.fetchrow(queries.LATEST_SPRINT, ctx.guild.id)
+        elif sprint.isdigit():
+            async with db_manager.acquire_read(ctx.guild.id) as conn:
+                sprint_row = await conn.fetchrow(queries.SPRINT, int(sprint), ctx.guild.id)
+        else:
+            await ctx.send("Usage: `!stats [sprint_id]` or `!stats rebuild`")
+            return
+
+        if not sprint_row:
+            await ctx.send("No sprint found.")
+            return
+
+        async with db_manager.acquire_read(ctx.guild.id) as conn:
+            rows = await conn.fetch(queries.SPRINT_ROLLUPS, ctx.guild.id, sprint_row['id'])
+
+        embed = discord.Embed(title=f"📈 Sprint #{sprint_row['id']} Statistics", color=0x16a085)
+        embed.add_field(name="Sprint Period", value=f"{sprint_row['start_date'].strftime('%Y-%m-%d')} to {sprint_row['end_date'].strftime('%Y-%m-%d')}", inline=False)
+
+        if not rows:
+            embed.add_field(name="No Data", value="No challenges were issued this sprint", inline=False)
+            await ctx.send(embed=embed)
+            return
+
+        totals = {key: sum(row[key] for row in rows) for key in ('issued', 'completed', 'failed', 'rejected', 'voted', 'drift_sum', 'drift_abs_sum')}
+        totals['review_latency'] = [sum(bucket) for bucket in zip(*(row['review_latency'] for row in rows))]
+        totals['category'] = "All Categories"
+
+        for row in [totals] + [dict(row) for row in rows[:20]]:
+            embed.add_field(name=row['category'] or "Uncategorized", value=self.format_rollup(row), inline=False)
+
+        await ctx.send(embed=embed)
+
+    def format_rollup(self, row) -> str:
+        completion_rate = (row['completed'] / row['issued'] * 100) if row['issued'] > 0 else 0
+        median = rollups.median_latency(row['review_latency']) or "n/a"
+        if row['voted']:
+            drift = f"{row['drift_sum'] / row['voted']:+.1f} ELO avg, {row['drift_abs_sum'] / row['voted']:.1f} abs ({row['voted']} votes)"
+        else:
+            drift = "no votes"
+        return (
+            f"**Completed:** {row['completed']}/{row['issued']} ({completion_rate:.1f}%) | **Failed:** {row['failed']} | **Rejected:** {row['rejected']}\n"
+            f"**Median review time:** {median} | **Vote drift:** {drift}"
+        )
+
+    async def rebuild(self, ctx):
+        """Recompute this server's statistics from the challenge history (Admin only)"""
+        if not ctx.author.guild_permissions.administrator:
+            await ctx.send("❌ You do not have the required permissions to run this command.")
+            return
+
+        async with db_manager.db_pool.acquire() as conn:
+            async with conn.transaction():
+                mismatched = await rollups.rebuild(conn, ctx.guild.id)
+        db_manager.mark_write(ctx.guild.id)
+
+        if mismatched:
+            await ctx.send(f"✅ Statistics rebuilt. {mismatched} rollup row(s) had drifted from the challenge history and were corrected.")
+        else:
+            await ctx.send("✅ Statistics rebuilt. Everything already matched the challenge history.")
+
+async def setup(bot):
+    await bot.add_cog(StatsCog(bot))
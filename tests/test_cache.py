@@ -0,0 +1,217 @@
+import asyncio
+
+import pytest
+
+from utils.cache import Cache, MemoryBackend, RedisBackend
+from utils.fake_redis import FakeRedis
+
+GUILD = 1
+OTHER_GUILD = 2
+TTL = 60
+
+
+@pytest.fixture(params=['memory', 'fakeredis'])
+def cache(request):
+    if request.param == 'memory':
+        return Cache(MemoryBackend())
+    return Cache(RedisBackend(FakeRedis()))
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_delete_invalidates_only_the_named_entry(cache):
+    async def scenario():
+        await cache.set(GUILD, 'profile:1', {'elo': 1000}, TTL)
+        await cache.set(GUILD, 'profile:2', {'elo': 1100}, TTL)
+        await cache.delete(GUILD, 'profile:1')
+        return await cache.get(GUILD, 'profile:1'), await cache.get(GUILD, 'profile:2')
+
+    assert run(scenario()) == (None, {'elo': 1100})
+
+
+def test_delete_group_invalidates_the_group_in_one_guild(cache):
+    async def scenario():
+        await cache.set(GUILD, 'leaderboard:weekly:1', [1], TTL)
+        await cache.set(GUILD, 'leaderboard:alltime', [2], TTL)
+        await cache.set(GUILD, 'profile:1', {'elo': 1000}, TTL)
+        await cache.set(OTHER_GUILD, 'leaderboard:alltime', [3], TTL)
+        await cache.delete_group(GUILD, 'leaderboard')
+        return [
+            await cache.get(GUILD, 'leaderboard:weekly:1'),
+            await cache.get(GUILD, 'leaderboard:alltime'),
+            await cache.get(GUILD, 'profile:1'),
+            await cache.get(OTHER_GUILD, 'leaderboard:alltime'),
+        ]
+
+    assert run(scenario()) == [None, None, {'elo': 1000}, [3]]
+
+
+def test_clear_guild_invalidates_every_entry_of_the_guild(cache):
+    async def scenario():
+        await cache.set(GUILD, 'config', {'a': 1}, TTL)
+        await cache.set(GUILD, 'profile:1', {'elo': 1000}, TTL)
+        await cache.set(OTHER_GUILD, 'config', {'a': 2}, TTL)
+        await cache.clear_guild(GUILD)
+        return await cache.get(GUILD, 'config'), await cache.get(GUILD, 'profile:1'), await cache.get(OTHER_GUILD, 'config')
+
+    assert run(scenario()) == (None, None, {'a': 2})
+
+
+def test_entries_set_after_invalidation_are_served(cache):
+    async def scenario():
+        await cache.delete_group(GUILD, 'leaderboard')
+        await cache.set(GUILD, 'leaderboard:alltime', [1], TTL)
+        return await cache.get(GUILD, 'leaderboard:alltime')
+
+    assert run(scenario()) == [1]
+
+
+def test_load_invalidated_mid_flight_is_not_served(cache):
+    async def scenario():
+        started, release = asyncio.Event(), asyncio.Event()
+
+        async def stale_loader():
+            started.set()
+            await release.wait()
+            return 'stale'
+
+        load = asyncio.create_task(cache.get_or_load(GUILD, 'profile:1', stale_loader, TTL))
+        await started.wait()
+        await cache.delete(GUILD, 'profile:1')
+        release.set()
+        # The caller that started the load still gets its result
+        first = await load
+
+        async def fresh_loader():
+            return 'fresh'
+
+        # Stored under the pre-invalidation tag, so the next lookup misses and reloads
+        cached = await cache.get(GUILD, 'profile:1')
+        second = await cache.get_or_load(GUILD, 'profile:1', fresh_loader, TTL)
+        return first, cached, second
+
+    assert run(scenario()) == ('stale', None, 'fresh')
+
+
+def test_group_invalidation_mid_flight_is_not_served(cache):
+    async def scenario():
+        started, release = asyncio.Event(), asyncio.Event()
+
+        async def loader():
+            started.set()
+            await release.wait()
+            return 'stale'
+
+        load = asyncio.create_task(cache.get_or_load(GUILD, 'leaderboard:alltime', loader, TTL))
+        await started.wait()
+        await cache.delete_group(GUILD, 'leaderboard')
+        release.set()
+        await load
+        return await cache.get(GUILD, 'leaderboard:alltime')
+
+    assert run(scenario()) is None
+
+
+def test_concurrent_misses_share_one_load(cache):
+    async def scenario():
+        calls = 0
+        release = asyncio.Event()
+
+        async def loader():
+            nonlocal calls
+            calls += 1
+            await release.wait()
+            return {'rows': calls}
+
+        waiters = [asyncio.create_task(cache.get_or_load(GUILD, 'config', loader, TTL)) for _ in range(10)]
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*waiters)
+        return calls, results
+
+    calls, results = run(scenario())
+    assert calls == 1
+    assert results == [{'rows': 1}] * 10
+
+
+def test_callers_after_invalidation_do_not_join_the_old_load(cache):
+    async def scenario():
+        calls = []
+        started, release = asyncio.Event(), asyncio.Event()
+
+        async def loader():
+            calls.append(len(calls) + 1)
+            started.set()
+            await release.wait()
+            return len(calls)
+
+        first = asyncio.create_task(cache.get_or_load(GUILD, 'config', loader, TTL))
+        await started.wait()
+        await cache.delete(GUILD, 'config')
+        second = asyncio.create_task(cache.get_or_load(GUILD, 'config', loader, TTL))
+        await asyncio.sleep(0.01)
+        release.set()
+        await asyncio.gather(first, second)
+        return len(calls), await cache.get(GUILD, 'config')
+
+    calls, cached = run(scenario())
+    # The second caller ran its own load, and only its result is cached
+    assert calls == 2
+    assert cached == 2
+
+
+def test_failed_load_is_not_cached_and_releases_waiters(cache):
+    async def scenario():
+        async def failing():
+            raise RuntimeError('db down')
+
+        with pytest.raises(RuntimeError):
+            await cache.get_or_load(GUILD, 'config', failing, TTL)
+
+        async def loader():
+            return 'ok'
+
+        return await cache.get_or_load(GUILD, 'config', loader, TTL)
+
+    assert run(scenario()) == 'ok'
+
+
+def test_processes_sharing_redis_run_the_loader_once():
+    async def scenario():
+        client = FakeRedis()
+        caches = [Cache(RedisBackend(client)) for _ in range(3)]
+        calls = 0
+        release = asyncio.Event()
+
+        async def loader():
+            nonlocal calls
+            calls += 1
+            await release.wait()
+            return 'value'
+
+        waiters = [asyncio.create_task(cache.get_or_load(GUILD, 'config', loader, TTL)) for cache in caches]
+        await asyncio.sleep(0.01)
+        release.set()
+        results = await asyncio.gather(*waiters)
+        # The lock is released once the loader finishes
+        return calls, results, await client.get('elo:1:config:lock')
+
+    calls, results, lock = run(scenario())
+    assert calls == 1
+    assert results == ['value'] * 3
+    assert lock is None
+
+
+def test_fake_redis_release_only_deletes_an_owned_lock():
+    async def scenario():
+        backend = RedisBackend(FakeRedis())
+        assert await backend.add('lock', 'mine', 5)
+        assert not await backend.add('lock', 'theirs', 5)
+        await backend.release('lock', 'theirs')
+        held = await backend.get('lock')
+        await backend.release('lock', 'mine')
+        return held, await backend.get('lock')
+
+    assert run(scenario()) == ('mine', None)
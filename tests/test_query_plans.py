@@ -0,0 +1,199 @@
+"""EXPLAIN every hot query the bot runs against a seeded database.
+
+Needs a Postgres reachable through the DB_* environment variables and is
+skipped otherwise; an empty database gets init.sql first. Pending migrations
+are applied, then the seed data and every EXPLAIN run in one transaction that
+is rolled back, so it is safe to point at a dev database. Sequential scans
+are disabled, so a Seq Scan left in a plan means no index can serve it.
+"""
+import asyncio
+import json
+
+import pytest
+
+from utils import queries, rollups
+
+GUILD_ID = 900_000_000_000_000_001
+USER_ID = 800_000_000_000_000_001
+
+SEED_SQL = '''
+    INSERT INTO users (user_id, guild_id, current_elo, total_challenges)
+    SELECT 800000000000000000 + u, 900000000000000000 + g, 800 + (u * 7) % 600, u % 20
+    FROM generate_series(1, 20) g, generate_series(1, 500) u;
+
+    INSERT INTO categories (guild_id, name, description)
+    SELECT 900000000000000000 + g, 'Category ' || c, 'seeded'
+    FROM generate_series(1, 20) g, generate_series(1, 6) c;
+
+    INSERT INTO sprints (guild_id, start_date, end_date, status)
+    SELECT 900000000000000000 + g,
+           NOW() - (s * INTERVAL '7 days'),
+           NOW() - ((s - 1) * INTERVAL '7 days'),
+           CASE WHEN s = 1 THEN 'active' ELSE 'ended' END
+    FROM generate_series(1, 20) g, generate_series(1, 30) s;
+
+    INSERT INTO challenges (challenge_id, user_id, guild_id, sprint_id, category_id,
+                            title, description, base_difficulty_elo, status, created_at)
+    SELECT 'PLAN-' || n,
+           800000000000000000 + 1 + n % 500,
+           900000000000000000 + 1 + n % 20,
+           (SELECT id FROM sprints WHERE guild_id = 900000000000000000 + 1 + n % 20 ORDER BY id LIMIT 1),
+           (SELECT id FROM categories WHERE guild_id = 900000000000000000 + 1 + n % 20 ORDER BY id LIMIT 1),
+           'Seeded challenge ' || n, 'seeded', 1000,
+           (ARRAY['pending_difficulty', 'active', 'pending_review', 'completed', 'failed', 'rejected'])[1 + n % 6],
+           NOW() - (n * INTERVAL '1 minute')
+    FROM generate_series(1, 20000) n;
+
+    -- The seeded challenges may reach past the vote partitions created so far
+    SELECT ensure_challenge_partitions('approvals', 'approvals', 0, 100000, 1);
+    SELECT ensure_challenge_partitions('difficulty_votes', 'difficulty_votes', 0, 100000, 1);
+
+    INSERT INTO elo_history (user_id, guild_id, challenge_id, elo_before, elo_after, elo_change, reason)
+    SELECT user_id, guild_id, id, 1000, 1010, 10, 'challenge_completed'
+    FROM challenges WHERE challenge_id LIKE 'PLAN-%';
+
+    INSERT INTO approvals (challenge_id, voter_id, guild_id, vote_type)
+    SELECT id, user_id + 1, guild_id, 'approve'
+    FROM challenges WHERE challenge_id LIKE 'PLAN-%';
+
+    INSERT INTO difficulty_votes (challenge_id, voter_id, guild_id, vote_adjustment)
+    SELECT id, user_id + 1, guild_id, 10
+    FROM challenges WHERE challenge_id LIKE 'PLAN-%';
+
+    INSERT INTO sprint_results (sprint_id, guild_id, user_id, final_rank, elo_gain, final_elo, completed, attempted)
+    SELECT s.id, s.guild_id, 800000000000000000 + u, u, 10, 1000, 1, 2
+    FROM sprints s, generate_series(1, 50) u
+    WHERE s.guild_id BETWEEN 900000000000000001 AND 900000000000000020;
+
+    ANALYZE users, categories, sprints, challenges, elo_history, approvals, difficulty_votes, sprint_results;
+'''
+
+# Arguments for each statement, built from the ids the seed produced
+CASES = {
+    'GUILD_CONFIG': lambda ids: [GUILD_ID],
+    'GUILD_CATEGORIES': lambda ids: [GUILD_ID],
+    'ENSURE_USER': lambda ids: [USER_ID, GUILD_ID],
+    'ENSURE_USERS': lambda ids: [[USER_ID], [GUILD_ID]],
+    'DISPLAY_NAMES': lambda ids: [GUILD_ID, [USER_ID, USER_ID + 1]],
+    'RECORD_DISPLAY_NAMES': lambda ids: [[GUILD_ID], [USER_ID], ['Seeded']],
+    'USER': lambda ids: [USER_ID, GUILD_ID],
+    'CHALLENGE_ID_TAKEN': lambda ids: ['PLAN-1'],
+    'ACTIVE_SPRINT': lambda ids: [GUILD_ID, 'active'],
+    'ISSUE_CHALLENGE': lambda ids: ['PLAN-NEW', USER_ID, GUILD_ID, ids['sprint'], ids['category'],
+                                    'Seeded', 'seeded', 1000],
+    'COUNT_ISSUED': lambda ids: [USER_ID, GUILD_ID],
+    'LIST_CHALLENGES': lambda ids: [GUILD_ID, 'active'],
+    'SEARCH_CHALLENGES': lambda ids: [GUILD_ID, 'seeded challenge', None, None, None, None, 11],
+    'SEARCH_CHALLENGES:filtered_page': lambda ids: [GUILD_ID, 'seeded challenge', 'active', ids['category'],
+                                                    0.05, 100000, 11],
+    'OWN_CHALLENGE': lambda ids: ['PLAN-1', USER_ID, GUILD_ID],
+    'SUBMIT_COMPLETION': lambda ids: ['pending_review', 'seeded', ids['now'], 'PLAN-1'],
+    'REVIEWED_CHALLENGE': lambda ids: ['PLAN-1', GUILD_ID],
+    'RECORD_REVIEW_VOTE': lambda ids: [ids['challenge'], USER_ID, GUILD_ID, 'approve', None],
+    'REVIEW_VOTES': lambda ids: [ids['challenge']],
+    'FINALIZE_REVIEW': lambda ids: ['completed', ids['now'], ids['challenge']],
+    'AWARD_ELO': lambda ids: [1010, USER_ID, GUILD_ID],
+    'RECORD_ELO_CHANGE': lambda ids: [USER_ID, GUILD_ID, ids['challenge'], 1000, 1010, 10, 'challenge_completed'],
+    'DIFFICULTY_VOTE_CAST': lambda ids: ['PLAN-1', USER_ID],
+    'CHALLENGE_PK': lambda ids: ['PLAN-1'],
+    'RECORD_DIFFICULTY_VOTE': lambda ids: [ids['challenge'], USER_ID, GUILD_ID, 10],
+    'DIFFICULTY_VOTES': lambda ids: [ids['challenge']],
+    'FINISH_VOTING': lambda ids: ['active', 1000, False, 'PLAN-1'],
+    'PROFILE_RECENT_CHALLENGES': lambda ids: [USER_ID, GUILD_ID],
+    'PROFILE_ELO_HISTORY': lambda ids: [USER_ID, GUILD_ID],
+    'SPRINT_HISTORY': lambda ids: [GUILD_ID, USER_ID, 5],
+    'LEADERBOARD_WEEKLY': lambda ids: [ids['sprint'], GUILD_ID],
+    'LEADERBOARD_ALLTIME': lambda ids: [GUILD_ID],
+    'LATEST_ENDED_SPRINT': lambda ids: [GUILD_ID, 'active'],
+    'ENDED_SPRINT': lambda ids: [ids['ended_sprint'], GUILD_ID, 'active'],
+    'SPRINT_RESULTS': lambda ids: [ids['ended_sprint'], 10],
+    'LATEST_SPRINT': lambda ids: [GUILD_ID],
+    'SPRINT': lambda ids: [ids['sprint'], GUILD_ID],
+    'SPRINT_ROLLUPS': lambda ids: [GUILD_ID, ids['sprint']],
+    'rollups._UPSERT': lambda ids: [GUILD_ID, ids['sprint'], ids['category'], 1, 0, 0, 0, 0, [0] * 11, 0, 0, 0],
+}
+
+
+def statement(case: str) -> str:
+    name = case.split(':')[0]
+    if name.startswith('rollups.'):
+        return getattr(rollups, name.split('.', 1)[1])
+    return getattr(queries, name)
+
+
+def find_seq_scans(plan: dict) -> list:
+    """Return the relation names of every Seq Scan node in a JSON plan tree"""
+    found = []
+    if plan.get('Node Type') == 'Seq Scan':
+        found.append(plan.get('Relation Name', '?'))
+    for child in plan.get('Plans', []):
+        found.extend(find_seq_scans(child))
+    return found
+
+
+def test_every_hot_query_is_checked():
+    hot = {name for name, value in vars(queries).items() if name.isupper() and isinstance(value, str)}
+    checked = {case.split(':')[0] for case in CASES}
+    assert hot - checked == set()
+    assert checked - hot == {'rollups._UPSERT'}
+
+
+@pytest.fixture(scope='module')
+def seeded():
+    """A connection inside a rolled-back transaction holding the seed data"""
+    asyncpg = pytest.importorskip('asyncpg')
+    from dotenv import load_dotenv
+    from utils.db import DatabaseManager
+
+    load_dotenv()
+    manager = DatabaseManager()
+    loop = asyncio.new_event_loop()
+
+    try:
+        manager.db_pool = loop.run_until_complete(
+            asyncpg.create_pool(**manager.connection_settings(), min_size=1, max_size=1, timeout=5)
+        )
+    except (OSError, asyncio.TimeoutError, asyncpg.PostgresError) as e:
+        loop.close()
+        pytest.skip(f"no database reachable: {e}")
+
+    async def prepare():
+        async with manager.db_pool.acquire() as conn:
+            empty = await conn.fetchval("SELECT to_regclass('users') IS NULL")
+        if empty:
+            await manager.load_init_sql()
+        await manager.run_migrations()
+
+        conn = await manager.db_pool.acquire()
+        tr = conn.transaction()
+        await tr.start()
+        await conn.execute(SEED_SQL)
+        ids = {
+            'sprint': (await conn.fetchrow(queries.ACTIVE_SPRINT, GUILD_ID, 'active'))['id'],
+            'ended_sprint': (await conn.fetchrow(queries.LATEST_ENDED_SPRINT, GUILD_ID, 'active'))['id'],
+            'category': (await conn.fetchrow(queries.GUILD_CATEGORIES, GUILD_ID))['id'],
+            'challenge': await conn.fetchval(queries.CHALLENGE_PK, 'PLAN-1'),
+            'now': await conn.fetchval('SELECT NOW()::timestamp'),
+        }
+        await conn.execute('SET LOCAL enable_seqscan = off')
+        return conn, tr, ids
+
+    conn, tr, ids = loop.run_until_complete(prepare())
+    try:
+        yield loop, conn, ids
+    finally:
+        async def teardown():
+            await tr.rollback()
+            await manager.db_pool.release(conn)
+            await manager.db_pool.close()
+
+        loop.run_until_complete(teardown())
+        loop.close()
+
+
+@pytest.mark.parametrize('case', sorted(CASES))
+def test_hot_query_uses_an_index(seeded, case):
+    loop, conn, ids = seeded
+    raw = loop.run_until_complete(conn.fetchval(f'EXPLAIN (FORMAT JSON) {statement(case)}', *CASES[case](ids)))
+    plan = json.loads(raw)[0]['Plan']
+    assert find_seq_scans(plan) == [], f"{case} fell back to a sequential scan"
@@ -0,0 +1,170 @@
+"""Benchmark the member cache modes (MEMBER_CACHE_MODE) on synthetic guilds.
+
+For each guild size and mode, a fresh interpreter builds a discord.py
+ConnectionState with the options the bot would use and replays what the
+gateway sends at startup: one GUILD_CREATE and, in full mode, the
+GUILD_MEMBERS_CHUNK events (1000 members each) that chunking requests.
+Payloads go through discord.py's own parsers, so the cached Member and User
+objects are the real ones.
+
+Reports the resident set size the guild adds and the time spent parsing
+until the guild is ready. Gateway transfer time is not included; full mode
+additionally waits for one chunk round trip per 1000 members, which
+--chunk-rtt-ms adds to the estimate.
+
+    python -m tools.bench_member_cache                        # 10k, 100k and 500k members
+    python -m tools.bench_member_cache --sizes 50000 --modes lean
+"""
+import argparse
+import gc
+import json
+import os
+import subprocess
+import sys
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import discord
+from discord.state import ConnectionState
+
+from utils.names import member_cache_options
+
+DEFAULT_SIZES = '10000,100000,500000'
+CHUNK_SIZE = 1000
+GUILD_ID = 700_000_000_000_000_000
+USER_BASE = 600_000_000_000_000_000
+
+
+def rss_bytes() -> int:
+    """Current resident set size; falls back to the peak where /proc is unavailable"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def guild_payload(members: int) -> dict:
+    return {
+        'id': str(GUILD_ID),
+        'name': 'Benchmark Guild',
+        'owner_id': str(USER_BASE),
+        'member_count': members,
+        'large': True,
+        'roles': [{'id': str(GUILD_ID), 'name': '@everyone', 'permissions': '0', 'position': 0,
+                   'color': 0, 'hoist': False, 'managed': False, 'mentionable': False}],
+        'emojis': [], 'stickers': [], 'features': [], 'channels': [], 'threads': [],
+        'members': [], 'presences': [], 'voice_states': [], 'stage_instances': [],
+        'guild_scheduled_events': [],
+        'verification_level': 0, 'default_message_notifications': 0, 'explicit_content_filter': 0,
+        'mfa_level': 0, 'nsfw_level': 0, 'premium_tier': 0, 'afk_timeout': 300,
+        'preferred_locale': 'en-US',
+    }
+
+
+def member_payload(i: int) -> dict:
+    return {
+        'user': {'id': str(USER_BASE + i), 'username': f'member{i}', 'discriminator': '0',
+                 'global_name': f'Member {i}', 'avatar': None},
+        'nick': f'Nick {i}' if i % 4 == 0 else None,
+        'roles': [],
+        'joined_at': '2024-01-01T00:00:00+00:00',
+        'deaf': False,
+        'mute': False,
+        'flags': 0,
+    }
+
+
+def run_one(members: int, mode: str) -> dict:
+    """Build one guild the way the bot's connection state would and measure it"""
+    os.environ['MEMBER_CACHE_MODE'] = mode
+    intents = discord.Intents.default()
+    intents.members = True
+    options = member_cache_options(intents)
+
+    state = ConnectionState(dispatch=lambda *args, **kwargs: None, handlers={}, hooks={}, http=None,
+                            intents=intents, **options)
+    gc.collect()
+    baseline = rss_bytes()
+
+    parse_time = 0.0
+    started = time.perf_counter()
+    guild = discord.Guild(data=guild_payload(members), state=state)
+    state._add_guild(guild)
+    parse_time += time.perf_counter() - started
+
+    chunks = 0
+    if options['chunk_guilds_at_startup']:
+        chunk_count = -(-members // CHUNK_SIZE)
+        for index in range(chunk_count):
+            # Built outside the timed section; only the parse is measured
+            chunk = {
+                'guild_id': str(GUILD_ID),
+                'members': [member_payload(i) for i in range(index * CHUNK_SIZE, min(members, (index + 1) * CHUNK_SIZE))],
+                'chunk_index': index,
+                'chunk_count': chunk_count,
+            }
+            started = time.perf_counter()
+            state.parse_guild_members_chunk(chunk)
+            parse_time += time.perf_counter() - started
+            chunks += 1
+        del chunk
+
+    gc.collect()
+    return {
+        'members': members,
+        'mode': mode,
+        'cached': len(guild._members),
+        'chunks': chunks,
+        'rss_bytes': rss_bytes() - baseline,
+        'parse_seconds': parse_time,
+    }
+
+
+def run_isolated(members: int, mode: str) -> dict:
+    """Run one measurement in a fresh interpreter so earlier runs don't inflate its RSS"""
+    result = subprocess.run(
+        [sys.executable, '-m', 'tools.bench_member_cache', '--child', str(members), mode],
+        capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def report(results, chunk_rtt: float):
+    print(f"{'members':>9} {'mode':<5} {'cached':>8} {'RSS':>10} {'per member':>11} {'parse':>9} {'est. ready':>11}")
+    for r in results:
+        per_member = r['rss_bytes'] / r['members'] if r['members'] else 0
+        ready = r['parse_seconds'] + r['chunks'] * chunk_rtt
+        print(
+            f"{r['members']:>9} {r['mode']:<5} {r['cached']:>8} {r['rss_bytes'] / 2**20:>8.1f}MB "
+            f"{per_member:>9.0f}B {r['parse_seconds']:>8.2f}s {ready:>10.2f}s"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help=f'comma-separated guild sizes (default: {DEFAULT_SIZES})')
+    parser.add_argument('--modes', default='full,lean', help='comma-separated cache modes (default: full,lean)')
+    parser.add_argument('--chunk-rtt-ms', type=float, default=0.0,
+                        help='gateway round trip added per member chunk in the ready estimate (default: 0)')
+    parser.add_argument('--child', nargs=2, metavar=('MEMBERS', 'MODE'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_one(int(args.child[0]), args.child[1])))
+        return
+
+    results = []
+    for size in (int(s) for s in args.sizes.split(',')):
+        for mode in args.modes.split(','):
+            results.append(run_isolated(size, mode.strip()))
+    report(results, args.chunk_rtt_ms / 1000)
+
+
+if __name__ == '__main__':
+    main()
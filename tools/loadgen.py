@@ -0,0 +1,497 @@
+"""Synthetic load generator that drives the cogs with realistic guild traffic.
+
+Seeds N guilds with M members and K challenges each, then replays a mix of
+challenge, vote, complete, approve, leaderboard and profile operations
+through the real cog callbacks, with stand-in Discord objects, at a target
+rate for a fixed duration. Operations are issued open-loop: latency is
+measured from each operation's scheduled start, so a backed-up pool shows up
+as latency instead of silently lowering the offered load.
+
+Reports p50/p95/p99 latency per operation, achieved throughput, connection
+pool wait and error rate. Seeded rows use a reserved guild ID range and are
+deleted afterwards unless --keep is given.
+
+    python -m tools.loadgen                                   # defaults, DB_* env vars
+    python -m tools.loadgen --guilds 50 --users 500 --rate 200 --duration 120
+    python -m tools.loadgen --mix leaderboard=5,profile=5 --scheduler
+    python -m tools.loadgen --init                            # load init.sql first
+"""
+import argparse
+import asyncio
+import itertools
+import random
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from utils.db import db_manager
+from utils.metrics import Histogram
+from utils.partitions import ensure_partitions
+from utils.scheduler import CLASS_COSTS, scheduler
+from utils.throttle import COMMAND_CLASSES, Throttled, throttle
+from utils.ui import DifficultyVotingView
+from cogs.challenges import ChallengesCog
+from cogs.leaderboard import LeaderboardCog
+from cogs.profile import ProfileCog
+
+GUILD_BASE = 700_000_000_000_000_000
+# Every seeded guild ID falls in (GUILD_BASE, GUILD_END)
+GUILD_END = GUILD_BASE + 1_000_000_000
+USER_BASE = 600_000_000_000_000_000
+CATEGORIES_PER_GUILD = 6
+
+DEFAULT_MIX = 'challenge=2,vote=3,complete=2,approve=2,leaderboard=4,profile=4'
+
+# Operation name -> command whose cost class it is charged under
+OPERATION_COMMANDS = {
+    'challenge': 'challenge',
+    'vote': None,
+    'complete': 'complete',
+    'approve': 'approve',
+    'leaderboard': 'leaderboard',
+    'profile': 'profile',
+}
+
+SEED_STATEMENTS = [
+    '''INSERT INTO users (user_id, guild_id, current_elo, total_challenges)
+       SELECT $3::bigint + u, $2::bigint + g, 800 + (u * 7) % 600, 0
+       FROM generate_series(1, $1::int) g, generate_series(1, $4::int) u
+       ON CONFLICT (user_id, guild_id) DO NOTHING''',
+    '''INSERT INTO categories (guild_id, name, description)
+       SELECT $2::bigint + g, 'Category ' || c, 'loadgen'
+       FROM generate_series(1, $1::int) g, generate_series(1, $3::int) c
+       ON CONFLICT (guild_id, name) DO NOTHING''',
+    '''INSERT INTO sprints (guild_id, start_date, end_date, status)
+       SELECT $2::bigint + g, now() AT TIME ZONE 'utc' - INTERVAL '1 day', now() AT TIME ZONE 'utc' + INTERVAL '6 days', 'active'
+       FROM generate_series(1, $1::int) g''',
+    '''INSERT INTO challenges (challenge_id, user_id, guild_id, sprint_id, category_id, title, description,
+                               base_difficulty_elo, final_difficulty_elo, difficulty_voting_active, status,
+                               created_at, completed_at, reviewed_at)
+       SELECT 'LOAD-' || g || '-' || n, $3::bigint + 1 + n % $4::int, s.guild_id, s.id, cat.id,
+              'Load challenge ' || n, 'loadgen', 300 + (n * 37) % 1200,
+              CASE WHEN n % 4 = 0 THEN NULL ELSE 300 + (n * 37) % 1200 END,
+              n % 4 = 0,
+              (ARRAY['pending_difficulty', 'active', 'pending_review', 'completed'])[1 + n % 4],
+              now() AT TIME ZONE 'utc' - (n * INTERVAL '1 minute'),
+              CASE WHEN n % 4 >= 2 THEN now() AT TIME ZONE 'utc' - (n * INTERVAL '30 seconds') END,
+              CASE WHEN n % 4 = 3 THEN now() AT TIME ZONE 'utc' - (n * INTERVAL '10 seconds') END
+       FROM generate_series(1, $1::int) g
+       JOIN sprints s ON s.guild_id = $2::bigint + g AND s.status = 'active'
+       CROSS JOIN generate_series(1, $5::int) n
+       JOIN categories cat ON cat.guild_id = s.guild_id AND cat.name = 'Category ' || (1 + n % 6)''',
+]
+
+HISTORY_STATEMENT = '''
+    INSERT INTO elo_history (user_id, guild_id, challenge_id, elo_before, elo_after, elo_change, reason)
+    SELECT user_id, guild_id, id, 1000, 1012, 12, 'challenge_completed'
+    FROM challenges WHERE guild_id BETWEEN $1 AND $2 AND status = 'completed'
+'''
+
+CLEANUP_TABLES = (
+    'approvals', 'difficulty_votes', 'elo_history', 'sprint_results', 'challenge_rollups',
+    'challenges', 'sprints', 'categories', 'users', 'guild_config',
+)
+
+
+class FakeUser:
+    def __init__(self, user_id: int, guild=None, administrator: bool = False):
+        self.id = user_id
+        self.bot = False
+        self.guild = guild
+        self.name = self.display_name = f"load-{user_id - USER_BASE}"
+        self.mention = f"<@{user_id}>"
+        self.guild_permissions = type('Permissions', (), {'administrator': administrator})()
+
+
+class FakeChannel:
+    def __init__(self, channel_id: int):
+        self.id = channel_id
+
+
+class FakeMessage:
+    def __init__(self, message_id: int, channel: FakeChannel):
+        self.id = message_id
+        self.channel = channel
+
+    async def edit(self, **kwargs):
+        pass
+
+
+class FakeGuild:
+    def __init__(self, guild_id: int):
+        self.id = guild_id
+        self.name = f"loadgen-{guild_id - GUILD_BASE}"
+
+    def get_member(self, user_id: int):
+        return None
+
+    def get_channel(self, channel_id: int):
+        return None
+
+    async def query_members(self, **kwargs):
+        return []
+
+
+class FakeBot:
+    def get_channel(self, channel_id: int):
+        return None
+
+    def get_guild(self, guild_id: int):
+        return None
+
+    def get_user(self, user_id: int):
+        return None
+
+
+class FakeContext:
+    """Just enough of commands.Context for the cog callbacks; records replies instead of sending them"""
+
+    def __init__(self, guild: FakeGuild, author: FakeUser):
+        self.guild = guild
+        self.author = author
+        self.interaction = None
+        self.replies: List[dict] = []
+
+    async def defer(self, **kwargs):
+        pass
+
+    async def send(self, content=None, **kwargs):
+        self.replies.append(dict(kwargs, content=content))
+
+    @property
+    def rejected(self) -> bool:
+        return any((reply['content'] or '').startswith('❌') for reply in self.replies)
+
+
+class FakeResponse:
+    def __init__(self):
+        self.messages: List[str] = []
+
+    async def defer(self, **kwargs):
+        pass
+
+    async def send_message(self, content=None, **kwargs):
+        self.messages.append(content or '')
+
+
+class FakeInteraction:
+    def __init__(self, guild: FakeGuild, user: FakeUser, message: FakeMessage):
+        self.guild = guild
+        self.guild_id = guild.id
+        self.user = user
+        self.message = message
+        self.response = FakeResponse()
+
+    @property
+    def rejected(self) -> bool:
+        return any(message.startswith('❌') for message in self.response.messages)
+
+
+class _TimedAcquire:
+    def __init__(self, timed_pool, context):
+        self._timed_pool = timed_pool
+        self._context = context
+
+    async def __aenter__(self):
+        started = time.perf_counter()
+        conn = await self._context.__aenter__()
+        self._timed_pool.waits.observe((time.perf_counter() - started) * 1000)
+        return conn
+
+    async def __aexit__(self, *exc_info):
+        return await self._context.__aexit__(*exc_info)
+
+
+class TimedPool:
+    """Wraps an asyncpg pool and records how long each acquire waited for a connection"""
+
+    def __init__(self, pool):
+        self._pool = pool
+        self.waits = Histogram(window=100000)
+
+    def acquire(self, **kwargs):
+        return _TimedAcquire(self, self._pool.acquire(**kwargs))
+
+    def __getattr__(self, name):
+        return getattr(self._pool, name)
+
+
+class Workload:
+    """Seeded guilds plus the challenges each operation can act on next"""
+
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.guilds = [FakeGuild(GUILD_BASE + g) for g in range(1, args.guilds + 1)]
+        self.voting_channel = FakeChannel(1)
+        self.message_ids = itertools.count(1)
+        self.pending_difficulty: Dict[int, List[tuple]] = defaultdict(list)
+        self.active: Dict[int, List[tuple]] = defaultdict(list)
+        self.pending_review: Dict[int, List[tuple]] = defaultdict(list)
+        bot = FakeBot()
+        self.challenges = ChallengesCog(bot)
+        self.leaderboard = LeaderboardCog(bot)
+        self.profile = ProfileCog(bot)
+
+    def member(self, guild: FakeGuild, exclude: int = None) -> FakeUser:
+        while True:
+            user_id = USER_BASE + self.rng.randint(1, self.args.users)
+            if user_id != exclude:
+                return FakeUser(user_id, guild)
+
+    def take(self, queues: Dict[int, List[tuple]], guild: FakeGuild):
+        """Remove and return a random item for the guild, or None if it has none"""
+        items = queues[guild.id]
+        if not items:
+            return None
+        index = self.rng.randrange(len(items))
+        items[index], items[-1] = items[-1], items[index]
+        return items.pop()
+
+    async def load(self):
+        async with db_manager.db_pool.acquire() as conn:
+            rows = await conn.fetch(
+                '''SELECT challenge_id, user_id, guild_id, status, base_difficulty_elo FROM challenges
+                   WHERE guild_id BETWEEN $1 AND $2 AND status = ANY($3::varchar[])''',
+                GUILD_BASE + 1, GUILD_BASE + self.args.guilds, ['pending_difficulty', 'active', 'pending_review']
+            )
+        for row in rows:
+            if row['status'] == 'pending_difficulty':
+                self.pending_difficulty[row['guild_id']].append((row['challenge_id'], row['base_difficulty_elo']))
+            elif row['status'] == 'active':
+                self.active[row['guild_id']].append((row['challenge_id'], row['user_id']))
+            else:
+                self.pending_review[row['guild_id']].append((row['challenge_id'], row['user_id']))
+
+    async def run(self, operation: str, guild: FakeGuild) -> bool:
+        """Run one operation through the cog code path; returns False if the bot refused it"""
+        if operation == 'vote' and self.pending_difficulty[guild.id]:
+            return await self.vote(guild)
+        if operation == 'complete' and self.active[guild.id]:
+            return await self.complete(guild)
+        if operation == 'approve' and self.pending_review[guild.id]:
+            return await self.approve(guild)
+        if operation == 'leaderboard':
+            ctx = FakeContext(guild, self.member(guild))
+            await self.leaderboard.leaderboard.callback(self.leaderboard, ctx, self.rng.choice(['weekly', 'alltime']))
+            return not ctx.rejected
+        if operation == 'profile':
+            ctx = FakeContext(guild, self.member(guild))
+            await self.profile.user_profile.callback(self.profile, ctx, None)
+            return not ctx.rejected
+        # Issuing is also the fallback when a guild has nothing left to vote on, complete or review
+        return await self.issue(guild)
+
+    async def issue(self, guild: FakeGuild) -> bool:
+        ctx = FakeContext(guild, self.member(guild))
+        await self.challenges.issue_challenge.callback(
+            self.challenges, ctx, f"Category {self.rng.randint(1, CATEGORIES_PER_GUILD)}",
+            self.rng.randint(300, 1500), description="Synthetic load challenge"
+        )
+        for reply in ctx.replies:
+            embed = reply.get('embed')
+            if embed is not None and embed.fields:
+                # No voting channel in the fake guild, so new challenges go straight to active
+                self.active[guild.id].append((embed.fields[0].value, ctx.author.id))
+        return not ctx.rejected
+
+    async def vote(self, guild: FakeGuild) -> bool:
+        challenge_id, base = self.rng.choice(self.pending_difficulty[guild.id])
+        view = DifficultyVotingView(challenge_id, base)
+        message = FakeMessage(next(self.message_ids), self.voting_channel)
+        if self.rng.random() < 0.2:
+            self.pending_difficulty[guild.id].remove((challenge_id, base))
+            interaction = FakeInteraction(guild, self.member(guild), message)
+            interaction.user.guild_permissions.administrator = True
+            await view.finish_voting(interaction)
+            owner = await self.owner(challenge_id)
+            self.active[guild.id].append((challenge_id, owner))
+        else:
+            interaction = FakeInteraction(guild, self.member(guild), message)
+            await view.process_vote(interaction, self.rng.choice([-10, 10]))
+        view.stop()
+        return not interaction.rejected
+
+    async def owner(self, challenge_id: str) -> int:
+        async with db_manager.db_pool.acquire() as conn:
+            return await conn.fetchval('SELECT user_id FROM challenges WHERE challenge_id = $1', challenge_id)
+
+    async def complete(self, guild: FakeGuild) -> bool:
+        challenge_id, user_id = self.take(self.active, guild)
+        ctx = FakeContext(guild, FakeUser(user_id, guild))
+        await self.challenges.submit_completion.callback(
+            self.challenges, ctx, challenge_id, proof="https://example.com/proof"
+        )
+        if not ctx.rejected:
+            self.pending_review[guild.id].append((challenge_id, user_id))
+        return not ctx.rejected
+
+    async def approve(self, guild: FakeGuild) -> bool:
+        challenge_id, user_id = self.take(self.pending_review, guild)
+        ctx = FakeContext(guild, self.member(guild, exclude=user_id))
+        await self.challenges.approve_challenge.callback(self.challenges, ctx, challenge_id, comment=None)
+        return not ctx.rejected
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in OPERATION_COMMANDS:
+            raise SystemExit(f"Unknown operation '{name}'; choose from {', '.join(OPERATION_COMMANDS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+async def seed(args):
+    last_guild = GUILD_BASE + args.guilds
+    async with db_manager.db_pool.acquire() as conn:
+        async with conn.transaction():
+            await cleanup_rows(conn)
+            first_id = await conn.fetchval('SELECT COALESCE(max(id), 0) + 1 FROM challenges')
+            await conn.execute(SEED_STATEMENTS[0], args.guilds, GUILD_BASE, USER_BASE, args.users)
+            await conn.execute(SEED_STATEMENTS[1], args.guilds, GUILD_BASE, CATEGORIES_PER_GUILD)
+            await conn.execute(SEED_STATEMENTS[2], args.guilds, GUILD_BASE)
+            await conn.execute(SEED_STATEMENTS[3], args.guilds, GUILD_BASE, USER_BASE, args.users, args.challenges)
+            # Vote partitions must cover the seeded challenge IDs before any vote references them
+            await ensure_partitions(conn, first_challenge_id=first_id)
+            await conn.execute(HISTORY_STATEMENT, GUILD_BASE + 1, last_guild)
+        await conn.execute('ANALYZE users, categories, sprints, challenges, elo_history')
+    # Drop anything a shared cache tier still holds from an earlier run
+    for g in range(1, args.guilds + 1):
+        await db_manager.reload_guild(GUILD_BASE + g)
+    print(f"Seeded {args.guilds} guilds x {args.users} users x {args.challenges} challenges")
+
+
+async def cleanup_rows(conn):
+    for table in CLEANUP_TABLES:
+        await conn.execute(f'DELETE FROM {table} WHERE guild_id > $1 AND guild_id < $2', GUILD_BASE, GUILD_END)
+
+
+async def drive(workload: Workload, args) -> dict:
+    mix = parse_mix(args.mix)
+    operations, weights = list(mix), list(mix.values())
+    latencies = defaultdict(lambda: Histogram(window=1000000))
+    outcomes = defaultdict(lambda: defaultdict(int))
+    inflight = asyncio.Semaphore(args.max_inflight)
+    tasks = set()
+
+    async def one(operation: str, guild: FakeGuild, scheduled: float):
+        try:
+            command = OPERATION_COMMANDS[operation]
+            if args.throttle and command:
+                user_id = USER_BASE + workload.rng.randint(1, args.users)
+                throttle.acquire(COMMAND_CLASSES.get(command, 'light'), user_id, guild.id)
+            if args.scheduler:
+                cost = CLASS_COSTS.get(COMMAND_CLASSES.get(command, 'light'), 1.0)
+                async with scheduler.slot(guild.id, cost, priority=operation == 'vote'):
+                    accepted = await workload.run(operation, guild)
+            else:
+                accepted = await workload.run(operation, guild)
+            outcomes[operation]['ok' if accepted else 'refused'] += 1
+        except Throttled:
+            outcomes[operation]['throttled'] += 1
+        except Exception as e:
+            outcomes[operation]['error'] += 1
+            if outcomes[operation]['error'] <= 3:
+                print(f"{operation} failed: {type(e).__name__}: {e}", file=sys.stderr)
+        finally:
+            latencies[operation].observe((time.perf_counter() - scheduled) * 1000)
+            inflight.release()
+
+    started = time.perf_counter()
+    for n in itertools.count():
+        scheduled = started + n / args.rate
+        if scheduled - started >= args.duration:
+            break
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        await inflight.acquire()
+        operation = workload.rng.choices(operations, weights)[0]
+        guild = workload.rng.choice(workload.guilds)
+        task = asyncio.create_task(one(operation, guild, scheduled))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    if tasks:
+        await asyncio.wait(tasks)
+    elapsed = time.perf_counter() - started
+    return {'latencies': latencies, 'outcomes': outcomes, 'elapsed': elapsed}
+
+
+def report(result: dict, pools: Dict[str, TimedPool], args):
+    latencies, outcomes, elapsed = result['latencies'], result['outcomes'], result['elapsed']
+    total = sum(sum(counts.values()) for counts in outcomes.values())
+    errors = sum(counts['error'] for counts in outcomes.values())
+
+    print(f"\n{total} operations in {elapsed:.1f}s: {total / elapsed:.1f} ops/s (target {args.rate}/s)")
+    print(f"error rate {errors / total * 100 if total else 0:.2f}%\n")
+    print(f"{'operation':<12} {'count':>7} {'ok':>7} {'refused':>8} {'throttled':>9} {'errors':>7}"
+          f" {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for operation in sorted(latencies):
+        summary = latencies[operation].summary()
+        counts = outcomes[operation]
+        print(f"{operation:<12} {summary['count']:>7} {counts['ok']:>7} {counts['refused']:>8} {counts['throttled']:>9}"
+              f" {counts['error']:>7} {summary['p50']:>8.1f} {summary['p95']:>8.1f} {summary['p99']:>8.1f} {summary['max']:>8.1f}")
+
+    print()
+    for name, pool in pools.items():
+        summary = pool.waits.summary()
+        print(f"pool wait ({name}): {summary['count']} acquires, p50 {summary['p50']:.2f} ms,"
+              f" p95 {summary['p95']:.2f} ms, p99 {summary['p99']:.2f} ms, max {summary['max']:.2f} ms")
+
+
+async def main_async(args) -> int:
+    if args.init:
+        await db_manager.load_init_sql()
+    await db_manager.init_db()
+    try:
+        await seed(args)
+        pools = {'primary': TimedPool(db_manager.db_pool)}
+        db_manager.db_pool = pools['primary']
+        if db_manager.read_pool is not None:
+            pools['read'] = TimedPool(db_manager.read_pool)
+            db_manager.read_pool = pools['read']
+
+        workload = Workload(args)
+        await workload.load()
+        result = await drive(workload, args)
+        report(result, pools, args)
+        errors = sum(counts['error'] for counts in result['outcomes'].values())
+    finally:
+        if not args.keep:
+            async with db_manager.db_pool.acquire() as conn:
+                async with conn.transaction():
+                    await cleanup_rows(conn)
+        await db_manager.close()
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--guilds', type=int, default=10, help='guilds to seed (default: 10)')
+    parser.add_argument('--users', type=int, default=200, help='members per guild (default: 200)')
+    parser.add_argument('--challenges', type=int, default=400, help='challenges per guild (default: 400)')
+    parser.add_argument('--rate', type=float, default=50, help='operations started per second (default: 50)')
+    parser.add_argument('--duration', type=float, default=30, help='seconds to generate load for (default: 30)')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f'operation weights (default: {DEFAULT_MIX})')
+    parser.add_argument('--max-inflight', type=int, default=1000, help='cap on concurrent operations (default: 1000)')
+    parser.add_argument('--scheduler', action='store_true', help='run operations through the fair scheduler')
+    parser.add_argument('--throttle', action='store_true', help='charge operations to the throttle buckets')
+    parser.add_argument('--seed', type=int, default=1, help='random seed (default: 1)')
+    parser.add_argument('--keep', action='store_true', help='leave the seeded rows in place')
+    parser.add_argument('--init', action='store_true', help='run init.sql before migrating')
+    args = parser.parse_args()
+
+    errors = asyncio.run(main_async(args))
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,345 @@
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_MISS = object()
+
+
+def _encode(value: Any) -> str:
+    def default(obj):
+        if isinstance(obj, datetime):
+            return {'__dt__': obj.isoformat()}
+        if isinstance(obj, date):
+            return {'__date__': obj.isoformat()}
+        raise TypeError(f"Cannot cache value of type {type(obj).__name__}")
+    return json.dumps(value, default=default, separators=(',', ':'))
+
+
+def _decode(raw: str) -> Any:
+    def object_hook(obj):
+        if '__dt__' in obj:
+            return datetime.fromisoformat(obj['__dt__'])
+        if '__date__' in obj:
+            return date.fromisoformat(obj['__date__'])
+        return obj
+    return json.loads(raw, object_hook=object_hook)
+
+
+# Seconds invalidation counters live after their last bump; must exceed every entry TTL
+COUNTER_TTL = 86400
+
+
+def _group(name: str) -> str:
+    """Entries invalidated together share their name's first `:` segment ('leaderboard', 'profile', ...)"""
+    return name.split(':', 1)[0]
+
+
+class MemoryBackend:
+    """In-process LRU store with per-key TTLs"""
+
+    def __init__(self, max_entries: int = 50000):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        # Kept apart from _data so LRU eviction can never reset an invalidation counter
+        self._counters: Dict[str, Tuple[int, float]] = {}
+        self._next_sweep = 1024
+
+    def _get(self, key: str) -> Optional[str]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, raw = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return raw
+
+    def counter(self, key: str) -> Optional[int]:
+        entry = self._counters.get(key)
+        if entry is None:
+            return None
+        if entry[1] <= time.monotonic():
+            del self._counters[key]
+            return None
+        return entry[0]
+
+    async def get(self, key: str) -> Optional[str]:
+        return self._get(key)
+
+    async def get_many(self, keys: List[str]) -> List[Optional[str]]:
+        """Values for data and counter keys alike, like Redis MGET"""
+        values = []
+        for key in keys:
+            count = self.counter(key)
+            values.append(str(count) if count is not None else self._get(key))
+        return values
+
+    async def set(self, key: str, raw: str, ttl: Optional[float] = None):
+        self.load(key, raw, ttl)
+
+    async def add(self, key: str, raw: str, ttl: float) -> bool:
+        """Set only if the key is absent; used for cross-caller locks"""
+        if self._get(key) is not None:
+            return False
+        self.load(key, raw, ttl)
+        return True
+
+    async def incr(self, keys: Iterable[str], ttl: float):
+        expires_at = time.monotonic() + ttl
+        for key in keys:
+            self._counters[key] = ((self.counter(key) or 0) + 1, expires_at)
+        if len(self._counters) >= self._next_sweep:
+            now = time.monotonic()
+            self._counters = {key: entry for key, entry in self._counters.items() if entry[1] > now}
+            self._next_sweep = max(1024, len(self._counters) * 2)
+
+    async def delete(self, *keys: str):
+        for key in keys:
+            self._data.pop(key, None)
+
+    async def close(self):
+        self._data.clear()
+        self._counters.clear()
+
+    def entries(self) -> List[Tuple[str, Optional[float], str]]:
+        """Unexpired entries as (key, seconds left or None, raw value), least recently used first"""
+        now = time.monotonic()
+        return [
+            (key, None if expires_at is None else expires_at - now, raw)
+            for key, (expires_at, raw) in self._data.items()
+            if expires_at is None or expires_at > now
+        ]
+
+    def load(self, key: str, raw: str, ttl: Optional[float]):
+        """Synchronous `set`, for restoring entries outside the event loop's request path"""
+        self._data[key] = (time.monotonic() + ttl if ttl is not None else None, raw)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+
+class RedisBackend:
+    """Shared store on a redis.asyncio client (or utils.fake_redis.FakeRedis in tests)"""
+
+    # Only delete the lock if we still own it
+    _RELEASE_SCRIPT = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+
+    def __init__(self, client):
+        self.client = client
+
+    @staticmethod
+    def _text(raw) -> Optional[str]:
+        return raw.decode() if isinstance(raw, bytes) else raw
+
+    async def get(self, key: str) -> Optional[str]:
+        return self._text(await self.client.get(key))
+
+    async def get_many(self, keys: List[str]) -> List[Optional[str]]:
+        return [self._text(raw) for raw in await self.client.mget(keys)]
+
+    async def set(self, key: str, raw: str, ttl: Optional[float] = None):
+        await self.client.set(key, raw, px=int(ttl * 1000) if ttl else None)
+
+    async def add(self, key: str, raw: str, ttl: float) -> bool:
+        return bool(await self.client.set(key, raw, px=int(ttl * 1000), nx=True))
+
+    async def release(self, key: str, token: str):
+        await self.client.eval(self._RELEASE_SCRIPT, 1, key, token)
+
+    async def incr(self, keys: Iterable[str], ttl: float):
+        async with self.client.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.incr(key)
+                pipe.pexpire(key, int(ttl * 1000))
+            await pipe.execute()
+
+    async def delete(self, *keys: str):
+        if keys:
+            await self.client.delete(*keys)
+
+    async def close(self):
+        await self.client.aclose()
+
+
+class Cache:
+    """Namespaced, per-guild cache in front of a pluggable backend.
+
+    Keys look like `<namespace>:<guild_id>:<name>`. Each stored value is
+    tagged with three counters: the guild's generation, the generation of
+    the name's group (its first `:` segment) and the name's own version.
+    Invalidating bumps a counter, so dropping every leaderboard of a guild
+    is one increment rather than a key scan. Values with an outdated tag
+    are misses and age out by TTL. A load that was already running when
+    its entry was invalidated stores under the old tag, so its result is
+    never served afterwards.
+
+    `get_or_load` protects the database from stampedes twice over:
+    concurrent misses in this process share a single load, and processes
+    sharing a Redis backend take a short lock so only one of them runs the
+    loader while the others wait for its result.
+    """
+
+    LOCK_TTL = 5.0
+    LOCK_POLL = 0.05
+
+    def __init__(self, backend, namespace: str = 'elo'):
+        self.backend = backend
+        self.namespace = namespace
+        self._inflight: Dict[Tuple[str, str], asyncio.Future] = {}
+
+    def key(self, guild_id: int, name: str) -> str:
+        return f"{self.namespace}:{guild_id}:{name}"
+
+    def _counter_keys(self, guild_id: int, name: str) -> List[str]:
+        # '#' never starts an entry name, so these can't collide with entries
+        prefix = f"{self.namespace}:{guild_id}:#"
+        return [f"{prefix}gen", f"{prefix}gen:{_group(name)}", f"{prefix}ver:{name}"]
+
+    async def _lookup(self, guild_id: int, name: str) -> Tuple[Any, str]:
+        """(value or _MISS, the tag a value stored now would get), in one backend round trip"""
+        raw, *counters = await self.backend.get_many([self.key(guild_id, name), *self._counter_keys(guild_id, name)])
+        tag = '.'.join(str(int(count or 0)) for count in counters)
+        if raw is not None:
+            stored_tag, _, payload = raw.partition('|')
+            if stored_tag == tag:
+                return _decode(payload), tag
+        return _MISS, tag
+
+    async def get(self, guild_id: int, name: str) -> Any:
+        value, _ = await self._lookup(guild_id, name)
+        return None if value is _MISS else value
+
+    async def set(self, guild_id: int, name: str, value: Any, ttl: float):
+        _, tag = await self._lookup(guild_id, name)
+        await self.backend.set(self.key(guild_id, name), f"{tag}|{_encode(value)}", ttl)
+
+    async def delete(self, guild_id: int, *names: str):
+        """Invalidate the named entries, including loads of them still in flight"""
+        if not names:
+            return
+        prefix = f"{self.namespace}:{guild_id}:#ver:"
+        await self.backend.incr([prefix + name for name in names], COUNTER_TTL)
+        await self.backend.delete(*(self.key(guild_id, name) for name in names))
+
+    async def delete_group(self, guild_id: int, group: str):
+        """Invalidate every entry of a guild named `group` or `group:...`"""
+        await self.backend.incr([f"{self.namespace}:{guild_id}:#gen:{group}"], COUNTER_TTL)
+
+    async def clear_guild(self, guild_id: int):
+        await self.backend.incr([f"{self.namespace}:{guild_id}:#gen"], COUNTER_TTL)
+
+    async def get_or_load(self, guild_id: int, name: str, loader: Callable[[], Awaitable[Any]], ttl: float) -> Any:
+        """Return the cached value, running `loader` at most once per key and tag on a miss"""
+        value, tag = await self._lookup(guild_id, name)
+        if value is not _MISS:
+            return value
+
+        # Keyed by tag too, so nobody joins a load that started before an invalidation
+        inflight_key = (self.key(guild_id, name), tag)
+        pending = self._inflight.get(inflight_key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[inflight_key] = future
+        try:
+            value = await self._load(guild_id, name, tag, loader, ttl)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark retrieved so an unawaited failure doesn't log a warning
+            future.exception()
+            raise
+        finally:
+            del self._inflight[inflight_key]
+
+    async def _load(self, guild_id: int, name: str, tag: str, loader, ttl: float) -> Any:
+        key = self.key(guild_id, name)
+        if isinstance(self.backend, MemoryBackend):
+            value = await loader()
+            await self.backend.set(key, f"{tag}|{_encode(value)}", ttl)
+            return value
+
+        lock_key = f"{key}:lock"
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + self.LOCK_TTL
+        while not await self.backend.add(lock_key, token, self.LOCK_TTL):
+            # Another process is loading; wait for its result instead of piling on
+            await asyncio.sleep(self.LOCK_POLL)
+            value, _ = await self._lookup(guild_id, name)
+            if value is not _MISS:
+                return value
+            if time.monotonic() >= deadline:
+                break
+
+        try:
+            value = await loader()
+            await self.backend.set(key, f"{tag}|{_encode(value)}", ttl)
+            return value
+        finally:
+            await self.backend.release(lock_key, token)
+
+    async def close(self):
+        await self.backend.close()
+
+    def _current_tag(self, guild_id: int, name: str) -> str:
+        return '.'.join(str(self.backend.counter(key) or 0) for key in self._counter_keys(guild_id, name))
+
+    def export(self) -> List[Tuple[int, str, Optional[float], str]]:
+        """Live entries as (guild_id, name, seconds left, raw value); empty for a shared backend, which outlives the process anyway"""
+        if not isinstance(self.backend, MemoryBackend):
+            return []
+        prefix = f"{self.namespace}:"
+        entries = []
+        for key, ttl, raw in self.backend.entries():
+            if not key.startswith(prefix):
+                continue
+            guild_id, name = key[len(prefix):].split(':', 1)
+            stored_tag, _, payload = raw.partition('|')
+            # Invalidated entries linger until their TTL; leave them behind
+            if stored_tag == self._current_tag(int(guild_id), name):
+                entries.append((int(guild_id), name, ttl, payload))
+        return entries
+
+    def restore(self, entries: Iterable[Tuple[int, str, Optional[float], str]], max_ttl: Optional[float] = None) -> int:
+        """Load entries from `export`, optionally expiring them within `max_ttl` seconds"""
+        if not isinstance(self.backend, MemoryBackend):
+            return 0
+        count = 0
+        for guild_id, name, ttl, raw in entries:
+            if max_ttl is not None:
+                ttl = max_ttl if ttl is None else min(ttl, max_ttl)
+            self.backend.load(self.key(guild_id, name), f"{self._current_tag(guild_id, name)}|{raw}", ttl)
+            count += 1
+        return count
+
+
+def create_cache() -> Cache:
+    """Build the cache tier selected by CACHE_BACKEND (memory, redis or fakeredis)"""
+    kind = os.getenv('CACHE_BACKEND', 'memory').lower()
+    namespace = os.getenv('CACHE_NAMESPACE', 'elo')
+
+    if kind == 'redis':
+        import redis.asyncio as redis
+        client = redis.from_url(os.getenv('REDIS_URL', 'redis://redis:6379/0'))
+        backend = RedisBackend(client)
+    elif kind == 'fakeredis':
+        from utils.fake_redis import FakeRedis
+        backend = RedisBackend(FakeRedis())
+    else:
+        if kind != 'memory':
+            logger.warning("Unknown CACHE_BACKEND '%s', falling back to in-process cache", kind)
+        backend = MemoryBackend()
+
+    logger.info("Cache backend: %s (namespace '%s')", type(backend).__name__, namespace)
+    return Cache(backend, namespace)
@@ -0,0 +1,71 @@
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+
+class GuildCategories:
+    """One guild's categories indexed by exact and case-folded name"""
+
+    def __init__(self, rows: Iterable[Dict[str, Any]]):
+        self.rows = sorted(rows, key=lambda row: row['name'].casefold())
+        self.by_name = {row['name']: row for row in self.rows}
+        self.by_folded: Dict[str, Dict[str, Any]] = {}
+        for row in self.rows:
+            # On a case-only clash keep the first; exact matches still win in resolve()
+            self.by_folded.setdefault(row['name'].casefold(), row)
+        self.loaded_at = time.monotonic()
+
+    def resolve(self, name: str) -> Optional[Dict[str, Any]]:
+        return self.by_name.get(name) or self.by_folded.get(name.casefold())
+
+    def suggest(self, current: str, limit: int = 25) -> List[str]:
+        """Names starting with `current` first, then names containing it"""
+        needle = current.casefold()
+        if not needle:
+            return [row['name'] for row in self.rows[:limit]]
+        prefix, contains = [], []
+        for row in self.rows:
+            folded = row['name'].casefold()
+            if folded.startswith(needle):
+                prefix.append(row['name'])
+            elif needle in folded:
+                contains.append(row['name'])
+        return (prefix + contains)[:limit]
+
+
+class CategoryRegistry:
+    """In-memory per-guild category registry.
+
+    Guilds are loaded once (all of them at startup, new ones on first use)
+    and dropped by `invalidate` when `!category add/remove` changes them.
+    Entries older than `max_age` are reloaded so other bot processes pick up
+    changes made elsewhere.
+    """
+
+    def __init__(self, max_age: float = 600):
+        self.max_age = max_age
+        self._guilds: Dict[int, GuildCategories] = {}
+
+    def get(self, guild_id: int) -> Optional[GuildCategories]:
+        """Return the loaded entry for a guild, or None if it must be (re)loaded"""
+        entry = self._guilds.get(guild_id)
+        if entry is None or time.monotonic() - entry.loaded_at > self.max_age:
+            return None
+        return entry
+
+    def peek(self, guild_id: int) -> Optional[GuildCategories]:
+        """Return whatever is loaded, however old; for latency-critical paths like autocomplete"""
+        return self._guilds.get(guild_id)
+
+    def load(self, guild_id: int, rows: Iterable[Dict[str, Any]]) -> GuildCategories:
+        entry = self._guilds[guild_id] = GuildCategories(rows)
+        return entry
+
+    def rows(self) -> Dict[int, List[Dict[str, Any]]]:
+        """Every loaded guild's category rows, e.g. for a snapshot"""
+        return {guild_id: entry.rows for guild_id, entry in self._guilds.items()}
+
+    def invalidate(self, guild_id: int):
+        self._guilds.pop(guild_id, None)
+
+    def clear(self):
+        self._guilds.clear()
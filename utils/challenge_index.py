@@ -0,0 +1,92 @@
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Statuses a challenge can still leave; finished challenges drop out of the index
+TRACKED_STATUSES = ('pending_difficulty', 'active', 'pending_review')
+
+
+class ChallengeIndex:
+    """Per-guild, per-status sorted challenge IDs for slash-command autocomplete.
+
+    Kept current by the challenge lifecycle (issue, voting, completion,
+    review) so autocomplete is answered from memory with a binary search
+    for the typed prefix and never queries Postgres.
+    """
+
+    def __init__(self):
+        self._ids: Dict[Tuple[int, str], List[str]] = {}
+        # challenge_id -> (guild_id, status, owner user_id)
+        self._entries: Dict[str, Tuple[int, str, int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def load(self, rows: Iterable[Tuple[str, int, int, str]]):
+        """Replace the index with (challenge_id, guild_id, user_id, status) rows"""
+        self._ids.clear()
+        self._entries.clear()
+        for challenge_id, guild_id, user_id, status in rows:
+            if status in TRACKED_STATUSES:
+                self._entries[challenge_id] = (guild_id, status, user_id)
+                self._ids.setdefault((guild_id, status), []).append(challenge_id)
+        for ids in self._ids.values():
+            ids.sort()
+
+    def set_status(self, guild_id: int, challenge_id: str, status: str, user_id: Optional[int] = None):
+        """Move a challenge to `status`, dropping it once it reaches a final status"""
+        previous = self._entries.pop(challenge_id, None)
+        if previous is not None:
+            ids = self._ids.get((previous[0], previous[1]))
+            if ids:
+                i = bisect_left(ids, challenge_id)
+                if i < len(ids) and ids[i] == challenge_id:
+                    del ids[i]
+            if user_id is None:
+                user_id = previous[2]
+
+        if status in TRACKED_STATUSES and user_id is not None:
+            self._entries[challenge_id] = (guild_id, status, user_id)
+            insort(self._ids.setdefault((guild_id, status), []), challenge_id)
+
+    def remove(self, challenge_id: str):
+        entry = self._entries.get(challenge_id)
+        if entry is not None:
+            self.set_status(entry[0], challenge_id, 'removed')
+
+    def discard_guild(self, guild_id: int):
+        for key in [key for key in self._ids if key[0] == guild_id]:
+            del self._ids[key]
+        for challenge_id in [cid for cid, entry in self._entries.items() if entry[0] == guild_id]:
+            del self._entries[challenge_id]
+
+    def owner(self, challenge_id: str) -> Optional[int]:
+        entry = self._entries.get(challenge_id)
+        return entry[2] if entry else None
+
+    def suggest(self, guild_id: int, statuses: Iterable[str], prefix: str,
+                owner_id: Optional[int] = None, exclude_owner_id: Optional[int] = None,
+                limit: int = 25) -> List[str]:
+        """Challenge IDs in the given statuses starting with `prefix`"""
+        prefix = prefix.strip().upper()
+        if prefix and prefix[0].isdigit():
+            prefix = 'CHL-' + prefix
+
+        matches = []
+        for status in statuses:
+            ids = self._ids.get((guild_id, status))
+            if not ids:
+                continue
+            for i in range(bisect_left(ids, prefix), len(ids)):
+                challenge_id = ids[i]
+                if not challenge_id.startswith(prefix):
+                    break
+                user_id = self._entries[challenge_id][2]
+                if owner_id is not None and user_id != owner_id:
+                    continue
+                if exclude_owner_id is not None and user_id == exclude_owner_id:
+                    continue
+                matches.append(challenge_id)
+                if len(matches) >= limit:
+                    break
+        matches.sort()
+        return matches[:limit]
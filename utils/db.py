@@ -1,41 +1,253 @@
+import asyncio
 import asyncpg
+import itertools
 import os
 import logging
+import time
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
 import random
 import string
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Iterable, List, Set, Tuple
+
+from utils.cache import Cache, MemoryBackend, create_cache
+from utils.category_registry import CategoryRegistry, GuildCategories
+from utils.challenge_index import ChallengeIndex, TRACKED_STATUSES
+from utils.elo import ELOEngine
+from utils.known_users import KnownUserCache
+from utils.metrics import metrics
+from utils.migrations import MIGRATIONS
+from utils.partitions import ensure_partitions
+from utils import queries, rollups, warm_state
 
 logger = logging.getLogger(__name__)
 
+# Arbitrary key for pg_advisory_lock so only one bot process migrates at a time
+MIGRATION_LOCK_ID = 7_310_026
+
+# Seconds cached values may be served before they are reloaded
+CONFIG_CACHE_TTL = 300
+CATEGORIES_CACHE_TTL = 600
+LEADERBOARD_CACHE_TTL = 60
+PROFILE_CACHE_TTL = 60
+
+# Seconds a replica may trail the primary and still serve reads; a guild's
+# reads also stay on the primary this long after it writes, so its users
+# always see their own changes
+REPLICA_MAX_LAG = float(os.getenv('DB_READ_MAX_LAG', 5))
+# Seconds between replica lag measurements
+REPLICA_LAG_CHECK_INTERVAL = 1.0
+
+# Challenge statuses that count as unfinished when their sprint ends
+EXPIRABLE_STATUSES = ('pending_difficulty', 'active')
+
+WARM_STATE_PATH = os.getenv('WARM_STATE_PATH', 'data/warm_state.bin')
+# Seconds restored cache entries are served for when their tables changed while the bot was down
+WARM_STATE_STALE_TTL = float(os.getenv('WARM_STATE_STALE_TTL', 15))
+# Snapshot section -> the table_watermarks counters that must not have moved for it to still be current
+_ALL_WRITES = ('insert', 'update', 'delete', 'truncate')
+WARM_STATE_WATERMARKS = {
+    'config': (('guild_config', _ALL_WRITES),),
+    'categories': (('categories', _ALL_WRITES),),
+    # Only inserts and deletes change which users exist
+    'known_users': (('users', ('insert', 'delete', 'truncate')),),
+    'leaderboard': (('users', _ALL_WRITES), ('challenges', _ALL_WRITES), ('elo_history', _ALL_WRITES)),
+}
+
 class DatabaseManager:
     def __init__(self):
+        # Primary pool; every write goes here
         self.db_pool = None
+        # Read-only traffic; a replica when DB_READ_HOST is set, otherwise the primary
+        self.read_pool = None
+        self.replica_configured = bool(os.getenv('DB_READ_HOST'))
+        self._recent_writes: Dict[int, float] = {}
+        self._replica_lag: Optional[float] = None
+        self._replica_lag_checked_at = 0.0
+        self._replica_lag_lock = asyncio.Lock()
+        self.known_users = KnownUserCache()
+        self.cache: Cache = Cache(MemoryBackend())
+        self.categories = CategoryRegistry(max_age=CATEGORIES_CACHE_TTL)
+        self.challenge_index = ChallengeIndex()
+        self._warm_refresh: Optional[asyncio.Task] = None
         
+    @staticmethod
+    def connection_settings() -> Dict[str, Any]:
+        """Connection arguments for the primary database, read from the environment"""
+        return {
+            'host': os.getenv('DB_HOST', 'postgres'),
+            'port': int(os.getenv('DB_PORT', 5432)),
+            'user': os.getenv('DB_USER', 'postgres'),
+            'password': os.getenv('POSTGRES_PASSWORD'),
+            'database': os.getenv('DB_NAME', 'accountability'),
+        }
+
+    @classmethod
+    def read_connection_settings(cls) -> Dict[str, Any]:
+        """Connection arguments for the read replica, falling back to the primary's"""
+        settings = cls.connection_settings()
+        for key, env in (('host', 'DB_READ_HOST'), ('port', 'DB_READ_PORT'), ('user', 'DB_READ_USER'),
+                         ('password', 'DB_READ_PASSWORD'), ('database', 'DB_READ_NAME')):
+            value = os.getenv(env)
+            if value:
+                settings[key] = int(value) if key == 'port' else value
+        return settings
+
     async def init_db(self):
         """Initialize database connection pool"""
         try:
             self.db_pool = await asyncpg.create_pool(
-                host=os.getenv('DB_HOST', 'postgres'),
-                port=int(os.getenv('DB_PORT', 5432)),
-                user=os.getenv('DB_USER', 'postgres'),
-                password=os.getenv('POSTGRES_PASSWORD'),
-                database=os.getenv('DB_NAME', 'accountability'),
+                **self.connection_settings(),
+                min_size=1,
+                max_size=int(os.getenv('DB_POOL_SIZE', 10))
+            )
+            # Reads get their own pool even without a replica so they never queue behind writes
+            self.read_pool = await asyncpg.create_pool(
+                **self.read_connection_settings(),
                 min_size=1,
-                max_size=10
+                max_size=int(os.getenv('DB_READ_POOL_SIZE', 10))
             )
-            logger.info("Database connection pool initialized")
+            logger.info("Database connection pools initialized (reads on %s)", 'replica' if self.replica_configured else 'primary')
         except Exception as e:
-            logger.error(f"Failed to initialize database: {e}")
+            logger.error("Failed to initialize database: %s", e)
             raise
+
+        self.cache = create_cache()
+        await self.run_migrations()
+        async with self.db_pool.acquire() as conn:
+            await ensure_partitions(conn)
+        restored = await self.restore_warm_state()
+        if 'known_users' not in restored:
+            await self.warm_known_users()
+        if 'categories' not in restored:
+            await self.warm_categories()
+        await self.warm_challenge_index()
+
+    async def run_migrations(self):
+        """Apply pending schema migrations in version order"""
+        async with self.db_pool.acquire() as conn:
+            await conn.execute('SELECT pg_advisory_lock($1)', MIGRATION_LOCK_ID)
+            try:
+                await conn.execute(
+                    '''CREATE TABLE IF NOT EXISTS schema_migrations (
+                           version INTEGER PRIMARY KEY,
+                           name VARCHAR(100) NOT NULL,
+                           applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                       )'''
+                )
+                applied = {
+                    row['version'] for row in await conn.fetch('SELECT version FROM schema_migrations')
+                }
+
+                for version, name, sql in MIGRATIONS:
+                    if version in applied:
+                        continue
+                    async with conn.transaction():
+                        await conn.execute(sql)
+                        await conn.execute(
+                            'INSERT INTO schema_migrations (version, name) VALUES ($1, $2)',
+                            version, name
+                        )
+                    logger.info("Applied migration %03d_%s", version, name)
+            finally:
+                await conn.execute('SELECT pg_advisory_unlock($1)', MIGRATION_LOCK_ID)
+
+    async def load_init_sql(self):
+        """Create the baseline schema the way the Postgres container does on first boot"""
+        with open(os.path.join(os.path.dirname(__file__), '..', 'init.sql')) as f:
+            schema = f.read()
+        conn = await asyncpg.connect(**self.connection_settings())
+        try:
+            await conn.execute(schema)
+        finally:
+            await conn.close()
         
+    async def close(self):
+        """Close the cache tier and the connection pool"""
+        if self._warm_refresh is not None:
+            self._warm_refresh.cancel()
+        await self.cache.close()
+        if self.read_pool:
+            await self.read_pool.close()
+        if self.db_pool:
+            await self.db_pool.close()
+
+    def mark_write(self, guild_id: int):
+        """Pin a guild's reads to the primary until the replica has had time to catch up"""
+        self._recent_writes[guild_id] = time.monotonic()
+
+    async def replica_lag(self) -> Optional[float]:
+        """Seconds the replica trails the primary, measured at most once per check interval; None if unreachable"""
+        if time.monotonic() - self._replica_lag_checked_at < REPLICA_LAG_CHECK_INTERVAL:
+            return self._replica_lag
+        async with self._replica_lag_lock:
+            if time.monotonic() - self._replica_lag_checked_at >= REPLICA_LAG_CHECK_INTERVAL:
+                try:
+                    async with self.read_pool.acquire() as conn:
+                        # An idle primary replays nothing, so only count time while WAL is outstanding
+                        self._replica_lag = await conn.fetchval(
+                            '''SELECT CASE
+                                   WHEN NOT pg_is_in_recovery() THEN 0
+                                   WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                                   ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+                               END::float8'''
+                        )
+                except (asyncpg.PostgresError, OSError) as e:
+                    logger.warning("Replica lag check failed: %s", e)
+                    self._replica_lag = None
+                self._replica_lag_checked_at = time.monotonic()
+                if self._replica_lag is not None:
+                    metrics.gauge('db.replica_lag_s', self._replica_lag)
+        return self._replica_lag
+
+    async def _read_pool_for(self, guild_id: Optional[int]):
+        if not self.replica_configured:
+            return self.read_pool
+        written_at = self._recent_writes.get(guild_id)
+        if written_at is not None:
+            if time.monotonic() - written_at < REPLICA_MAX_LAG:
+                metrics.incr('db.reads_pinned')
+                return self.db_pool
+            del self._recent_writes[guild_id]
+        lag = await self.replica_lag()
+        if lag is None or lag > REPLICA_MAX_LAG:
+            metrics.incr('db.reads_replica_stale')
+            return self.db_pool
+        metrics.incr('db.reads_replica')
+        return self.read_pool
+
+    @asynccontextmanager
+    async def acquire_read(self, guild_id: Optional[int] = None):
+        """Acquire a connection for a read that may trail the primary by up to REPLICA_MAX_LAG"""
+        pool = await self._read_pool_for(guild_id)
+        async with pool.acquire() as conn:
+            yield conn
+
     async def get_guild_config(self, guild_id: int) -> Dict[str, Any]:
         """Get guild configuration with defaults"""
+        return await self.cache.get_or_load(
+            guild_id, 'config', lambda: self._load_guild_config(guild_id), CONFIG_CACHE_TTL
+        )
+
+    async def invalidate_guild_config(self, guild_id: int):
+        """Drop a guild's cached configuration after it changes"""
+        self.mark_write(guild_id)
+        await self.cache.delete(guild_id, 'config')
+
+    async def invalidate_challenge_views(self, guild_id: int, *user_ids: int):
+        """Drop cached leaderboards and the given users' profiles after a challenge changes"""
+        await self.cache.delete_group(guild_id, 'leaderboard')
+        await self.invalidate_profiles(guild_id, *user_ids)
+
+    async def invalidate_profiles(self, guild_id: int, *user_ids: int):
+        """Drop the given users' cached profiles after their challenges or ratings change"""
+        self.mark_write(guild_id)
+        if user_ids:
+            await self.cache.delete(guild_id, *(f'profile:{user_id}' for user_id in user_ids))
+
+    async def _load_guild_config(self, guild_id: int) -> Dict[str, Any]:
         async with self.db_pool.acquire() as conn:
-            config = await conn.fetchrow(
-                'SELECT * FROM guild_config WHERE guild_id = $1',
-                guild_id
-            )
+            config = await conn.fetchrow(queries.GUILD_CONFIG, guild_id)
             if not config:
                 # Create default config
                 await conn.execute(
@@ -43,59 +255,539 @@ class DatabaseManager:
                        ON CONFLICT (guild_id) DO NOTHING''',
                     guild_id
                 )
-                config = await conn.fetchrow(
-                    'SELECT * FROM guild_config WHERE guild_id = $1',
-                    guild_id
-                )
+                config = await conn.fetchrow(queries.GUILD_CONFIG, guild_id)
             return dict(config)
     
+    async def warm_known_users(self):
+        """Load every (guild_id, user_id) pair from `users` into the known-user cache"""
+        # Built aside and swapped in, so lookups keep working while a refresh streams in
+        known_users = KnownUserCache()
+        async with self.db_pool.acquire() as conn:
+            async with conn.transaction():
+                guild_id, user_ids = None, []
+                async for row in conn.cursor('SELECT guild_id, user_id FROM users ORDER BY guild_id, user_id'):
+                    if row['guild_id'] != guild_id:
+                        if user_ids:
+                            known_users.load_sorted(guild_id, user_ids)
+                        guild_id, user_ids = row['guild_id'], []
+                    user_ids.append(row['user_id'])
+                if user_ids:
+                    known_users.load_sorted(guild_id, user_ids)
+        self.known_users = known_users
+        logger.info("Known-user cache warmed with %d users", len(self.known_users))
+
+    async def warm_categories(self):
+        """Load every guild's categories into the registry in one query"""
+        async with self.db_pool.acquire() as conn:
+            rows = await conn.fetch('SELECT id, guild_id, name, description FROM categories ORDER BY guild_id')
+        self.categories.clear()
+        by_guild: Dict[int, List[Dict[str, Any]]] = {}
+        for row in rows:
+            by_guild.setdefault(row['guild_id'], []).append(
+                {'id': row['id'], 'name': row['name'], 'description': row['description']}
+            )
+        for guild_id, guild_rows in by_guild.items():
+            self.categories.load(guild_id, guild_rows)
+
+    async def warm_challenge_index(self):
+        """Load every unfinished challenge into the autocomplete index"""
+        async with self.db_pool.acquire() as conn:
+            rows = await conn.fetch(
+                'SELECT challenge_id, guild_id, user_id, status FROM challenges WHERE status = ANY($1::varchar[])',
+                list(TRACKED_STATUSES)
+            )
+        self.challenge_index.load(
+            (row['challenge_id'], row['guild_id'], row['user_id'], row['status']) for row in rows
+        )
+        logger.info("Challenge index warmed with %d open challenges", len(self.challenge_index))
+
+    async def _warm_state_meta(self) -> Dict[str, Any]:
+        """What a snapshot is validated against: the database, its schema version and each section's watermark"""
+        async with self.db_pool.acquire() as conn:
+            schema_version = await conn.fetchval('SELECT MAX(version) FROM schema_migrations')
+            # One statement, so a compaction running alongside is seen either entirely or not at all
+            rows = await conn.fetch(
+                '''SELECT table_name, operation, SUM(writes)::bigint AS writes FROM (
+                       SELECT table_name, operation, writes FROM table_watermarks
+                       UNION ALL
+                       SELECT table_name, operation, count(*) FROM table_write_log GROUP BY 1, 2
+                   ) w
+                   GROUP BY 1, 2'''
+            )
+        counters = {(row['table_name'], row['operation']): row['writes'] for row in rows}
+        settings = self.connection_settings()
+        return {
+            'database': f"{settings['host']}:{settings['port']}/{settings['database']}",
+            'schema_version': schema_version,
+            'watermarks': {
+                section: [counters.get((table, operation), 0) for table, operations in specs for operation in operations]
+                for section, specs in WARM_STATE_WATERMARKS.items()
+            },
+        }
+
+    async def compact_write_log(self) -> int:
+        """Fold table_write_log into the table_watermarks totals; returns how many log rows were folded"""
+        async with self.db_pool.acquire() as conn:
+            # Rows of writes still in flight are invisible here, so this never waits on a writer
+            return await conn.fetchval(
+                '''WITH moved AS (
+                       DELETE FROM table_write_log RETURNING table_name, operation
+                   ), folded AS (
+                       INSERT INTO table_watermarks AS w (table_name, operation, writes)
+                       SELECT table_name, operation, count(*) FROM moved GROUP BY 1, 2
+                       ON CONFLICT (table_name, operation) DO UPDATE SET writes = w.writes + EXCLUDED.writes
+                   )
+                   SELECT count(*) FROM moved'''
+            )
+
+    async def save_warm_state(self, path: str = WARM_STATE_PATH):
+        """Snapshot the in-process caches for the next start; called on graceful shutdown"""
+        try:
+            # Read before the caches are copied, so a write in between makes the section look stale, never fresh
+            meta = await self._warm_state_meta()
+        except Exception as e:
+            logger.warning("Skipping warm-state snapshot, watermarks unavailable: %s", e)
+            return
+        entries = self.cache.export()
+        sections = {
+            'meta': warm_state.encode_json(meta),
+            'config': warm_state.encode_cache_entries(e for e in entries if e[1] == 'config'),
+            'categories': warm_state.encode_json({str(guild_id): rows for guild_id, rows in self.categories.rows().items()}),
+            'known_users': warm_state.encode_known_users(self.known_users.guilds()),
+            'leaderboard': warm_state.encode_cache_entries(e for e in entries if e[1].startswith('leaderboard:')),
+        }
+        try:
+            await asyncio.to_thread(warm_state.write_snapshot, path, sections)
+        except OSError as e:
+            logger.warning("Could not write warm-state snapshot to %s: %s", path, e)
+            return
+        logger.info("Wrote warm-state snapshot (%d bytes) to %s", sum(len(data) for data in sections.values()), path)
+
+    async def restore_warm_state(self, path: str = WARM_STATE_PATH) -> Set[str]:
+        """Load the snapshot written at the last shutdown and return the sections it filled.
+
+        Sections whose tables changed since the snapshot are still served:
+        cache entries expire within WARM_STATE_STALE_TTL and reload on next
+        use, and the known-user and category registries reload in the
+        background. The file is consumed, so a crash never leaves an old
+        snapshot to restore from.
+        """
+        try:
+            snapshot = warm_state.Snapshot(path)
+        except FileNotFoundError:
+            return set()
+        except (OSError, warm_state.SnapshotError) as e:
+            logger.warning("Ignoring warm-state snapshot %s: %s", path, e)
+            return set()
+
+        restored, stale = set(), set()
+        try:
+            meta_view = snapshot.section('meta')
+            if meta_view is None:
+                logger.warning("Ignoring warm-state snapshot %s: no metadata", path)
+                return set()
+            with meta_view:
+                saved = warm_state.decode_json(meta_view)
+            current = await self._warm_state_meta()
+            if (saved['database'], saved['schema_version']) != (current['database'], current['schema_version']):
+                logger.info("Ignoring warm-state snapshot from another database or schema version")
+                return set()
+
+            for section in WARM_STATE_WATERMARKS:
+                view = snapshot.section(section)
+                if view is None:
+                    continue
+                fresh = saved['watermarks'].get(section) == current['watermarks'][section]
+                with view:
+                    if section == 'known_users':
+                        known_users = KnownUserCache()
+                        for guild_id, user_ids in warm_state.decode_known_users(view):
+                            known_users.load_sorted(guild_id, user_ids)
+                        self.known_users = known_users
+                    elif section == 'categories':
+                        self.categories.clear()
+                        for guild_id, rows in warm_state.decode_json(view).items():
+                            self.categories.load(int(guild_id), rows)
+                    else:
+                        # Unchanged tables mean the entries are still exact: keep the TTL they had left
+                        self.cache.restore(warm_state.decode_cache_entries(view), None if fresh else WARM_STATE_STALE_TTL)
+                restored.add(section)
+                if not fresh:
+                    stale.add(section)
+        except Exception:
+            logger.exception("Failed to restore warm-state snapshot %s", path)
+            return restored
+        finally:
+            snapshot.close()
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+        metrics.incr('warm_state.sections.fresh', len(restored - stale))
+        metrics.incr('warm_state.sections.stale', len(stale))
+        logger.info(
+            "Restored warm state: %s fresh, %s stale",
+            ', '.join(sorted(restored - stale)) or 'none', ', '.join(sorted(stale)) or 'none'
+        )
+        if stale & {'known_users', 'categories'}:
+            self._warm_refresh = asyncio.create_task(self._refresh_warm_state(stale))
+        return restored
+
+    async def _refresh_warm_state(self, stale: Set[str]):
+        """Reload restored registries whose tables changed while the bot was down"""
+        try:
+            if 'known_users' in stale:
+                await self.warm_known_users()
+            if 'categories' in stale:
+                await self.warm_categories()
+        except Exception:
+            logger.exception("Background refresh of warm state failed")
+
+    async def reload_guild(self, guild_id: int):
+        """Drop and reload everything held in memory for a guild after its rows change in bulk"""
+        self.mark_write(guild_id)
+        await self.cache.clear_guild(guild_id)
+        self.categories.invalidate(guild_id)
+        async with self.db_pool.acquire() as conn:
+            user_ids = await conn.fetch(
+                'SELECT user_id FROM users WHERE guild_id = $1 ORDER BY user_id',
+                guild_id
+            )
+            challenges = await conn.fetch(
+                '''SELECT challenge_id, user_id, status FROM challenges
+                   WHERE guild_id = $1 AND status = ANY($2::varchar[])''',
+                guild_id, list(TRACKED_STATUSES)
+            )
+        self.known_users.load_sorted(guild_id, [row['user_id'] for row in user_ids])
+        self.challenge_index.discard_guild(guild_id)
+        for row in challenges:
+            self.challenge_index.set_status(guild_id, row['challenge_id'], row['status'], row['user_id'])
+
+    async def get_categories(self, guild_id: int) -> GuildCategories:
+        """Get a guild's categories from the registry, loading them on first use"""
+        entry = self.categories.get(guild_id)
+        if entry is None:
+            rows = await self.cache.get_or_load(
+                guild_id, 'categories', lambda: self._load_categories(guild_id), CATEGORIES_CACHE_TTL
+            )
+            entry = self.categories.load(guild_id, rows)
+        return entry
+
+    async def invalidate_categories(self, guild_id: int):
+        """Drop a guild's categories from the registry and the cache tier after they change"""
+        self.mark_write(guild_id)
+        self.categories.invalidate(guild_id)
+        await self.cache.delete(guild_id, 'categories')
+
+    async def _load_categories(self, guild_id: int) -> List[Dict[str, Any]]:
+        async with self.acquire_read(guild_id) as conn:
+            rows = await conn.fetch(queries.GUILD_CATEGORIES, guild_id)
+        return [dict(row) for row in rows]
+
     async def ensure_user_exists(self, user_id: int, guild_id: int):
         """Ensure user exists in database"""
+        if (guild_id, user_id) in self.known_users:
+            return
+        async with self.db_pool.acquire() as conn:
+            await conn.execute(queries.ENSURE_USER, user_id, guild_id)
+        self.mark_write(guild_id)
+        self.known_users.add(guild_id, user_id)
+
+    async def ensure_users_exist(self, pairs: Iterable[Tuple[int, int]]):
+        """Ensure many (guild_id, user_id) pairs exist with one multi-row upsert"""
+        missing = [pair for pair in pairs if pair not in self.known_users]
+        if not missing:
+            return
+        guild_ids = [guild_id for guild_id, _ in missing]
+        user_ids = [user_id for _, user_id in missing]
+        async with self.db_pool.acquire() as conn:
+            await conn.execute(queries.ENSURE_USERS, user_ids, guild_ids)
+        by_guild: Dict[int, List[int]] = {}
+        for guild_id, user_id in missing:
+            by_guild.setdefault(guild_id, []).append(user_id)
+        for guild_id, ids in by_guild.items():
+            self.mark_write(guild_id)
+            self.known_users.add_many(guild_id, ids)
+    
+    async def get_display_names(self, guild_id: int, user_ids: Iterable[int]) -> Dict[int, str]:
+        """Last persisted display names for the given users; users without one are left out"""
+        async with self.acquire_read(guild_id) as conn:
+            rows = await conn.fetch(queries.DISPLAY_NAMES, guild_id, list(user_ids))
+        return {row['user_id']: row['display_name'] for row in rows}
+
+    async def record_display_names(self, rows: Iterable[Tuple[int, int, str]]):
+        """Persist many (guild_id, user_id, display_name) rows with one multi-row update"""
+        rows = list(rows)
+        if not rows:
+            return
         async with self.db_pool.acquire() as conn:
             await conn.execute(
-                '''INSERT INTO users (user_id, guild_id) VALUES ($1, $2) 
-                   ON CONFLICT (user_id, guild_id) DO NOTHING''',
-                user_id, guild_id
+                queries.RECORD_DISPLAY_NAMES,
+                [row[0] for row in rows], [row[1] for row in rows], [row[2] for row in rows]
             )
-    
+        for guild_id in {row[0] for row in rows}:
+            self.mark_write(guild_id)
+
     async def generate_challenge_id(self) -> str:
         """Generate unique challenge ID"""
-        while True:
-            challenge_id = 'CHL-' + ''.join(random.choices(string.digits, k=3))
+        digits = 3
+        for attempt in itertools.count(1):
+            # Lengthen the ID once the short space is crowded instead of retrying forever
+            if attempt % 5 == 0:
+                digits += 1
+            challenge_id = 'CHL-' + ''.join(random.choices(string.digits, k=digits))
             async with self.db_pool.acquire() as conn:
-                exists = await conn.fetchval(
-                    'SELECT 1 FROM challenges WHERE challenge_id = $1',
-                    challenge_id
-                )
+                exists = await conn.fetchval(queries.CHALLENGE_ID_TAKEN, challenge_id)
                 if not exists:
                     return challenge_id
     
     async def get_active_sprint(self, guild_id: int) -> Optional[Dict[str, Any]]:
         """Get current active sprint for guild"""
         async with self.db_pool.acquire() as conn:
-            sprint = await conn.fetchrow(
-                'SELECT * FROM sprints WHERE guild_id = $1 AND status = $2 ORDER BY start_date DESC LIMIT 1',
-                guild_id, 'active'
-            )
+            sprint = await conn.fetchrow(queries.ACTIVE_SPRINT, guild_id, 'active')
             return dict(sprint) if sprint else None
     
     async def create_sprint(self, guild_id: int, duration_days: int = 7) -> int:
         """Create new sprint"""
         start_date = datetime.utcnow()
         end_date = start_date + timedelta(days=duration_days)
+        config = await self.get_guild_config(guild_id)
         
         async with self.db_pool.acquire() as conn:
-            # End current sprint if any
-            await conn.execute(
-                'UPDATE sprints SET status = $1 WHERE guild_id = $2 AND status = $3',
-                'ended', guild_id, 'active'
+            async with conn.transaction():
+                # End current sprint if any
+                ended, expired = await self._end_active_sprints(conn, guild_id, config)
+                
+                # Create new sprint
+                sprint_id = await conn.fetchval(
+                    'INSERT INTO sprints (guild_id, start_date, end_date) VALUES ($1, $2, $3) RETURNING id',
+                    guild_id, start_date, end_date
+                )
+        self.mark_write(guild_id)
+        await self._after_expiry(guild_id, expired, sprints_ended=bool(ended))
+        return sprint_id
+
+    async def end_active_sprints(self, guild_id: int) -> int:
+        """End the guild's active sprint, failing its unfinished challenges; returns how many failed"""
+        config = await self.get_guild_config(guild_id)
+        async with self.db_pool.acquire() as conn:
+            async with conn.transaction():
+                ended, expired = await self._end_active_sprints(conn, guild_id, config)
+        await self._after_expiry(guild_id, expired, sprints_ended=bool(ended))
+        return len(expired)
+
+    async def expire_ended_sprints(self, guild_id: int) -> int:
+        """Fail challenges left open in sprints that already ended; returns how many failed"""
+        config = await self.get_guild_config(guild_id)
+        async with self.db_pool.acquire() as conn:
+            async with conn.transaction():
+                sprint_ids = [row['sprint_id'] for row in await conn.fetch(
+                    '''SELECT DISTINCT c.sprint_id FROM challenges c
+                       JOIN sprints s ON s.id = c.sprint_id
+                       WHERE c.guild_id = $1 AND c.status = ANY($2::varchar[]) AND s.status <> $3''',
+                    guild_id, list(EXPIRABLE_STATUSES), 'active'
+                )]
+                expired = await self._expire_challenges(conn, guild_id, sprint_ids, config)
+                for sprint_id in sprint_ids:
+                    await self._snapshot_sprint(conn, guild_id, sprint_id)
+        await self._after_expiry(guild_id, expired, sprints_ended=bool(sprint_ids))
+        return len(expired)
+
+    async def _end_active_sprints(self, conn, guild_id: int, config: Dict[str, Any]) -> Tuple[List[int], List[Dict[str, Any]]]:
+        """End the active sprint inside the caller's transaction; returns (ended sprint IDs, expired challenges)"""
+        sprint_ids = [row['id'] for row in await conn.fetch(
+            'UPDATE sprints SET status = $1 WHERE guild_id = $2 AND status = $3 RETURNING id',
+            'ended', guild_id, 'active'
+        )]
+        expired = await self._expire_challenges(conn, guild_id, sprint_ids, config)
+        for sprint_id in sprint_ids:
+            await self._snapshot_sprint(conn, guild_id, sprint_id)
+        return sprint_ids, expired
+
+    async def _snapshot_sprint(self, conn, guild_id: int, sprint_id: int):
+        """Write the frozen sprint_results rows for one ended sprint and mark it snapshotted"""
+        # final_elo is the rating as the sprint ended, so a late snapshot doesn't pick up later changes
+        await conn.execute(
+            '''INSERT INTO sprint_results (sprint_id, guild_id, user_id, final_rank, elo_gain, final_elo, completed, attempted)
+               SELECT $1, $2, t.user_id,
+                      ROW_NUMBER() OVER (ORDER BY t.elo_gain DESC, t.completed DESC, e.final_elo DESC, t.user_id),
+                      t.elo_gain, e.final_elo, t.completed, t.attempted
+               FROM (
+                   SELECT c.user_id,
+                          COALESCE(SUM(eh.elo_change), 0) AS elo_gain,
+                          COUNT(*) FILTER (WHERE c.status = 'completed') AS completed,
+                          COUNT(*) AS attempted
+                   FROM challenges c
+                   LEFT JOIN LATERAL (
+                       SELECT SUM(elo_change) AS elo_change FROM elo_history WHERE challenge_id = c.id
+                   ) eh ON TRUE
+                   WHERE c.sprint_id = $1
+                   GROUP BY c.user_id
+               ) t
+               JOIN users u ON u.user_id = t.user_id AND u.guild_id = $2
+               JOIN sprints s ON s.id = $1
+               CROSS JOIN LATERAL (
+                   SELECT COALESCE(
+                       (SELECT elo_after FROM elo_history
+                        WHERE guild_id = $2 AND user_id = t.user_id AND created_at <= s.end_date
+                        ORDER BY created_at DESC LIMIT 1),
+                       (SELECT elo_before FROM elo_history
+                        WHERE guild_id = $2 AND user_id = t.user_id AND created_at > s.end_date
+                        ORDER BY created_at LIMIT 1),
+                       u.current_elo
+                   ) AS final_elo
+               ) e
+               ON CONFLICT (sprint_id, user_id) DO UPDATE SET
+                   final_rank = EXCLUDED.final_rank,
+                   elo_gain = EXCLUDED.elo_gain,
+                   final_elo = EXCLUDED.final_elo,
+                   completed = EXCLUDED.completed,
+                   attempted = EXCLUDED.attempted''',
+            sprint_id, guild_id
+        )
+        await conn.execute('UPDATE sprints SET results_snapshotted_at = CURRENT_TIMESTAMP WHERE id = $1', sprint_id)
+
+    async def snapshot_pending_sprints(self) -> int:
+        """Freeze the results of every ended sprint that has none yet; returns how many were snapshotted"""
+        async with self.db_pool.acquire() as conn:
+            sprints = await conn.fetch(
+                'SELECT id, guild_id FROM sprints WHERE status <> $1 AND results_snapshotted_at IS NULL ORDER BY id',
+                'active'
+            )
+        for sprint in sprints:
+            async with self.db_pool.acquire() as conn:
+                async with conn.transaction():
+                    await self._snapshot_sprint(conn, sprint['guild_id'], sprint['id'])
+        for guild_id in {sprint['guild_id'] for sprint in sprints}:
+            await self._after_expiry(guild_id, [], sprints_ended=True)
+        return len(sprints)
+
+    async def get_sprint_results(self, guild_id: int, sprint_id: Optional[int] = None, limit: int = 10):
+        """Top of a sprint's frozen leaderboard (latest ended sprint by default).
+
+        Returns (sprint, rows), or (None, []) if no such ended sprint exists.
+        Sprints that ended before snapshots existed are snapshotted on first view.
+        """
+        async with self.acquire_read(guild_id) as conn:
+            if sprint_id is None:
+                sprint = await conn.fetchrow(queries.LATEST_ENDED_SPRINT, guild_id, 'active')
+            else:
+                sprint = await conn.fetchrow(queries.ENDED_SPRINT, sprint_id, guild_id, 'active')
+            if not sprint:
+                return None, []
+
+            rows = await conn.fetch(queries.SPRINT_RESULTS, sprint['id'], limit)
+
+        if sprint['results_snapshotted_at'] is None:
+            async with self.db_pool.acquire() as conn:
+                async with conn.transaction():
+                    # Locks the sprint so concurrent first views snapshot it once
+                    snapshotted = await conn.fetchval(
+                        'SELECT results_snapshotted_at FROM sprints WHERE id = $1 FOR UPDATE', sprint['id']
+                    )
+                    if snapshotted is None:
+                        await self._snapshot_sprint(conn, guild_id, sprint['id'])
+                rows = await conn.fetch(queries.SPRINT_RESULTS, sprint['id'], limit)
+            self.mark_write(guild_id)
+        return dict(sprint), [dict(row) for row in rows]
+
+    async def get_sprint_history(self, guild_id: int, user_id: int, limit: int = 5) -> List[Dict[str, Any]]:
+        """A user's most recent frozen sprint results"""
+        async with self.acquire_read(guild_id) as conn:
+            rows = await conn.fetch(queries.SPRINT_HISTORY, guild_id, user_id, limit)
+        return [dict(row) for row in rows]
+
+    async def _expire_challenges(self, conn, guild_id: int, sprint_ids: List[int], config: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Mark every open challenge of the given sprints failed and apply the ELO losses in bulk.
+
+        Must run inside a transaction. Users with several failures are
+        processed in rounds: round n applies every user's n-th failure (oldest
+        first) in a single ELOEngine.calculate_new_elos call, so each penalty
+        is computed from the rating left by the previous one.
+        """
+        if not sprint_ids:
+            return []
+
+        failed = await conn.fetch(
+            '''UPDATE challenges SET status = 'failed', reviewed_at = $3
+               WHERE guild_id = $1 AND sprint_id = ANY($2::int[]) AND status = ANY($4::varchar[])
+               RETURNING id, challenge_id, user_id, sprint_id, category_id, created_at,
+                         COALESCE(final_difficulty_elo, base_difficulty_elo) AS difficulty_elo''',
+            guild_id, sprint_ids, datetime.utcnow(), list(EXPIRABLE_STATUSES)
+        )
+        if not failed:
+            return []
+
+        users = {
+            row['user_id']: row for row in await conn.fetch(
+                '''SELECT user_id, current_elo, total_challenges FROM users
+                   WHERE guild_id = $1 AND user_id = ANY($2::bigint[])
+                   ORDER BY user_id FOR UPDATE''',
+                guild_id, list({row['user_id'] for row in failed})
             )
-            
-            # Create new sprint
-            sprint_id = await conn.fetchval(
-                'INSERT INTO sprints (guild_id, start_date, end_date) VALUES ($1, $2, $3) RETURNING id',
-                guild_id, start_date, end_date
+        }
+
+        per_user: Dict[int, List[Any]] = {}
+        for row in sorted(failed, key=lambda r: (r['user_id'], r['created_at'])):
+            if row['user_id'] in users:
+                per_user.setdefault(row['user_id'], []).append(row)
+
+        current = {user_id: users[user_id]['current_elo'] for user_id in per_user}
+        k_factors = {
+            user_id: ELOEngine.get_k_factor(
+                users[user_id]['total_challenges'],
+                config['k_factor_new'],
+                config['k_factor_stable'],
+                config['stable_user_threshold']
             )
-            return sprint_id
+            for user_id in per_user
+        }
+
+        history = []
+        for round_index in range(max(len(rows) for rows in per_user.values())):
+            batch = [(user_id, rows[round_index]) for user_id, rows in per_user.items() if round_index < len(rows)]
+            befores = [current[user_id] for user_id, _ in batch]
+            afters = ELOEngine.calculate_new_elos(
+                befores,
+                [row['difficulty_elo'] for _, row in batch],
+                [0] * len(batch),
+                [k_factors[user_id] for user_id, _ in batch]
+            )
+            for (user_id, row), before, after in zip(batch, befores, afters):
+                current[user_id] = after
+                history.append((user_id, row['id'], before, after, after - before))
+
+        await conn.execute(
+            '''UPDATE users u SET current_elo = v.elo, updated_at = $3
+               FROM unnest($1::bigint[], $2::int[]) AS v(user_id, elo)
+               WHERE u.guild_id = $4 AND u.user_id = v.user_id''',
+            list(current.keys()), list(current.values()), datetime.utcnow(), guild_id
+        )
+        await conn.execute(
+            '''INSERT INTO elo_history (user_id, guild_id, challenge_id, elo_before, elo_after, elo_change, reason)
+               SELECT v.user_id, $6, v.challenge_id, v.elo_before, v.elo_after, v.elo_change, 'challenge_failed'
+               FROM unnest($1::bigint[], $2::int[], $3::int[], $4::int[], $5::int[])
+                    AS v(user_id, challenge_id, elo_before, elo_after, elo_change)''',
+            [h[0] for h in history], [h[1] for h in history], [h[2] for h in history],
+            [h[3] for h in history], [h[4] for h in history], guild_id
+        )
+
+        await rollups.record_failed(conn, guild_id, failed)
+
+        logger.info("Expired %d unfinished challenges in guild %s (sprints %s)", len(failed), guild_id, sprint_ids)
+        return [dict(row) for row in failed]
+
+    async def _after_expiry(self, guild_id: int, expired: List[Dict[str, Any]], sprints_ended: bool = False):
+        """Bring in-memory indexes and caches in line once an expiry has committed"""
+        if sprints_ended:
+            # Every participant's profile now has a new sprint history line
+            self.mark_write(guild_id)
+            await self.cache.delete_group(guild_id, 'profile')
+        if not expired:
+            return
+        for row in expired:
+            self.challenge_index.set_status(guild_id, row['challenge_id'], 'failed')
+        await self.invalidate_challenge_views(guild_id, *{row['user_id'] for row in expired})
 
 db_manager = DatabaseManager() 
\ No newline at end of file
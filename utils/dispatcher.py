@@ -0,0 +1,149 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import discord
+
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class _Op:
+    __slots__ = ('kind', 'target', 'kwargs', 'on_sent', 'enqueued_at')
+
+    def __init__(self, kind: str, target, kwargs: Dict[str, Any], on_sent=None):
+        self.kind = kind
+        self.target = target
+        self.kwargs = kwargs
+        self.on_sent = on_sent
+        self.enqueued_at = time.monotonic()
+
+
+class _Route:
+    """One channel's queue and token bucket"""
+
+    def __init__(self, rate: int):
+        self.ops = deque()
+        self.pending_edits: Dict[int, _Op] = {}
+        self.tokens = float(rate)
+        self.updated_at = time.monotonic()
+        self.worker: Optional[asyncio.Task] = None
+
+
+class OutboundDispatcher:
+    """Queues channel posts and message edits off the command path.
+
+    Each channel is its own route with a token bucket sized to Discord's
+    per-channel limit (5 requests per 5 seconds), so bursts wait here
+    instead of tripping 429s. An edit queued for a message that already
+    has an edit waiting replaces that edit's content in place, so only
+    the newest version of a message is sent. A route is forgotten once it
+    is idle and its bucket has refilled, so DM targets don't accumulate.
+    """
+
+    def __init__(self, rate: int = 5, per: float = 5.0):
+        self.rate = rate
+        self.per = per
+        self._routes: Dict[int, _Route] = {}
+
+    def send(self, channel: discord.abc.Messageable, *,
+             on_sent: Optional[Callable[[discord.Message], Awaitable[None]]] = None, **kwargs):
+        """Queue `channel.send(**kwargs)`; `on_sent` is awaited with the new message"""
+        route = self._route(channel.id)
+        route.ops.append(_Op('send', channel, kwargs, on_sent))
+        self._wake(channel.id, route)
+
+    def edit(self, message: discord.Message, **kwargs):
+        """Queue `message.edit(**kwargs)`, merging into an edit of the same message that hasn't run yet"""
+        route = self._route(message.channel.id)
+        pending = route.pending_edits.get(message.id)
+        if pending is not None:
+            pending.kwargs.update(kwargs)
+            pending.target = message
+            metrics.incr('dispatcher.coalesced_edits')
+            return
+        op = _Op('edit', message, dict(kwargs))
+        route.pending_edits[message.id] = op
+        route.ops.append(op)
+        self._wake(message.channel.id, route)
+
+    async def drain(self, timeout: float = 10.0):
+        """Wait for queued operations to finish, e.g. before shutting down"""
+        workers = [route.worker for route in self._routes.values() if route.worker and not route.worker.done()]
+        if workers:
+            await asyncio.wait(workers, timeout=timeout)
+
+    def queue_depth(self) -> int:
+        return sum(len(route.ops) for route in self._routes.values())
+
+    def _route(self, channel_id: int) -> _Route:
+        route = self._routes.get(channel_id)
+        if route is None:
+            route = self._routes[channel_id] = _Route(self.rate)
+        return route
+
+    def _wake(self, channel_id: int, route: _Route):
+        metrics.gauge('dispatcher.queue_depth', self.queue_depth())
+        if route.worker is None or route.worker.done():
+            route.worker = asyncio.create_task(self._drain_route(channel_id, route))
+
+    def _refill(self, route: _Route):
+        now = time.monotonic()
+        route.tokens = min(self.rate, route.tokens + (now - route.updated_at) * self.rate / self.per)
+        route.updated_at = now
+
+    async def _take_token(self, route: _Route):
+        while True:
+            self._refill(route)
+            if route.tokens >= 1:
+                route.tokens -= 1
+                return
+            metrics.incr('dispatcher.bucket_waits')
+            await asyncio.sleep((1 - route.tokens) * self.per / self.rate)
+
+    async def _drain_route(self, channel_id: int, route: _Route):
+        while route.ops:
+            await self._take_token(route)
+            op = route.ops.popleft()
+            if op.kind == 'edit':
+                route.pending_edits.pop(op.target.id, None)
+            metrics.observe('dispatcher.queue_ms', (time.monotonic() - op.enqueued_at) * 1000)
+
+            try:
+                if op.kind == 'send':
+                    message = await op.target.send(**op.kwargs)
+                    if op.on_sent is not None:
+                        await op.on_sent(message)
+                else:
+                    await op.target.edit(**op.kwargs)
+                metrics.incr(f'dispatcher.{op.kind}s')
+            except discord.HTTPException as e:
+                metrics.incr('dispatcher.errors')
+                logger.warning("Outbound %s to channel %s failed: %s", op.kind, channel_id, e)
+            except Exception as e:
+                metrics.incr('dispatcher.errors')
+                logger.error("Outbound %s to channel %s failed: %s", op.kind, channel_id, e)
+
+        metrics.gauge('dispatcher.queue_depth', self.queue_depth())
+        self._refill(route)
+        refill_in = (self.rate - route.tokens) * self.per / self.rate
+        asyncio.get_running_loop().call_later(refill_in, self._forget, channel_id, route)
+
+    def _forget(self, channel_id: int, route: _Route):
+        """Drop an idle route whose bucket is full; a new one would start in the same state"""
+        if self._routes.get(channel_id) is not route or route.ops:
+            return
+        if route.worker is not None and not route.worker.done():
+            return
+        self._refill(route)
+        # Still refilling after newer traffic; that traffic's own call forgets the route later.
+        # The tolerance absorbs call_later firing up to a clock tick early.
+        if self.rate - route.tokens > 1e-3:
+            return
+        del self._routes[channel_id]
+
+
+dispatcher = OutboundDispatcher()
@@ -1,3 +1,5 @@
+from typing import List
+
 class ELOEngine:
     """Handles ELO calculations and rating updates"""
     
@@ -14,4 +16,12 @@ class ELOEngine:
     @staticmethod
     def get_k_factor(total_challenges: int, k_factor_new: int, k_factor_stable: int, stable_threshold: int) -> int:
         """Determine K-factor based on user experience"""
-        return k_factor_new if total_challenges < stable_threshold else k_factor_stable 
\ No newline at end of file
+        return k_factor_new if total_challenges < stable_threshold else k_factor_stable
+
+    @staticmethod
+    def calculate_new_elos(current_elos: List[int], opponent_elos: List[int], actual_scores: List[int], k_factors: List[int]) -> List[int]:
+        """Vectorized calculate_new_elo over parallel lists, one result per position"""
+        return [
+            ELOEngine.calculate_new_elo(elo, ELOEngine.calculate_expected_score(elo, opponent), score, k)
+            for elo, opponent, score, k in zip(current_elos, opponent_elos, actual_scores, k_factors)
+        ]
@@ -0,0 +1,107 @@
+import time
+from typing import Dict, List, Optional, Tuple
+
+
+class FakeRedis:
+    """In-process stand-in for the redis.asyncio client, for tests.
+
+    Implements only the commands RedisBackend uses: GET, MGET, SET with PX
+    and NX, INCR, PEXPIRE, DEL, a non-transactional pipeline and EVAL of
+    the lock-release script. Values come back as bytes, as they do from a
+    client without decode_responses.
+    """
+
+    def __init__(self):
+        self._data: Dict[str, Tuple[bytes, Optional[float]]] = {}
+
+    def _live(self, key: str) -> Optional[bytes]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    @staticmethod
+    def _bytes(value) -> bytes:
+        if isinstance(value, bytes):
+            return value
+        return str(value).encode()
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return self._live(key)
+
+    async def mget(self, keys: List[str]) -> List[Optional[bytes]]:
+        return [self._live(key) for key in keys]
+
+    async def set(self, key: str, value, px: Optional[int] = None, nx: bool = False) -> Optional[bool]:
+        if nx and self._live(key) is not None:
+            return None
+        self._data[key] = (self._bytes(value), time.monotonic() + px / 1000 if px else None)
+        return True
+
+    async def incr(self, key: str) -> int:
+        value = self._live(key)
+        count = int(value) + 1 if value is not None else 1
+        # INCR keeps an existing TTL
+        expires_at = self._data[key][1] if value is not None else None
+        self._data[key] = (self._bytes(count), expires_at)
+        return count
+
+    async def pexpire(self, key: str, ms: int) -> bool:
+        value = self._live(key)
+        if value is None:
+            return False
+        self._data[key] = (value, time.monotonic() + ms / 1000)
+        return True
+
+    async def delete(self, *keys: str) -> int:
+        removed = 0
+        for key in keys:
+            if self._live(key) is not None:
+                removed += 1
+            self._data.pop(key, None)
+        return removed
+
+    async def eval(self, script: str, numkeys: int, *args):
+        from utils.cache import RedisBackend
+        if script != RedisBackend._RELEASE_SCRIPT:
+            raise NotImplementedError("FakeRedis only runs the lock-release script")
+        key, token = args[0], args[numkeys]
+        if self._live(key) == self._bytes(token):
+            return await self.delete(key)
+        return 0
+
+    def pipeline(self, transaction: bool = True) -> '_FakePipeline':
+        return _FakePipeline(self)
+
+    async def aclose(self):
+        self._data.clear()
+
+
+class _FakePipeline:
+    """Queues commands and runs them in order on execute()"""
+
+    def __init__(self, client: FakeRedis):
+        self.client = client
+        self._commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self._commands.clear()
+
+    def incr(self, key: str):
+        self._commands.append((self.client.incr, (key,)))
+        return self
+
+    def pexpire(self, key: str, ms: int):
+        self._commands.append((self.client.pexpire, (key, ms)))
+        return self
+
+    async def execute(self) -> list:
+        commands, self._commands = self._commands, []
+        return [await command(*args) for command, args in commands]
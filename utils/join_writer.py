@@ -0,0 +1,93 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Optional
+
+from utils.db import db_manager
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class JoinWriter:
+    """Coalesces member joins into batched multi-row `users` upserts.
+
+    `enqueue` blocks once the queue is full, which pushes back on the
+    gateway handlers instead of letting a join burst grow memory without
+    bound. A background task flushes whenever `max_batch` rows are waiting
+    or `flush_interval` has passed since the first row of the batch.
+    """
+
+    def __init__(self, flush_interval: float = 0.5, max_batch: int = 500, max_queue: int = 10000):
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._queue = asyncio.Queue(maxsize=max_queue)
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Start the background writer if it is not already running"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flush everything still queued and stop the writer"""
+        if self._task is None or self._task.done():
+            return
+        await self._queue.put(None)
+        await self._task
+
+    async def enqueue(self, guild_id: int, user_id: int):
+        """Queue a member for insertion, waiting if the queue is full"""
+        if (guild_id, user_id) in db_manager.known_users:
+            return
+        if self._queue.full():
+            metrics.incr('join_writer.backpressure_waits')
+        await self._queue.put((guild_id, user_id, time.monotonic()))
+        metrics.gauge('join_writer.queue_depth', self._queue.qsize())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+
+    async def _flush(self, batch):
+        pairs = {(guild_id, user_id) for guild_id, user_id, _ in batch}
+        oldest = min(enqueued_at for _, _, enqueued_at in batch)
+        try:
+            await db_manager.ensure_users_exist(pairs)
+        except Exception as e:
+            metrics.incr('join_writer.failed_rows', len(pairs))
+            logger.error("Failed to flush %d member joins: %s", len(pairs), e)
+            return
+
+        metrics.incr('join_writer.rows', len(pairs))
+        metrics.observe('join_writer.batch_size', len(pairs))
+        metrics.observe('join_writer.lag_ms', (time.monotonic() - oldest) * 1000)
+        metrics.gauge('join_writer.queue_depth', self._queue.qsize())
+        logger.debug("Flushed %d member joins", len(pairs))
+
+
+join_writer = JoinWriter(
+    flush_interval=int(os.getenv('JOIN_FLUSH_MS', 500)) / 1000,
+    max_batch=int(os.getenv('JOIN_BATCH_SIZE', 500)),
+    max_queue=int(os.getenv('JOIN_QUEUE_SIZE', 10000)),
+)
@@ -0,0 +1,59 @@
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterable, Tuple
+
+
+class KnownUserCache:
+    """In-memory set of (guild_id, user_id) pairs known to exist in `users`.
+
+    Each guild keeps its user IDs in a sorted array of signed 64-bit ints
+    (8 bytes per member, no per-object overhead), so a 100k member guild
+    costs under 1 MB and lookups are a binary search.
+    """
+
+    def __init__(self):
+        self._guilds: Dict[int, array] = {}
+
+    def __contains__(self, key) -> bool:
+        guild_id, user_id = key
+        ids = self._guilds.get(guild_id)
+        if not ids:
+            return False
+        i = bisect_left(ids, user_id)
+        return i < len(ids) and ids[i] == user_id
+
+    def __len__(self) -> int:
+        return sum(len(ids) for ids in self._guilds.values())
+
+    def add(self, guild_id: int, user_id: int):
+        """Record a single user, keeping the guild's array sorted"""
+        ids = self._guilds.setdefault(guild_id, array('q'))
+        i = bisect_left(ids, user_id)
+        if i == len(ids) or ids[i] != user_id:
+            ids.insert(i, user_id)
+
+    def add_many(self, guild_id: int, user_ids: Iterable[int]):
+        """Record a batch of users for one guild with a single merge"""
+        ids = self._guilds.get(guild_id)
+        merged = set(user_ids)
+        if ids:
+            merged.update(ids)
+        self._guilds[guild_id] = array('q', sorted(merged))
+
+    def load_sorted(self, guild_id: int, user_ids: Iterable[int]):
+        """Replace a guild's entries with IDs that are already sorted and unique"""
+        self._guilds[guild_id] = array('q', user_ids)
+
+    def guilds(self) -> Iterable[Tuple[int, array]]:
+        """(guild_id, sorted IDs) for every guild, e.g. for a snapshot"""
+        return self._guilds.items()
+
+    def discard_guild(self, guild_id: int):
+        self._guilds.pop(guild_id, None)
+
+    def clear(self):
+        self._guilds.clear()
+
+    def memory_bytes(self) -> int:
+        """Approximate payload size of the cached IDs"""
+        return sum(ids.buffer_info()[1] * ids.itemsize for ids in self._guilds.values())
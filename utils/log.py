@@ -0,0 +1,119 @@
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+LOG_DIR = os.getenv('LOG_DIR', 'logs')
+LOG_FILE = 'bot.jsonl'
+LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', 10 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', 5))
+CONSOLE_FORMAT = '%(asctime)s %(levelname)s %(name)s: %(message)s'
+
+# Set for the duration of a command (each command runs in its own task, so these never leak across commands)
+log_guild_id: contextvars.ContextVar[Optional[int]] = contextvars.ContextVar('log_guild_id', default=None)
+log_command: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar('log_command', default=None)
+log_started_at: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar('log_started_at', default=None)
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def bind_command(guild_id: Optional[int], command: str):
+    """Tag every record logged from the current command's task with its guild, name and elapsed time"""
+    log_guild_id.set(guild_id)
+    log_command.set(command)
+    log_started_at.set(time.perf_counter())
+
+
+class ContextFilter(logging.Filter):
+    """Copies the command context onto each record in the thread that logged it"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.guild_id = log_guild_id.get()
+        record.command = log_command.get()
+        started_at = log_started_at.get()
+        record.latency_ms = round((time.perf_counter() - started_at) * 1000, 1) if started_at is not None else None
+        return True
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """Queues records unformatted, so `%` interpolation happens on the listener thread.
+
+    The stock QueueHandler renders the message before enqueueing it.
+    Tracebacks are still rendered here, while the frames they describe
+    still exist.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with the command context captured by ContextFilter"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key in ('guild_id', 'command', 'latency_ms'):
+            value = getattr(record, key, None)
+            if value is not None:
+                entry[key] = value
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+def setup_logging():
+    """Route all logging through a queue to a background thread writing the console and rotating JSON files"""
+    global _listener
+    if _listener is not None:
+        return
+
+    level = getattr(logging, os.getenv('LOG_LEVEL', 'INFO').upper(), logging.INFO)
+    console = logging.StreamHandler(sys.stdout)
+    console.setFormatter(logging.Formatter(CONSOLE_FORMAT))
+    handlers = [console]
+    try:
+        os.makedirs(LOG_DIR, exist_ok=True)
+        log_file = logging.handlers.RotatingFileHandler(
+            os.path.join(LOG_DIR, LOG_FILE), maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding='utf-8'
+        )
+        log_file.setFormatter(JsonFormatter())
+        handlers.append(log_file)
+    except OSError as e:
+        print(f"Logging to {LOG_DIR} disabled: {e}", file=sys.stderr)
+
+    records = queue.SimpleQueue()
+    queue_handler = LazyQueueHandler(records)
+    queue_handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    root.handlers[:] = [queue_handler]
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Write out everything still queued and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,320 @@
+"""Versioned schema migrations.
+
+init.sql only runs on the first boot of the Postgres volume, so every schema
+change made after the baseline lives here. DatabaseManager.run_migrations
+applies pending entries in version order at startup. Append new migrations
+to the end of the list; never edit or renumber one that has shipped.
+"""
+
+MIGRATIONS = [
+    (1, 'guild_config_channels', '''
+        ALTER TABLE guild_config ADD COLUMN IF NOT EXISTS review_channel_id BIGINT;
+        ALTER TABLE guild_config ADD COLUMN IF NOT EXISTS difficulty_voting_channel_id BIGINT;
+    '''),
+
+    (2, 'hot_query_indexes', '''
+        -- !challenges <status>: newest challenges per guild and status
+        CREATE INDEX IF NOT EXISTS idx_challenges_guild_status_created
+            ON challenges(guild_id, status, created_at DESC);
+        -- !profile: a user's recent challenges
+        CREATE INDEX IF NOT EXISTS idx_challenges_guild_user_created
+            ON challenges(guild_id, user_id, created_at DESC);
+        -- !profile and the weekly leaderboard: a user's rating history
+        CREATE INDEX IF NOT EXISTS idx_elo_history_guild_user_created
+            ON elo_history(guild_id, user_id, created_at DESC);
+        -- !leaderboard alltime
+        CREATE INDEX IF NOT EXISTS idx_users_guild_elo
+            ON users(guild_id, current_elo DESC);
+        -- get_active_sprint
+        CREATE INDEX IF NOT EXISTS idx_sprints_guild_status_start
+            ON sprints(guild_id, status, start_date DESC);
+
+        -- Single-column indexes now covered by the composites above
+        DROP INDEX IF EXISTS idx_users_guild;
+        DROP INDEX IF EXISTS idx_challenges_user;
+        DROP INDEX IF EXISTS idx_challenges_guild;
+        DROP INDEX IF EXISTS idx_elo_history_user;
+        DROP INDEX IF EXISTS idx_sprints_guild;
+    '''),
+
+    (3, 'sprint_results', '''
+        -- Frozen per-user results written once when a sprint ends
+        CREATE TABLE IF NOT EXISTS sprint_results (
+            sprint_id INTEGER NOT NULL REFERENCES sprints(id),
+            guild_id BIGINT NOT NULL,
+            user_id BIGINT NOT NULL,
+            final_rank INTEGER NOT NULL,
+            elo_gain INTEGER NOT NULL,
+            final_elo INTEGER NOT NULL,
+            completed INTEGER NOT NULL,
+            attempted INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (sprint_id, user_id)
+        );
+        -- !leaderboard sprint <id>
+        CREATE INDEX IF NOT EXISTS idx_sprint_results_rank
+            ON sprint_results(sprint_id, final_rank);
+        -- !profile sprint history
+        CREATE INDEX IF NOT EXISTS idx_sprint_results_guild_user
+            ON sprint_results(guild_id, user_id, sprint_id DESC);
+        -- Per-challenge ELO totals when snapshotting a sprint
+        CREATE INDEX IF NOT EXISTS idx_elo_history_challenge
+            ON elo_history(challenge_id);
+    '''),
+
+    (4, 'partition_history_tables', '''
+        -- Create any missing monthly partitions of a created_at-partitioned table,
+        -- from the month of from_ts up to months_ahead months past the current one
+        CREATE OR REPLACE FUNCTION ensure_monthly_partitions(parent regclass, prefix text, from_ts timestamp, months_ahead integer)
+        RETURNS integer LANGUAGE plpgsql AS $fn$
+        DECLARE
+            month_start date := date_trunc('month', from_ts)::date;
+            last_month date := (date_trunc('month', now()) + make_interval(months => months_ahead))::date;
+            part_name text;
+            created integer := 0;
+        BEGIN
+            WHILE month_start <= last_month LOOP
+                part_name := prefix || '_p' || to_char(month_start, 'YYYYMM');
+                IF to_regclass(part_name) IS NULL THEN
+                    EXECUTE format('CREATE TABLE %I PARTITION OF %s FOR VALUES FROM (%L) TO (%L)',
+                                   part_name, parent, month_start, (month_start + interval '1 month')::date);
+                    created := created + 1;
+                END IF;
+                month_start := (month_start + interval '1 month')::date;
+            END LOOP;
+            RETURN created;
+        END
+        $fn$;
+
+        -- Create any missing challenge-id range partitions, from the block holding
+        -- from_id up to blocks_ahead blocks past the newest challenge
+        CREATE OR REPLACE FUNCTION ensure_challenge_partitions(parent regclass, prefix text, from_id bigint, block_size integer, blocks_ahead integer)
+        RETURNS integer LANGUAGE plpgsql AS $fn$
+        DECLARE
+            block bigint := from_id / block_size;
+            last_block bigint := COALESCE((SELECT max(id) FROM challenges), 0) / block_size + blocks_ahead;
+            part_name text;
+            created integer := 0;
+        BEGIN
+            WHILE block <= last_block LOOP
+                part_name := prefix || '_c' || lpad(block::text, 6, '0');
+                IF to_regclass(part_name) IS NULL THEN
+                    EXECUTE format('CREATE TABLE %I PARTITION OF %s FOR VALUES FROM (%s) TO (%s)',
+                                   part_name, parent, block * block_size, (block + 1) * block_size);
+                    created := created + 1;
+                END IF;
+                block := block + 1;
+            END LOOP;
+            RETURN created;
+        END
+        $fn$;
+
+        -- Partitions exported to ./data and dropped by the archival job
+        CREATE TABLE IF NOT EXISTS archived_partitions (
+            name VARCHAR(100) PRIMARY KEY,
+            parent VARCHAR(100) NOT NULL,
+            row_count BIGINT NOT NULL,
+            file_path TEXT NOT NULL,
+            archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+
+        -- elo_history: monthly range partitions on created_at
+        CREATE TABLE elo_history_partitioned (
+            id INTEGER NOT NULL DEFAULT nextval('elo_history_id_seq'),
+            user_id BIGINT NOT NULL,
+            guild_id BIGINT NOT NULL,
+            challenge_id INTEGER REFERENCES challenges(id),
+            elo_before INTEGER NOT NULL,
+            elo_after INTEGER NOT NULL,
+            elo_change INTEGER NOT NULL,
+            reason VARCHAR(50) NOT NULL,
+            created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            CONSTRAINT elo_history_partitioned_pkey PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at);
+        SELECT ensure_monthly_partitions(
+            'elo_history_partitioned', 'elo_history',
+            COALESCE((SELECT min(created_at) FROM elo_history), now())::timestamp, 3
+        );
+        INSERT INTO elo_history_partitioned
+        SELECT id, user_id, guild_id, challenge_id, elo_before, elo_after, elo_change, reason,
+               COALESCE(created_at, CURRENT_TIMESTAMP)
+        FROM elo_history;
+        ALTER SEQUENCE elo_history_id_seq OWNED BY NONE;
+        DROP TABLE elo_history;
+        ALTER TABLE elo_history_partitioned RENAME TO elo_history;
+        ALTER SEQUENCE elo_history_id_seq OWNED BY elo_history.id;
+        CREATE INDEX idx_elo_history_guild_user_created ON elo_history(guild_id, user_id, created_at DESC);
+        CREATE INDEX idx_elo_history_challenge ON elo_history(challenge_id);
+
+        -- Vote tables: range partitions on challenge_id, so UNIQUE (challenge_id, voter_id)
+        -- still holds across partitions (every unique key must contain the partition key)
+        CREATE TABLE approvals_partitioned (
+            id INTEGER NOT NULL DEFAULT nextval('approvals_id_seq'),
+            challenge_id INTEGER NOT NULL REFERENCES challenges(id),
+            voter_id BIGINT NOT NULL,
+            guild_id BIGINT NOT NULL,
+            vote_type VARCHAR(10) NOT NULL,
+            comment TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            CONSTRAINT approvals_partitioned_pkey PRIMARY KEY (challenge_id, id),
+            CONSTRAINT approvals_partitioned_vote_key UNIQUE (challenge_id, voter_id)
+        ) PARTITION BY RANGE (challenge_id);
+        SELECT ensure_challenge_partitions('approvals_partitioned', 'approvals', 0, 100000, 1);
+        INSERT INTO approvals_partitioned
+        SELECT id, challenge_id, voter_id, guild_id, vote_type, comment, created_at
+        FROM approvals WHERE challenge_id IS NOT NULL;
+        ALTER SEQUENCE approvals_id_seq OWNED BY NONE;
+        DROP TABLE approvals;
+        ALTER TABLE approvals_partitioned RENAME TO approvals;
+        ALTER SEQUENCE approvals_id_seq OWNED BY approvals.id;
+
+        CREATE TABLE difficulty_votes_partitioned (
+            id INTEGER NOT NULL DEFAULT nextval('difficulty_votes_id_seq'),
+            challenge_id INTEGER NOT NULL REFERENCES challenges(id),
+            voter_id BIGINT NOT NULL,
+            guild_id BIGINT NOT NULL,
+            vote_adjustment INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            CONSTRAINT difficulty_votes_partitioned_pkey PRIMARY KEY (challenge_id, id),
+            CONSTRAINT difficulty_votes_partitioned_vote_key UNIQUE (challenge_id, voter_id)
+        ) PARTITION BY RANGE (challenge_id);
+        SELECT ensure_challenge_partitions('difficulty_votes_partitioned', 'difficulty_votes', 0, 100000, 1);
+        INSERT INTO difficulty_votes_partitioned
+        SELECT id, challenge_id, voter_id, guild_id, vote_adjustment, created_at
+        FROM difficulty_votes WHERE challenge_id IS NOT NULL;
+        ALTER SEQUENCE difficulty_votes_id_seq OWNED BY NONE;
+        DROP TABLE difficulty_votes;
+        ALTER TABLE difficulty_votes_partitioned RENAME TO difficulty_votes;
+        ALTER SEQUENCE difficulty_votes_id_seq OWNED BY difficulty_votes.id;
+    '''),
+
+    (5, 'user_display_names', '''
+        -- Last known server display name, so listings can name members missing from the gateway cache
+        ALTER TABLE users ADD COLUMN IF NOT EXISTS display_name VARCHAR(100);
+    '''),
+
+    (6, 'challenge_search', '''
+        -- Lets (guild_id, search_vector) share one GIN index so search never leaves the guild's rows
+        CREATE EXTENSION IF NOT EXISTS btree_gin;
+        ALTER TABLE challenges ADD COLUMN IF NOT EXISTS search_vector tsvector
+            GENERATED ALWAYS AS (
+                setweight(to_tsvector('english', COALESCE(title, '')), 'A') ||
+                setweight(to_tsvector('english', COALESCE(description, '')), 'B')
+            ) STORED;
+        -- !search
+        CREATE INDEX IF NOT EXISTS idx_challenges_guild_search
+            ON challenges USING GIN (guild_id, search_vector);
+    '''),
+
+    (7, 'challenge_rollups', '''
+        -- Per (guild, sprint, category) counters kept current by the challenge
+        -- lifecycle (see utils/rollups.py); sprint_id/category_id 0 means none
+        CREATE TABLE IF NOT EXISTS challenge_rollups (
+            guild_id BIGINT NOT NULL,
+            sprint_id INTEGER NOT NULL,
+            category_id INTEGER NOT NULL,
+            issued INTEGER NOT NULL DEFAULT 0,
+            completed INTEGER NOT NULL DEFAULT 0,
+            failed INTEGER NOT NULL DEFAULT 0,
+            rejected INTEGER NOT NULL DEFAULT 0,
+            reviewed INTEGER NOT NULL DEFAULT 0,
+            -- Completion-to-review latency histogram, one slot per rollups.LATENCY_BOUNDS bucket
+            review_latency INTEGER[] NOT NULL,
+            voted INTEGER NOT NULL DEFAULT 0,
+            drift_sum BIGINT NOT NULL DEFAULT 0,
+            drift_abs_sum BIGINT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (guild_id, sprint_id, category_id)
+        );
+
+        -- Backfill from existing challenges
+        WITH latency AS (
+            SELECT guild_id, COALESCE(sprint_id, 0) AS sprint_id, COALESCE(category_id, 0) AS category_id,
+                   width_bucket(EXTRACT(EPOCH FROM reviewed_at - completed_at)::float8,
+                                ARRAY[300, 900, 1800, 3600, 7200, 14400, 28800, 86400, 172800, 604800]::float8[]) + 1 AS bucket,
+                   count(*) AS n
+            FROM challenges
+            WHERE status IN ('completed', 'rejected') AND completed_at IS NOT NULL AND reviewed_at IS NOT NULL
+            GROUP BY 1, 2, 3, 4
+        )
+        INSERT INTO challenge_rollups (guild_id, sprint_id, category_id, issued, completed, failed, rejected,
+                                       reviewed, review_latency, voted, drift_sum, drift_abs_sum)
+        SELECT g.guild_id, g.sprint_id, g.category_id, g.issued, g.completed, g.failed, g.rejected, g.reviewed,
+               ARRAY(
+                   SELECT COALESCE(l.n, 0)::int FROM generate_series(1, 11) b
+                   LEFT JOIN latency l ON l.guild_id = g.guild_id AND l.sprint_id = g.sprint_id
+                                      AND l.category_id = g.category_id AND l.bucket = b
+                   ORDER BY b
+               ),
+               g.voted, g.drift_sum, g.drift_abs_sum
+        FROM (
+            SELECT guild_id, COALESCE(sprint_id, 0) AS sprint_id, COALESCE(category_id, 0) AS category_id,
+                   count(*) AS issued,
+                   count(*) FILTER (WHERE status = 'completed') AS completed,
+                   count(*) FILTER (WHERE status = 'failed') AS failed,
+                   count(*) FILTER (WHERE status = 'rejected') AS rejected,
+                   count(*) FILTER (WHERE status IN ('completed', 'rejected')
+                                      AND completed_at IS NOT NULL AND reviewed_at IS NOT NULL) AS reviewed,
+                   count(final_difficulty_elo) AS voted,
+                   COALESCE(sum(final_difficulty_elo - base_difficulty_elo), 0) AS drift_sum,
+                   COALESCE(sum(abs(final_difficulty_elo - base_difficulty_elo)), 0) AS drift_abs_sum
+            FROM challenges
+            GROUP BY 1, 2, 3
+        ) g
+        ON CONFLICT (guild_id, sprint_id, category_id) DO NOTHING;
+    '''),
+    (8, 'reminder_channel', '''
+        ALTER TABLE guild_config ADD COLUMN IF NOT EXISTS reminder_channel_id BIGINT;
+    '''),
+    (9, 'table_watermarks', '''
+        -- Write counters the warm-state snapshot is validated against (see
+        -- DatabaseManager._warm_state_meta). Every write statement appends a
+        -- row to table_write_log in its own transaction, so the count only
+        -- moves once the write commits and survives crashes. Appending takes
+        -- no row locks, so writers never wait on each other here;
+        -- compact_write_log folds the log into table_watermarks periodically.
+        CREATE TABLE IF NOT EXISTS table_write_log (
+            table_name VARCHAR(63) NOT NULL,
+            operation VARCHAR(8) NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS table_watermarks (
+            table_name VARCHAR(63) NOT NULL,
+            operation VARCHAR(8) NOT NULL,
+            writes BIGINT NOT NULL DEFAULT 0,
+            PRIMARY KEY (table_name, operation)
+        );
+
+        CREATE OR REPLACE FUNCTION log_table_write() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO table_write_log (table_name, operation) VALUES (TG_TABLE_NAME, lower(TG_OP));
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        -- Statement-level, so a bulk write costs one bump; on elo_history the
+        -- trigger sits on the partitioned parent every write goes through
+        DROP TRIGGER IF EXISTS guild_config_watermark ON guild_config;
+        CREATE TRIGGER guild_config_watermark AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON guild_config
+            FOR EACH STATEMENT EXECUTE FUNCTION log_table_write();
+        DROP TRIGGER IF EXISTS categories_watermark ON categories;
+        CREATE TRIGGER categories_watermark AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON categories
+            FOR EACH STATEMENT EXECUTE FUNCTION log_table_write();
+        DROP TRIGGER IF EXISTS users_watermark ON users;
+        CREATE TRIGGER users_watermark AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON users
+            FOR EACH STATEMENT EXECUTE FUNCTION log_table_write();
+        DROP TRIGGER IF EXISTS challenges_watermark ON challenges;
+        CREATE TRIGGER challenges_watermark AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON challenges
+            FOR EACH STATEMENT EXECUTE FUNCTION log_table_write();
+        DROP TRIGGER IF EXISTS elo_history_watermark ON elo_history;
+        CREATE TRIGGER elo_history_watermark AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON elo_history
+            FOR EACH STATEMENT EXECUTE FUNCTION log_table_write();
+    '''),
+    (10, 'sprint_results_snapshotted', '''
+        -- Set once a sprint's results are frozen, even when nobody took part,
+        -- so an empty snapshot is not recomputed on every view
+        ALTER TABLE sprints ADD COLUMN IF NOT EXISTS results_snapshotted_at TIMESTAMP;
+        UPDATE sprints s SET results_snapshotted_at = r.created_at
+        FROM (SELECT sprint_id, min(created_at) AS created_at FROM sprint_results GROUP BY sprint_id) r
+        WHERE r.sprint_id = s.id;
+    '''),
+]
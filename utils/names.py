@@ -0,0 +1,164 @@
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+import discord
+
+from utils.db import db_manager
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+UNKNOWN_NAME = "Unknown User"
+
+# query_members accepts at most this many user IDs per gateway request
+QUERY_MEMBERS_LIMIT = 100
+
+
+class NameResolver:
+    """Resolves display names for whole listings at once.
+
+    Each lookup tries, in order: the gateway member cache, a bounded LRU
+    of names resolved earlier, the `users.display_name` column, and finally
+    one `query_members` gateway request for everyone still missing. Names
+    seen in member events are queued with `note` and written back to
+    `users` in batches every `flush_interval` seconds.
+    """
+
+    def __init__(self, max_entries: int = 50000, max_age: float = 3600, flush_interval: float = 5.0):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.flush_interval = flush_interval
+        self._lru: 'OrderedDict[Tuple[int, int], Tuple[str, float]]' = OrderedDict()
+        self._dirty: Dict[Tuple[int, int], str] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Start the background writer if it is not already running"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Write out pending names and stop the writer"""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
+
+    def note(self, member: discord.Member):
+        """Record a member's current display name, e.g. from a join or update event"""
+        if member.bot:
+            return
+        key = (member.guild.id, member.id)
+        entry = self._lru.get(key)
+        if entry is not None and entry[0] == member.display_name:
+            return
+        self._remember(key, member.display_name)
+        self._dirty[key] = member.display_name
+
+    def note_many(self, members: Iterable[discord.Member]):
+        for member in members:
+            self.note(member)
+
+    async def resolve(self, guild: discord.Guild, user_ids: Iterable[int]) -> Dict[int, str]:
+        """Display names for every user ID, with UNKNOWN_NAME for anyone who can't be found"""
+        names: Dict[int, str] = {}
+        missing = []
+        now = time.monotonic()
+        for user_id in dict.fromkeys(user_ids):
+            member = guild.get_member(user_id)
+            if member is not None:
+                names[user_id] = member.display_name
+                metrics.incr('names.member_cache_hits')
+                continue
+            entry = self._lru.get((guild.id, user_id))
+            if entry is not None and now - entry[1] < self.max_age:
+                self._lru.move_to_end((guild.id, user_id))
+                names[user_id] = entry[0]
+                metrics.incr('names.lru_hits')
+                continue
+            missing.append(user_id)
+
+        if missing:
+            stored = await db_manager.get_display_names(guild.id, missing)
+            metrics.incr('names.db_hits', len(stored))
+            for user_id, name in stored.items():
+                names[user_id] = name
+                self._remember((guild.id, user_id), name)
+            missing = [user_id for user_id in missing if user_id not in stored]
+
+        if missing:
+            await self._query_gateway(guild, missing, names)
+
+        for user_id in missing:
+            if user_id not in names:
+                metrics.incr('names.unresolved')
+                names[user_id] = UNKNOWN_NAME
+        return names
+
+    async def _query_gateway(self, guild: discord.Guild, user_ids, names: Dict[int, str]):
+        for i in range(0, len(user_ids), QUERY_MEMBERS_LIMIT):
+            chunk = user_ids[i:i + QUERY_MEMBERS_LIMIT]
+            metrics.incr('names.gateway_lookups')
+            try:
+                members = await guild.query_members(user_ids=chunk, limit=len(chunk), cache=False)
+            except (asyncio.TimeoutError, discord.ClientException) as e:
+                logger.warning("Member lookup for %d users in guild %s failed: %s", len(chunk), guild.id, e)
+                continue
+            for member in members:
+                names[member.id] = member.display_name
+                # Remembers the name and queues it for `users`; note() skips names the LRU already has
+                self.note(member)
+
+    def _remember(self, key: Tuple[int, int], name: str):
+        self._lru[key] = (name, time.monotonic())
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+
+    async def flush(self):
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, {}
+        try:
+            await db_manager.record_display_names(
+                (guild_id, user_id, name) for (guild_id, user_id), name in dirty.items()
+            )
+            metrics.incr('names.persisted', len(dirty))
+        except asyncio.CancelledError:
+            # Keep the batch for the final flush in stop()
+            for key, name in dirty.items():
+                self._dirty.setdefault(key, name)
+            raise
+        except Exception as e:
+            logger.error("Failed to persist %d display names: %s", len(dirty), e)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+
+def member_cache_options(intents: discord.Intents) -> Dict[str, object]:
+    """Bot options for MEMBER_CACHE_MODE: `full` (discord.py's defaults) or `lean`.
+
+    Lean mode skips chunking at startup and keeps no members in memory;
+    names come from NameResolver and the `users` table instead.
+    """
+    mode = os.getenv('MEMBER_CACHE_MODE', 'full').lower()
+    if mode == 'lean':
+        return {'chunk_guilds_at_startup': False, 'member_cache_flags': discord.MemberCacheFlags.none()}
+    if mode != 'full':
+        logger.warning("Unknown MEMBER_CACHE_MODE '%s', caching every member", mode)
+    return {'chunk_guilds_at_startup': intents.members, 'member_cache_flags': discord.MemberCacheFlags.from_intents(intents)}
+
+
+name_resolver = NameResolver(
+    max_entries=int(os.getenv('NAME_CACHE_SIZE', 50000)),
+)
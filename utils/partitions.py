@@ -0,0 +1,167 @@
+import asyncio
+import gzip
+import logging
+import os
+import re
+from datetime import date, datetime, timedelta
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Partitioned history tables and how they are split (see migration 4)
+MONTHLY_TABLES = ('elo_history',)
+CHALLENGE_RANGE_TABLES = ('approvals', 'difficulty_votes')
+CHALLENGE_BLOCK_SIZE = 100000
+MONTHS_AHEAD = 3
+BLOCKS_AHEAD = 1
+
+# Open challenges keep their vote partition hot however old they are
+OPEN_STATUSES = ('pending_difficulty', 'active', 'pending_review')
+
+_MONTHLY_NAME = re.compile(r'_p(\d{4})(\d{2})$')
+_BLOCK_NAME = re.compile(r'_c(\d+)$')
+
+
+async def ensure_partitions(conn, since: Optional[datetime] = None, first_challenge_id: Optional[int] = None) -> int:
+    """Create partitions ahead of time for every partitioned history table; returns how many were created
+
+    Pass `since` and `first_challenge_id` to also backfill partitions for older rows, e.g. before an import.
+    """
+    created = 0
+    for table in MONTHLY_TABLES:
+        created += await conn.fetchval(
+            'SELECT ensure_monthly_partitions($1::regclass, $2, COALESCE($3, now()::timestamp), $4)',
+            table, table, since, MONTHS_AHEAD
+        )
+    if first_challenge_id is None:
+        first_challenge_id = await conn.fetchval('SELECT COALESCE(max(id), 0) FROM challenges')
+    for table in CHALLENGE_RANGE_TABLES:
+        created += await conn.fetchval(
+            'SELECT ensure_challenge_partitions($1::regclass, $2, $3, $4, $5)',
+            table, table, first_challenge_id, CHALLENGE_BLOCK_SIZE, BLOCKS_AHEAD
+        )
+    if created:
+        logger.info("Created %d history partitions ahead of time", created)
+    return created
+
+
+async def _list_partitions(conn, parent: str) -> List[str]:
+    rows = await conn.fetch(
+        '''SELECT c.relname FROM pg_inherits i
+           JOIN pg_class c ON c.oid = i.inhrelid
+           WHERE i.inhparent = $1::regclass
+           ORDER BY c.relname''',
+        parent
+    )
+    return [row['relname'] for row in rows]
+
+
+async def cold_partitions(conn, retention_days: int) -> List[tuple]:
+    """(parent, partition) pairs whose rows are all older than the retention window
+
+    A monthly partition is kept while any sprint that started by the end of
+    its month has no frozen results yet, since snapshots read elo_history.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    cutoff_month = date(cutoff.year, cutoff.month, 1)
+    cold = []
+
+    # Sprints started before this month need their history until they are snapshotted
+    unsnapshotted_from = await conn.fetchval(
+        'SELECT min(start_date) FROM sprints WHERE results_snapshotted_at IS NULL'
+    )
+    for parent in MONTHLY_TABLES:
+        for name in await _list_partitions(conn, parent):
+            match = _MONTHLY_NAME.search(name)
+            if not match:
+                continue
+            month = date(int(match.group(1)), int(match.group(2)), 1)
+            if month >= cutoff_month:
+                continue
+            next_month = date(month.year + month.month // 12, month.month % 12 + 1, 1)
+            if unsnapshotted_from is not None and unsnapshotted_from.date() < next_month:
+                logger.warning("Keeping partition %s: a sprint it may hold history for has no frozen results yet", name)
+                continue
+            cold.append((parent, name))
+
+    # A challenge block is cold once every challenge in it is past retention and finished
+    oldest_hot = await conn.fetchval(
+        'SELECT min(id) FROM challenges WHERE created_at >= $1 OR status = ANY($2::varchar[])',
+        cutoff, list(OPEN_STATUSES)
+    )
+    newest = await conn.fetchval('SELECT COALESCE(max(id), 0) FROM challenges')
+    # Never archive the block new challenges are being written into
+    boundary = min(oldest_hot if oldest_hot is not None else newest + 1,
+                   newest // CHALLENGE_BLOCK_SIZE * CHALLENGE_BLOCK_SIZE)
+    for parent in CHALLENGE_RANGE_TABLES:
+        for name in await _list_partitions(conn, parent):
+            match = _BLOCK_NAME.search(name)
+            if match and (int(match.group(1)) + 1) * CHALLENGE_BLOCK_SIZE <= boundary:
+                cold.append((parent, name))
+
+    return cold
+
+
+async def archive_partition(conn, parent: str, name: str, archive_dir: str) -> Optional[str]:
+    """Export one partition to a gzip CSV, then detach and drop it.
+
+    The partition is share-locked for the duration so its row count, the
+    exported file and the detach all agree; if anything fails the
+    transaction rolls back and the partition stays attached.
+    """
+    loop = asyncio.get_running_loop()
+    target_dir = os.path.join(archive_dir, parent)
+    os.makedirs(target_dir, exist_ok=True)
+    final_path = os.path.join(target_dir, f"{name}.csv.gz")
+    temp_path = final_path + '.tmp'
+
+    async with conn.transaction():
+        await conn.execute(f'LOCK TABLE "{name}" IN SHARE MODE')
+        expected = await conn.fetchval(f'SELECT count(*) FROM "{name}"')
+
+        gz = await loop.run_in_executor(None, gzip.open, temp_path, 'wb')
+        try:
+            async def write_chunk(chunk):
+                await loop.run_in_executor(None, gz.write, chunk)
+
+            status = await conn.copy_from_table(name, output=write_chunk, format='csv', header=True)
+        finally:
+            await loop.run_in_executor(None, gz.close)
+
+        copied = int(status.split()[-1])
+        if copied != expected:
+            os.remove(temp_path)
+            raise RuntimeError(f"Archive of {name} wrote {copied} rows, expected {expected}")
+        os.replace(temp_path, final_path)
+
+        await conn.execute(f'ALTER TABLE "{parent}" DETACH PARTITION "{name}"')
+        await conn.execute(f'DROP TABLE "{name}"')
+        # Detaching fires no triggers; count it as a delete so warm-state snapshots of the parent go stale
+        await conn.execute(
+            "INSERT INTO table_write_log (table_name, operation) VALUES ($1, 'delete')",
+            parent
+        )
+        await conn.execute(
+            '''INSERT INTO archived_partitions (name, parent, row_count, file_path) VALUES ($1, $2, $3, $4)
+               ON CONFLICT (name) DO UPDATE SET row_count = EXCLUDED.row_count,
+                   file_path = EXCLUDED.file_path, archived_at = CURRENT_TIMESTAMP''',
+            name, parent, copied, final_path
+        )
+
+    logger.info("Archived partition %s (%d rows) to %s", name, copied, final_path)
+    return final_path
+
+
+async def archive_cold_partitions(pool, retention_days: int, archive_dir: str) -> List[str]:
+    """Archive every partition past the retention window; returns the files written"""
+    async with pool.acquire() as conn:
+        cold = await cold_partitions(conn, retention_days)
+    archived = []
+    for parent, name in cold:
+        # A fresh connection and transaction per partition keeps each lock short
+        async with pool.acquire() as conn:
+            try:
+                archived.append(await archive_partition(conn, parent, name, archive_dir))
+            except Exception as e:
+                logger.error("Failed to archive partition %s: %s", name, e)
+    return archived
@@ -0,0 +1,127 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from types import CodeType
+from typing import Dict, List, Optional, Tuple
+
+ASYNCIO_DIR = os.path.dirname(asyncio.__file__)
+IDLE = '<idle>'
+UNATTRIBUTED = '<other>'
+
+
+def _label(code: CodeType) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class ProfileResult:
+    """Samples collected over one profiling window, keyed by (command, stack of code objects)"""
+
+    def __init__(self, samples: Counter, duration: float, interval: float):
+        self.samples = samples
+        self.duration = duration
+        self.interval = interval
+
+    @property
+    def total(self) -> int:
+        return sum(self.samples.values())
+
+    @staticmethod
+    def _frames(stack: Tuple[CodeType, ...]) -> List[str]:
+        """Root-first frame labels with the event-loop plumbing above the running task cut off"""
+        if not stack or stack[0].co_filename.endswith('selectors.py'):
+            return [IDLE]
+        frames = list(reversed(stack))
+        for i in range(len(frames) - 1, -1, -1):
+            if frames[i].co_filename.startswith(ASYNCIO_DIR):
+                frames = frames[i + 1:] or frames[i:]
+                break
+        return [_label(code) for code in frames]
+
+    def collapsed(self) -> str:
+        """Brendan Gregg's collapsed-stack format, one `command;frame;...;frame count` line per stack"""
+        lines = Counter()
+        for (command, stack), count in self.samples.items():
+            frames = self._frames(stack)
+            lines[IDLE if frames == [IDLE] else ';'.join([command] + frames)] += count
+        return ''.join(f"{line} {count}\n" for line, count in sorted(lines.items()))
+
+    def by_command(self) -> Counter:
+        totals = Counter()
+        for (command, stack), count in self.samples.items():
+            totals[IDLE if self._frames(stack) == [IDLE] else command] += count
+        return totals
+
+    def top_functions(self, limit: int = 10) -> List[Tuple[str, int]]:
+        """Functions that were on top of the stack most often (self time)"""
+        leaves = Counter()
+        for (_, stack), count in self.samples.items():
+            leaves[self._frames(stack)[-1]] += count
+        return leaves.most_common(limit)
+
+
+class SamplingProfiler:
+    """Samples the event-loop thread's stack from a background thread.
+
+    Nothing is installed while it is off: no trace hooks, no thread. While
+    on, a daemon thread wakes every `interval` seconds, reads the loop
+    thread's current frame through `sys._current_frames()` and counts the
+    stack. A sample is attributed to the outermost frame whose code object
+    is in `code_names`, i.e. the command callback that is running. Only
+    time spent running on the loop is visible; a command waiting on the
+    database is not on the stack while it waits.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._samples: Counter = Counter()
+        self._code_names: Dict[CodeType, str] = {}
+        self._target_id: Optional[int] = None
+        self._started_at = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self, code_names: Dict[CodeType, str]):
+        """Start sampling the calling thread, normally the event loop's"""
+        if self.running:
+            raise RuntimeError("Profiler is already running")
+        self._code_names = code_names
+        self._samples = Counter()
+        self._target_id = threading.get_ident()
+        self._stop.clear()
+        self._started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> ProfileResult:
+        """Stop sampling and return what was collected; blocks until the sampler thread exits"""
+        if not self.running:
+            raise RuntimeError("Profiler is not running")
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        return ProfileResult(self._samples, time.perf_counter() - self._started_at, self.interval)
+
+    def _run(self):
+        code_names = self._code_names
+        samples = self._samples
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target_id)
+            command = UNATTRIBUTED
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(code)
+                if code in code_names:
+                    command = code_names[code]
+                frame = frame.f_back
+            samples[(command, tuple(stack))] += 1
+
+
+profiler = SamplingProfiler()
@@ -0,0 +1,206 @@
+"""SQL run on user-facing command paths.
+
+The cogs and DatabaseManager execute these constants, and
+tests/test_query_plans.py runs EXPLAIN on every one of them against a
+seeded database, failing if any falls back to a sequential scan. Add a
+hot query here, not inline, so the plan check covers it.
+"""
+
+# DatabaseManager: guild config, users and sprints
+GUILD_CONFIG = 'SELECT * FROM guild_config WHERE guild_id = $1'
+
+GUILD_CATEGORIES = 'SELECT id, name, description FROM categories WHERE guild_id = $1 ORDER BY name'
+
+ENSURE_USER = '''
+    INSERT INTO users (user_id, guild_id) VALUES ($1, $2)
+    ON CONFLICT (user_id, guild_id) DO NOTHING
+'''
+
+ENSURE_USERS = '''
+    INSERT INTO users (user_id, guild_id)
+    SELECT * FROM unnest($1::bigint[], $2::bigint[])
+    ON CONFLICT (user_id, guild_id) DO NOTHING
+'''
+
+DISPLAY_NAMES = '''
+    SELECT user_id, display_name FROM users
+    WHERE guild_id = $1 AND user_id = ANY($2::bigint[]) AND display_name IS NOT NULL
+'''
+
+RECORD_DISPLAY_NAMES = '''
+    UPDATE users u SET display_name = v.display_name
+    FROM unnest($1::bigint[], $2::bigint[], $3::varchar[]) AS v(guild_id, user_id, display_name)
+    WHERE u.guild_id = v.guild_id AND u.user_id = v.user_id
+      AND u.display_name IS DISTINCT FROM v.display_name
+'''
+
+USER = 'SELECT * FROM users WHERE user_id = $1 AND guild_id = $2'
+
+CHALLENGE_ID_TAKEN = 'SELECT 1 FROM challenges WHERE challenge_id = $1'
+
+ACTIVE_SPRINT = 'SELECT * FROM sprints WHERE guild_id = $1 AND status = $2 ORDER BY start_date DESC LIMIT 1'
+
+# !challenge
+ISSUE_CHALLENGE = '''
+    INSERT INTO challenges (challenge_id, user_id, guild_id, sprint_id, category_id, title, description, base_difficulty_elo)
+    VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
+'''
+
+COUNT_ISSUED = 'UPDATE users SET total_challenges = total_challenges + 1 WHERE user_id = $1 AND guild_id = $2'
+
+# !challenges
+LIST_CHALLENGES = '''
+    SELECT c.challenge_id, c.title,
+           COALESCE(c.final_difficulty_elo, c.base_difficulty_elo) as difficulty_elo,
+           c.status, c.created_at,
+           cat.name as category, u.user_id
+    FROM challenges c
+    JOIN categories cat ON c.category_id = cat.id
+    JOIN users u ON c.user_id = u.user_id AND c.guild_id = u.guild_id
+    WHERE c.guild_id = $1 AND c.status = $2
+    ORDER BY c.created_at DESC
+    LIMIT 10
+'''
+
+# !search, one page of ranked matches after the (rank, id) cursor in $5/$6
+SEARCH_CHALLENGES = '''
+    SELECT c.id, c.challenge_id, c.title, c.status, c.user_id,
+           COALESCE(c.final_difficulty_elo, c.base_difficulty_elo) as difficulty_elo,
+           cat.name as category, r.rank
+    FROM challenges c
+    CROSS JOIN LATERAL (SELECT ts_rank(c.search_vector, websearch_to_tsquery('english', $2)) AS rank) r
+    JOIN categories cat ON c.category_id = cat.id
+    WHERE c.guild_id = $1 AND c.search_vector @@ websearch_to_tsquery('english', $2)
+      AND ($3::varchar IS NULL OR c.status = $3)
+      AND ($4::int IS NULL OR c.category_id = $4)
+      AND ($5::real IS NULL OR (r.rank, c.id) < ($5::real, $6::int))
+    ORDER BY r.rank DESC, c.id DESC
+    LIMIT $7
+'''
+
+# !complete
+OWN_CHALLENGE = 'SELECT * FROM challenges WHERE challenge_id = $1 AND user_id = $2 AND guild_id = $3'
+
+SUBMIT_COMPLETION = '''
+    UPDATE challenges SET status = $1, proof_description = $2, completed_at = $3
+    WHERE challenge_id = $4
+'''
+
+# !approve / !reject
+REVIEWED_CHALLENGE = 'SELECT * FROM challenges WHERE challenge_id = $1 AND guild_id = $2'
+
+RECORD_REVIEW_VOTE = '''
+    INSERT INTO approvals (challenge_id, voter_id, guild_id, vote_type, comment) VALUES ($1, $2, $3, $4, $5)
+'''
+
+REVIEW_VOTES = 'SELECT vote_type FROM approvals WHERE challenge_id = $1'
+
+# Only a challenge still pending review is finalized, so concurrent reviews can't award it twice
+FINALIZE_REVIEW = '''
+    UPDATE challenges SET status = $1, reviewed_at = $2
+    WHERE id = $3 AND status = 'pending_review'
+    RETURNING id
+'''
+
+AWARD_ELO = '''
+    UPDATE users SET current_elo = $1, completed_challenges = completed_challenges + 1
+    WHERE user_id = $2 AND guild_id = $3
+'''
+
+RECORD_ELO_CHANGE = '''
+    INSERT INTO elo_history (user_id, guild_id, challenge_id, elo_before, elo_after, elo_change, reason)
+    VALUES ($1, $2, $3, $4, $5, $6, $7)
+'''
+
+# Difficulty voting buttons
+DIFFICULTY_VOTE_CAST = '''
+    SELECT * FROM difficulty_votes
+    WHERE challenge_id = (SELECT id FROM challenges WHERE challenge_id = $1) AND voter_id = $2
+'''
+
+CHALLENGE_PK = 'SELECT id FROM challenges WHERE challenge_id = $1'
+
+RECORD_DIFFICULTY_VOTE = '''
+    INSERT INTO difficulty_votes (challenge_id, voter_id, guild_id, vote_adjustment) VALUES ($1, $2, $3, $4)
+'''
+
+DIFFICULTY_VOTES = 'SELECT vote_adjustment FROM difficulty_votes WHERE challenge_id = $1'
+
+# Only a challenge still awaiting its difficulty is finalized, exactly once
+FINISH_VOTING = '''
+    UPDATE challenges SET status = $1, final_difficulty_elo = $2, difficulty_voting_active = $3
+    WHERE challenge_id = $4 AND status = 'pending_difficulty'
+    RETURNING user_id, sprint_id, category_id, base_difficulty_elo
+'''
+
+# !profile
+PROFILE_RECENT_CHALLENGES = '''
+    SELECT c.challenge_id, c.title,
+           COALESCE(c.final_difficulty_elo, c.base_difficulty_elo) as difficulty_elo,
+           c.status, c.created_at,
+           cat.name as category
+    FROM challenges c
+    JOIN categories cat ON c.category_id = cat.id
+    WHERE c.user_id = $1 AND c.guild_id = $2
+    ORDER BY c.created_at DESC
+    LIMIT 5
+'''
+
+PROFILE_ELO_HISTORY = '''
+    SELECT elo_before, elo_after, elo_change, created_at FROM elo_history
+    WHERE user_id = $1 AND guild_id = $2 ORDER BY created_at DESC LIMIT 10
+'''
+
+SPRINT_HISTORY = '''
+    SELECT sr.sprint_id, sr.final_rank, sr.elo_gain, sr.completed, sr.attempted,
+           (SELECT COUNT(*) FROM sprint_results WHERE sprint_id = sr.sprint_id) AS participants
+    FROM sprint_results sr
+    WHERE sr.guild_id = $1 AND sr.user_id = $2
+    ORDER BY sr.sprint_id DESC
+    LIMIT $3
+'''
+
+# !leaderboard
+LEADERBOARD_WEEKLY = '''
+    SELECT u.user_id, u.current_elo,
+           COALESCE(SUM(eh.elo_change), 0) as weekly_gain,
+           COUNT(c.id) as weekly_challenges,
+           COUNT(CASE WHEN c.status = 'completed' THEN 1 END) as weekly_completed
+    FROM users u
+    LEFT JOIN elo_history eh ON u.user_id = eh.user_id AND u.guild_id = eh.guild_id
+    LEFT JOIN challenges c ON eh.challenge_id = c.id AND c.sprint_id = $1
+    WHERE u.guild_id = $2
+    GROUP BY u.user_id, u.current_elo
+    ORDER BY weekly_gain DESC
+    LIMIT 10
+'''
+
+LEADERBOARD_ALLTIME = '''
+    SELECT u.user_id, u.current_elo, u.total_challenges, u.completed_challenges
+    FROM users u
+    WHERE u.guild_id = $1
+    ORDER BY u.current_elo DESC
+    LIMIT 10
+'''
+
+LATEST_ENDED_SPRINT = 'SELECT * FROM sprints WHERE guild_id = $1 AND status <> $2 ORDER BY start_date DESC LIMIT 1'
+
+ENDED_SPRINT = 'SELECT * FROM sprints WHERE id = $1 AND guild_id = $2 AND status <> $3'
+
+SPRINT_RESULTS = '''
+    SELECT user_id, final_rank, elo_gain, final_elo, completed, attempted
+    FROM sprint_results WHERE sprint_id = $1 ORDER BY final_rank LIMIT $2
+'''
+
+# !stats
+LATEST_SPRINT = 'SELECT * FROM sprints WHERE guild_id = $1 ORDER BY start_date DESC LIMIT 1'
+
+SPRINT = 'SELECT * FROM sprints WHERE id = $1 AND guild_id = $2'
+
+SPRINT_ROLLUPS = '''
+    SELECT r.*, cat.name as category
+    FROM challenge_rollups r
+    LEFT JOIN categories cat ON cat.id = r.category_id
+    WHERE r.guild_id = $1 AND r.sprint_id = $2
+    ORDER BY r.issued DESC
+'''
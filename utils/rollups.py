@@ -0,0 +1,155 @@
+import logging
+from bisect import bisect_right
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the completion-to-review latency buckets; one
+# more bucket holds everything slower. Matches width_bucket() in the rebuild.
+LATENCY_BOUNDS = (300, 900, 1800, 3600, 7200, 14400, 28800, 86400, 172800, 604800)
+LATENCY_LABELS = ('<5m', '5-15m', '15-30m', '30m-1h', '1-2h', '2-4h', '4-8h', '8-24h', '1-2d', '2-7d', '>7d')
+
+# Counters are added to the existing row; review_latency is added bucket by bucket
+_UPSERT = '''
+    INSERT INTO challenge_rollups AS r (guild_id, sprint_id, category_id, issued, completed, failed, rejected,
+                                        reviewed, review_latency, voted, drift_sum, drift_abs_sum)
+    VALUES ($1, COALESCE($2, 0), COALESCE($3, 0), $4, $5, $6, $7, $8, $9::int[], $10, $11, $12)
+    ON CONFLICT (guild_id, sprint_id, category_id) DO UPDATE SET
+        issued = r.issued + EXCLUDED.issued,
+        completed = r.completed + EXCLUDED.completed,
+        failed = r.failed + EXCLUDED.failed,
+        rejected = r.rejected + EXCLUDED.rejected,
+        reviewed = r.reviewed + EXCLUDED.reviewed,
+        review_latency = ARRAY(
+            SELECT COALESCE(a, 0) + COALESCE(b, 0)
+            FROM unnest(r.review_latency, EXCLUDED.review_latency) WITH ORDINALITY AS t(a, b, i)
+            ORDER BY i
+        ),
+        voted = r.voted + EXCLUDED.voted,
+        drift_sum = r.drift_sum + EXCLUDED.drift_sum,
+        drift_abs_sum = r.drift_abs_sum + EXCLUDED.drift_abs_sum,
+        updated_at = CURRENT_TIMESTAMP
+'''
+
+_COLUMNS = 'guild_id, sprint_id, category_id, issued, completed, failed, rejected, reviewed, review_latency, voted, drift_sum, drift_abs_sum'
+
+# Recomputes a guild's rollups from the base tables, using the same rules as the incremental updates
+_REBUILD = f'''
+    WITH latency AS (
+        SELECT COALESCE(sprint_id, 0) AS sprint_id, COALESCE(category_id, 0) AS category_id,
+               width_bucket(EXTRACT(EPOCH FROM reviewed_at - completed_at)::float8, $2::float8[]) + 1 AS bucket,
+               count(*) AS n
+        FROM challenges
+        WHERE guild_id = $1 AND status IN ('completed', 'rejected')
+          AND completed_at IS NOT NULL AND reviewed_at IS NOT NULL
+        GROUP BY 1, 2, 3
+    )
+    INSERT INTO challenge_rollups ({_COLUMNS})
+    SELECT $1, g.sprint_id, g.category_id, g.issued, g.completed, g.failed, g.rejected, g.reviewed,
+           ARRAY(
+               SELECT COALESCE(l.n, 0)::int FROM generate_series(1, $3) b
+               LEFT JOIN latency l ON l.sprint_id = g.sprint_id AND l.category_id = g.category_id AND l.bucket = b
+               ORDER BY b
+           ),
+           g.voted, g.drift_sum, g.drift_abs_sum
+    FROM (
+        SELECT COALESCE(sprint_id, 0) AS sprint_id, COALESCE(category_id, 0) AS category_id,
+               count(*) AS issued,
+               count(*) FILTER (WHERE status = 'completed') AS completed,
+               count(*) FILTER (WHERE status = 'failed') AS failed,
+               count(*) FILTER (WHERE status = 'rejected') AS rejected,
+               count(*) FILTER (WHERE status IN ('completed', 'rejected')
+                                  AND completed_at IS NOT NULL AND reviewed_at IS NOT NULL) AS reviewed,
+               count(final_difficulty_elo) AS voted,
+               COALESCE(sum(final_difficulty_elo - base_difficulty_elo), 0) AS drift_sum,
+               COALESCE(sum(abs(final_difficulty_elo - base_difficulty_elo)), 0) AS drift_abs_sum
+        FROM challenges
+        WHERE guild_id = $1
+        GROUP BY 1, 2
+    ) g
+'''
+
+
+def _empty_latency() -> List[int]:
+    return [0] * (len(LATENCY_BOUNDS) + 1)
+
+
+async def _bump(conn, guild_id: int, sprint_id: Optional[int], category_id: Optional[int], *,
+                issued=0, completed=0, failed=0, rejected=0, reviewed=0, latency=None,
+                voted=0, drift=0, drift_abs=0):
+    await conn.execute(
+        _UPSERT, guild_id, sprint_id, category_id, issued, completed, failed, rejected,
+        reviewed, latency or _empty_latency(), voted, drift, drift_abs
+    )
+
+
+async def record_issued(conn, guild_id: int, sprint_id: int, category_id: int):
+    await _bump(conn, guild_id, sprint_id, category_id, issued=1)
+
+
+async def record_voting(conn, guild_id: int, sprint_id: int, category_id: int, base: int, final: int):
+    """Count a challenge's difficulty being finalized, by vote or at its base difficulty"""
+    await _bump(conn, guild_id, sprint_id, category_id, voted=1,
+                drift=final - base, drift_abs=abs(final - base))
+
+
+async def record_review(conn, guild_id: int, sprint_id: int, category_id: int, outcome: str,
+                        latency_seconds: Optional[float]):
+    """Count a reviewed challenge ('completed' or 'rejected') and when it was reviewed"""
+    latency = None
+    if latency_seconds is not None:
+        latency = _empty_latency()
+        latency[bisect_right(LATENCY_BOUNDS, latency_seconds)] = 1
+    await _bump(conn, guild_id, sprint_id, category_id,
+                completed=int(outcome == 'completed'), rejected=int(outcome == 'rejected'),
+                reviewed=int(latency is not None), latency=latency)
+
+
+async def record_failed(conn, guild_id: int, rows: Iterable[Dict[str, Any]]):
+    """Count expired challenges, one upsert per (sprint, category)"""
+    counts = Counter((row['sprint_id'], row['category_id']) for row in rows)
+    for (sprint_id, category_id), failed in counts.items():
+        await _bump(conn, guild_id, sprint_id, category_id, failed=failed)
+
+
+async def rebuild(conn, guild_id: int) -> int:
+    """Recompute a guild's rollups from scratch; returns how many rows the incremental copy had wrong.
+
+    Must run inside a transaction.
+    """
+    await conn.execute('CREATE TEMP TABLE rollups_before (LIKE challenge_rollups) ON COMMIT DROP')
+    await conn.execute(
+        'INSERT INTO rollups_before SELECT * FROM challenge_rollups WHERE guild_id = $1',
+        guild_id
+    )
+    await conn.execute('DELETE FROM challenge_rollups WHERE guild_id = $1', guild_id)
+    await conn.execute(_REBUILD, guild_id, list(map(float, LATENCY_BOUNDS)), len(LATENCY_BOUNDS) + 1)
+
+    mismatched = await conn.fetchval(
+        f'''SELECT count(*) FROM (
+                (SELECT {_COLUMNS} FROM rollups_before
+                 EXCEPT SELECT {_COLUMNS} FROM challenge_rollups WHERE guild_id = $1)
+                UNION ALL
+                (SELECT {_COLUMNS} FROM challenge_rollups WHERE guild_id = $1
+                 EXCEPT SELECT {_COLUMNS} FROM rollups_before)
+            ) d''',
+        guild_id
+    )
+    await conn.execute('DROP TABLE rollups_before')
+    if mismatched:
+        logger.warning("Rebuilt rollups for guild %s: %d rows differed from the incremental copy", guild_id, mismatched)
+    return mismatched
+
+
+def median_latency(buckets: List[int]) -> Optional[str]:
+    """Label of the bucket holding the median review latency"""
+    total = sum(buckets)
+    if not total:
+        return None
+    seen = 0
+    for label, count in zip(LATENCY_LABELS, buckets):
+        seen += count
+        if seen * 2 >= total:
+            return label
+    return LATENCY_LABELS[-1]
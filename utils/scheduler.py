@@ -0,0 +1,187 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+
+from discord.ext import commands
+
+from utils.metrics import metrics
+from utils.throttle import command_class
+
+logger = logging.getLogger(__name__)
+
+# Virtual-time cost of one command in each throttle cost class
+CLASS_COSTS = {
+    'light': 1.0,
+    'read': 2.0,
+    'write': 2.0,
+    'bulk': 8.0,
+}
+
+PRIORITY_LANE = 0
+COMMAND_LANE = 1
+
+# Commands that can run for minutes; they queue in their own small lane
+# instead of holding fair-queue slots other guilds are waiting for
+LONG_RUNNING_COMMANDS = {'import', 'export', 'debug profile'}
+
+
+class SchedulerBusy(commands.CommandError):
+    """Raised when a guild already has as many commands waiting as it is allowed"""
+
+    def __init__(self, guild_id: Optional[int]):
+        self.guild_id = guild_id
+        super().__init__(f"Too many commands queued for guild {guild_id}")
+
+
+class _GuildState:
+    __slots__ = ('running', 'waiting', 'finish')
+
+    def __init__(self):
+        self.running = 0
+        self.waiting = 0
+        self.finish = 0.0
+
+
+class FairScheduler:
+    """Weighted fair queueing of command work across guilds.
+
+    At most `slots` commands run at once, and at most `guild_slots` of them
+    for any one guild. Waiting work is tagged with a virtual finish time,
+    `max(virtual now, guild's last tag) + cost`, and the lowest tag runs
+    next, so a guild with a backlog only gets its fair share of free slots
+    however much it queues. Interaction work (button clicks, slash
+    commands) rides a priority lane ahead of every tag and ignores the
+    per-guild cap, because Discord drops interactions not answered within
+    three seconds. Commands in LONG_RUNNING_COMMANDS go to `long_lane`, a
+    separate scheduler with its own few slots, so they never hold these.
+    """
+
+    def __init__(self, slots: int = 10, guild_slots: int = 3, max_waiting: int = 20,
+                 long_lane: Optional['FairScheduler'] = None, name: str = 'scheduler'):
+        self.slots = slots
+        self.name = name
+        self.long_lane = long_lane
+        self.guild_slots = guild_slots
+        self.max_waiting = max_waiting
+        self.running = 0
+        self.virtual_time = 0.0
+        self._guilds: Dict[Optional[int], _GuildState] = {}
+        self._heap: List[tuple] = []
+        self._seq = itertools.count()
+
+    async def acquire(self, guild_id: Optional[int], cost: float = 1.0, priority: bool = False):
+        """Wait for a slot for the guild; raises SchedulerBusy if its queue is full"""
+        state = self._guilds.get(guild_id)
+        if state is None:
+            state = self._guilds[guild_id] = _GuildState()
+        if not priority and state.waiting >= self.max_waiting:
+            metrics.incr(f'{self.name}.rejected')
+            raise SchedulerBusy(guild_id)
+
+        tag = max(self.virtual_time, state.finish) + cost
+        state.finish = tag
+        state.waiting += 1
+        future = asyncio.get_running_loop().create_future()
+        lane = PRIORITY_LANE if priority else COMMAND_LANE
+        heapq.heappush(self._heap, (lane, tag, next(self._seq), guild_id, future))
+        queued_at = time.perf_counter()
+        self._dispatch()
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.cancelled():
+                state.waiting -= 1
+                self._forget(guild_id)
+            else:
+                # Granted in the same tick we were cancelled; hand the slot back
+                self.release(guild_id)
+            raise
+        metrics.observe(f'{self.name}.wait_s', time.perf_counter() - queued_at)
+
+    def release(self, guild_id: Optional[int]):
+        """Give back a slot taken with acquire"""
+        state = self._guilds[guild_id]
+        state.running -= 1
+        self.running -= 1
+        self._forget(guild_id)
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, guild_id: Optional[int], cost: float = 1.0, priority: bool = False):
+        await self.acquire(guild_id, cost, priority)
+        try:
+            yield
+        finally:
+            self.release(guild_id)
+
+    def _forget(self, guild_id: Optional[int]):
+        state = self._guilds.get(guild_id)
+        if state is not None and not state.running and not state.waiting and state.finish <= self.virtual_time:
+            del self._guilds[guild_id]
+
+    def _dispatch(self):
+        """Start the lowest-tagged waiters whose guild has a free slot, while global slots remain"""
+        skipped = []
+        while self._heap and self.running < self.slots:
+            entry = heapq.heappop(self._heap)
+            lane, tag, _, guild_id, future = entry
+            if future.cancelled():
+                continue
+            state = self._guilds[guild_id]
+            if lane != PRIORITY_LANE and state.running >= self.guild_slots:
+                skipped.append(entry)
+                continue
+            state.waiting -= 1
+            state.running += 1
+            self.running += 1
+            self.virtual_time = max(self.virtual_time, tag)
+            future.set_result(None)
+        for entry in skipped:
+            heapq.heappush(self._heap, entry)
+        metrics.gauge(f'{self.name}.running', self.running)
+        metrics.gauge(f'{self.name}.queued', len(self._heap))
+
+    async def before_invoke(self, ctx: commands.Context):
+        """Global before-invoke hook: queue the command behind its guild's fair share"""
+        if getattr(ctx, 'scheduler_slot', None) is not None:
+            # A group's subcommand; the slot taken for its parent covers the whole invocation
+            return
+        lane = self
+        if self.long_lane is not None and ctx.command.qualified_name in LONG_RUNNING_COMMANDS:
+            lane = self.long_lane
+        cost = CLASS_COSTS.get(command_class(ctx.command), 1.0)
+        await lane.acquire(ctx.guild.id if ctx.guild else None, cost, priority=ctx.interaction is not None)
+        ctx.scheduler_slot = lane
+
+    async def after_invoke(self, ctx: commands.Context):
+        """Global after-invoke hook: free the slot taken in before_invoke"""
+        if ctx.invoked_subcommand is not None and ctx.command is not ctx.invoked_subcommand:
+            # The group's own callback ran first; keep the slot for its subcommand
+            return
+        self.finish(ctx)
+
+    def finish(self, ctx: commands.Context):
+        """Free the invocation's slot if it still holds one; safe to call more than once"""
+        lane = getattr(ctx, 'scheduler_slot', None)
+        if lane is not None:
+            ctx.scheduler_slot = None
+            lane.release(ctx.guild.id if ctx.guild else None)
+
+
+scheduler = FairScheduler(
+    slots=int(os.getenv('SCHEDULER_SLOTS', os.getenv('DB_POOL_SIZE', 10))),
+    guild_slots=int(os.getenv('SCHEDULER_GUILD_SLOTS', 3)),
+    max_waiting=int(os.getenv('SCHEDULER_GUILD_QUEUE', 20)),
+    long_lane=FairScheduler(
+        slots=int(os.getenv('SCHEDULER_LONG_SLOTS', 2)),
+        guild_slots=1,
+        max_waiting=int(os.getenv('SCHEDULER_LONG_QUEUE', 2)),
+        name='scheduler.long',
+    ),
+)
@@ -0,0 +1,145 @@
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from discord.ext import commands
+
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Command cost classes; commands not listed here are 'light'
+COMMAND_CLASSES = {
+    'leaderboard': 'read',
+    'profile': 'read',
+    'challenges': 'read',
+    'search': 'read',
+    'stats': 'read',
+    'challenge': 'write',
+    'complete': 'write',
+    'approve': 'write',
+    'reject': 'write',
+    'export': 'bulk',
+    'import': 'bulk',
+}
+
+# (burst, seconds to refill the whole burst) per scope and cost class.
+# Override with THROTTLE_<CLASS>_<SCOPE>=burst/seconds, e.g. THROTTLE_READ_USER=5/30
+DEFAULT_LIMITS = {
+    'light': {'user': (10, 20), 'guild': (60, 20)},
+    'read': {'user': (5, 30), 'guild': (30, 30)},
+    'write': {'user': (5, 60), 'guild': (30, 60)},
+    'bulk': {'user': (1, 300), 'guild': (2, 600)},
+}
+
+
+def command_class(command: Optional[commands.Command]) -> str:
+    """Cost class of a command, looked up by its top-level name"""
+    if command is None:
+        return 'light'
+    root = command.root_parent or command
+    return COMMAND_CLASSES.get(root.name, 'light')
+
+
+def _load_limits() -> Dict[str, Dict[str, Tuple[int, float]]]:
+    limits = {}
+    for cost_class, scopes in DEFAULT_LIMITS.items():
+        limits[cost_class] = {}
+        for scope, default in scopes.items():
+            raw = os.getenv(f'THROTTLE_{cost_class.upper()}_{scope.upper()}')
+            try:
+                burst, seconds = raw.split('/') if raw else default
+                limits[cost_class][scope] = (int(burst), float(seconds))
+            except ValueError:
+                logger.warning("Ignoring malformed THROTTLE_%s_%s=%r", cost_class.upper(), scope.upper(), raw)
+                limits[cost_class][scope] = default
+    return limits
+
+
+class Throttled(commands.CheckFailure):
+    """Raised by the global throttle check; carries which bucket ran dry and when to retry"""
+
+    def __init__(self, scope: str, cost_class: str, retry_after: float):
+        self.scope = scope
+        self.cost_class = cost_class
+        self.retry_after = retry_after
+        super().__init__(f"Throttled ({scope}, {cost_class}); retry in {retry_after:.1f}s")
+
+
+class _Bucket:
+    __slots__ = ('tokens', 'updated_at')
+
+    def __init__(self, tokens: float, updated_at: float):
+        self.tokens = tokens
+        self.updated_at = updated_at
+
+
+class Throttle:
+    """Token buckets per (scope, id, cost class) in front of every command.
+
+    Each key costs one small slotted bucket. Buckets live in an
+    OrderedDict in last-use order, so idle ones sit at the front; a bucket
+    idle for its full refill period is full again, so dropping it changes
+    nothing and `_evict` does so a few at a time on every check.
+    """
+
+    def __init__(self, limits=None, max_keys: int = 100000):
+        self.limits = limits or _load_limits()
+        self.max_keys = max_keys
+        self.idle_after = max(seconds for scopes in self.limits.values() for _, seconds in scopes.values())
+        self._buckets: 'OrderedDict[Tuple[str, int, str], _Bucket]' = OrderedDict()
+
+    def _refill(self, key, burst: int, seconds: float, now: float) -> _Bucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = _Bucket(float(burst), now)
+        else:
+            bucket.tokens = min(burst, bucket.tokens + (now - bucket.updated_at) * burst / seconds)
+            bucket.updated_at = now
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def acquire(self, cost_class: str, user_id: int, guild_id: Optional[int]):
+        """Take one token from the user's and the guild's bucket, or raise Throttled without taking either"""
+        now = time.monotonic()
+        self._evict(now)
+        scopes = [('user', user_id)]
+        if guild_id is not None:
+            scopes.append(('guild', guild_id))
+
+        taken = []
+        for scope, scope_id in scopes:
+            burst, seconds = self.limits[cost_class][scope]
+            bucket = self._refill((scope, scope_id, cost_class), burst, seconds, now)
+            if bucket.tokens < 1:
+                metrics.incr(f'throttle.rejected.{scope}.{cost_class}')
+                raise Throttled(scope, cost_class, (1 - bucket.tokens) * seconds / burst)
+            taken.append(bucket)
+
+        for bucket in taken:
+            bucket.tokens -= 1
+        metrics.incr(f'throttle.allowed.{cost_class}')
+
+    def _evict(self, now: float, batch: int = 16):
+        for _ in range(batch):
+            if not self._buckets:
+                break
+            key, bucket = next(iter(self._buckets.items()))
+            if len(self._buckets) <= self.max_keys and now - bucket.updated_at < self.idle_after:
+                break
+            del self._buckets[key]
+        metrics.gauge('throttle.keys', len(self._buckets))
+
+    async def check(self, ctx: commands.Context) -> bool:
+        """Global bot check: charge the invoking user and guild for the command's cost class"""
+        if ctx.command is None or getattr(ctx, 'throttle_charged', False):
+            # Checks run again for a group's subcommand; charge each invocation once
+            return True
+        self.acquire(command_class(ctx.command), ctx.author.id, ctx.guild.id if ctx.guild else None)
+        ctx.throttle_charged = True
+        return True
+
+
+throttle = Throttle(max_keys=int(os.getenv('THROTTLE_MAX_KEYS', 100000)))
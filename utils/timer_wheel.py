@@ -0,0 +1,84 @@
+import math
+import time
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+
+class TimerWheel:
+    """Hierarchical timing wheel: O(1) schedule and cancel, one pass per tick to fire.
+
+    Time is counted in ticks of `tick` seconds. Level 0 has one slot per
+    tick; each higher level's slots are `slots` times wider. A timer goes
+    into the lowest level whose span covers how far away it is, and when
+    the wheel turns over a higher-level slot its timers cascade down until
+    they reach level 0 and fire. Timers beyond the top level's span wait in
+    the top level and are re-placed each time their slot comes round.
+
+    Nothing runs by itself: call `advance(now)` periodically and handle the
+    payloads it returns. Cancelling only forgets the key; the stale slot
+    entry is skipped when its slot is reached.
+    """
+
+    def __init__(self, tick: float = 1.0, slots: int = 64, levels: int = 4, now: Optional[float] = None):
+        self.tick = tick
+        self.slots = slots
+        self.levels = levels
+        self.origin = time.time() if now is None else now
+        self.current = 0
+        self._wheels: List[List[List[Tuple[Hashable, int]]]] = [
+            [[] for _ in range(slots)] for _ in range(levels)
+        ]
+        self._timers: Dict[Hashable, Tuple[int, Any]] = {}
+
+    def __len__(self) -> int:
+        return len(self._timers)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._timers
+
+    def schedule(self, key: Hashable, when: float, payload: Any = None):
+        """Fire `payload` at epoch time `when`, replacing any timer already set under `key`"""
+        deadline = max(self.current + 1, math.ceil((when - self.origin) / self.tick))
+        existing = self._timers.get(key)
+        self._timers[key] = (deadline, payload)
+        if existing is None or existing[0] != deadline:
+            self._place(key, deadline)
+
+    def cancel(self, key: Hashable) -> bool:
+        return self._timers.pop(key, None) is not None
+
+    def _place(self, key: Hashable, deadline: int):
+        distance = deadline - self.current
+        for level in range(self.levels):
+            span = self.slots ** (level + 1)
+            if distance < span or level == self.levels - 1:
+                slot = (deadline // self.slots ** level) % self.slots
+                self._wheels[level][slot].append((key, deadline))
+                return
+
+    def advance(self, now: Optional[float] = None) -> List[Any]:
+        """Turn the wheel up to `now` and return the payloads of every timer that came due, in order"""
+        now = time.time() if now is None else now
+        target = math.floor((now - self.origin) / self.tick)
+        due = []
+        while self.current < target:
+            self.current += 1
+            # Cascade from the top so timers can fall through several levels in one tick
+            for level in reversed(range(1, self.levels)):
+                if self.current % self.slots ** level:
+                    continue
+                slot = (self.current // self.slots ** level) % self.slots
+                entries, self._wheels[level][slot] = self._wheels[level][slot], []
+                for key, deadline in entries:
+                    timer = self._timers.get(key)
+                    if timer is not None and timer[0] == deadline:
+                        self._place(key, deadline)
+
+            slot = self.current % self.slots
+            entries, self._wheels[0][slot] = self._wheels[0][slot], []
+            for key, deadline in entries:
+                timer = self._timers.get(key)
+                if timer is None or timer[0] != deadline:
+                    continue
+                del self._timers[key]
+                due.append(timer[1])
+        return due
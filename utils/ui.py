@@ -1,5 +1,8 @@
 import discord
 from utils.db import db_manager
+from utils.dispatcher import dispatcher
+from utils import queries, rollups
+from utils.scheduler import scheduler
 
 class DifficultyVotingView(discord.ui.View):
     def __init__(self, challenge_id: str, base_difficulty: int):
@@ -9,11 +12,13 @@ class DifficultyVotingView(discord.ui.View):
     
     @discord.ui.button(label='-10 ELO', style=discord.ButtonStyle.red, emoji='⬇️')
     async def vote_down(self, interaction: discord.Interaction, button: discord.ui.Button):
-        await self.process_vote(interaction, -10)
+        async with scheduler.slot(interaction.guild_id, priority=True):
+            await self.process_vote(interaction, -10)
     
     @discord.ui.button(label='+10 ELO', style=discord.ButtonStyle.green, emoji='⬆️')
     async def vote_up(self, interaction: discord.Interaction, button: discord.ui.Button):
-        await self.process_vote(interaction, 10)
+        async with scheduler.slot(interaction.guild_id, priority=True):
+            await self.process_vote(interaction, 10)
     
     @discord.ui.button(label='Finalize Voting', style=discord.ButtonStyle.primary, emoji='✅')
     async def finalize_voting(self, interaction: discord.Interaction, button: discord.ui.Button):
@@ -22,25 +27,20 @@ class DifficultyVotingView(discord.ui.View):
             await interaction.response.send_message("❌ Only administrators can finalize voting", ephemeral=True)
             return
         
-        await self.finish_voting(interaction)
+        async with scheduler.slot(interaction.guild_id, priority=True):
+            await self.finish_voting(interaction)
     
     async def process_vote(self, interaction: discord.Interaction, adjustment: int):
         async with db_manager.db_pool.acquire() as conn:
             # Check if user already voted
-            existing_vote = await conn.fetchrow(
-                'SELECT * FROM difficulty_votes WHERE challenge_id = (SELECT id FROM challenges WHERE challenge_id = $1) AND voter_id = $2',
-                self.challenge_id, interaction.user.id
-            )
+            existing_vote = await conn.fetchrow(queries.DIFFICULTY_VOTE_CAST, self.challenge_id, interaction.user.id)
             
             if existing_vote:
                 await interaction.response.send_message("❌ You have already voted on this challenge's difficulty!", ephemeral=True)
                 return
             
             # Get challenge database ID
-            challenge_db_id = await conn.fetchval(
-                'SELECT id FROM challenges WHERE challenge_id = $1',
-                self.challenge_id
-            )
+            challenge_db_id = await conn.fetchval(queries.CHALLENGE_PK, self.challenge_id)
             
             if not challenge_db_id:
                 await interaction.response.send_message("❌ Challenge not found", ephemeral=True)
@@ -48,15 +48,13 @@ class DifficultyVotingView(discord.ui.View):
             
             # Record vote
             await conn.execute(
-                'INSERT INTO difficulty_votes (challenge_id, voter_id, guild_id, vote_adjustment) VALUES ($1, $2, $3, $4)',
+                queries.RECORD_DIFFICULTY_VOTE,
                 challenge_db_id, interaction.user.id, interaction.guild.id, adjustment
             )
+            db_manager.mark_write(interaction.guild.id)
             
             # Get current vote tally
-            votes = await conn.fetch(
-                'SELECT vote_adjustment FROM difficulty_votes WHERE challenge_id = $1',
-                challenge_db_id
-            )
+            votes = await conn.fetch(queries.DIFFICULTY_VOTES, challenge_db_id)
             
             total_adjustment = sum(vote['vote_adjustment'] for vote in votes)
             vote_count = len(votes)
@@ -75,21 +73,17 @@ class DifficultyVotingView(discord.ui.View):
             embed.add_field(name="Total Votes", value=str(vote_count), inline=True)
             embed.add_field(name="Status", value="🗳️ Voting in progress", inline=True)
             
-            await interaction.response.edit_message(embed=embed, view=self)
+            # Acknowledge now and let the dispatcher fold rapid votes into one message edit
+            await interaction.response.defer()
+            dispatcher.edit(interaction.message, embed=embed, view=self)
     
     async def finish_voting(self, interaction: discord.Interaction):
         async with db_manager.db_pool.acquire() as conn:
             # Get challenge database ID
-            challenge_db_id = await conn.fetchval(
-                'SELECT id FROM challenges WHERE challenge_id = $1',
-                self.challenge_id
-            )
+            challenge_db_id = await conn.fetchval(queries.CHALLENGE_PK, self.challenge_id)
             
             # Calculate final difficulty
-            votes = await conn.fetch(
-                'SELECT vote_adjustment FROM difficulty_votes WHERE challenge_id = $1',
-                challenge_db_id
-            )
+            votes = await conn.fetch(queries.DIFFICULTY_VOTES, challenge_db_id)
             
             total_adjustment = sum(vote['vote_adjustment'] for vote in votes) if votes else 0
             vote_count = len(votes)
@@ -101,11 +95,24 @@ class DifficultyVotingView(discord.ui.View):
                 average_adjustment = 0
                 final_difficulty = self.base_difficulty
             
-            # Update challenge status
-            await conn.execute(
-                'UPDATE challenges SET status = $1, final_difficulty_elo = $2, difficulty_voting_active = $3 WHERE challenge_id = $4',
-                'active', final_difficulty, False, self.challenge_id
-            )
+            # Update challenge status; only a challenge still awaiting its difficulty is finalized, exactly once
+            async with conn.transaction():
+                challenge = await conn.fetchrow(
+                    queries.FINISH_VOTING,
+                    'active', final_difficulty, False, self.challenge_id
+                )
+                if challenge is not None:
+                    await rollups.record_voting(
+                        conn, interaction.guild.id, challenge['sprint_id'], challenge['category_id'],
+                        challenge['base_difficulty_elo'], final_difficulty
+                    )
+            if challenge is None:
+                await interaction.response.send_message(
+                    "❌ This challenge no longer exists or its difficulty has already been finalized", ephemeral=True
+                )
+                return
+            db_manager.challenge_index.set_status(interaction.guild.id, self.challenge_id, 'active')
+            await db_manager.invalidate_profiles(interaction.guild.id, challenge['user_id'])
             
             # Update embed to show finalized result
             embed = discord.Embed(title="✅ Difficulty Voting Finalized", color=0x27ae60)
@@ -120,4 +127,27 @@ class DifficultyVotingView(discord.ui.View):
             for item in self.children:
                 item.disabled = True
             
-            await interaction.response.edit_message(embed=embed, view=self) 
\ No newline at end of file
+            # Queued behind (and superseding) any pending vote-tally edit of this message
+            await interaction.response.defer()
+            dispatcher.edit(interaction.message, embed=embed, view=self)
+
+
+class SearchResultsView(discord.ui.View):
+    """Next-page button for !search results; only the member who searched can page"""
+
+    def __init__(self, author_id: int, load_page, cursor):
+        super().__init__(timeout=120)
+        self.author_id = author_id
+        self.load_page = load_page
+        self.cursor = cursor
+
+    @discord.ui.button(label='Next', style=discord.ButtonStyle.secondary, emoji='▶️')
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        if interaction.user.id != self.author_id:
+            await interaction.response.send_message("❌ Only the member who searched can page through these results", ephemeral=True)
+            return
+
+        embed, self.cursor = await self.load_page(self.cursor)
+        await interaction.response.edit_message(embed=embed, view=self if self.cursor else None)
+        if not self.cursor:
+            self.stop()
@@ -0,0 +1,163 @@
+import json
+import mmap
+import os
+import struct
+import sys
+import zlib
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# File layout (little-endian):
+#   header     magic, format version, section count
+#   directory  one (name, offset, length, crc32) entry per section
+#   sections   each starting on an 8-byte boundary
+# Sections can be checked and decoded independently, straight from the mapping.
+MAGIC = b'ELOWARM\x00'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<8sHH4x')
+DIRECTORY_ENTRY = struct.Struct('<16sQQI4x')
+ALIGN = 8
+
+# known_users: guild count, then (guild_id, user count) per guild, then every guild's sorted IDs as int64
+KNOWN_USERS_HEADER = struct.Struct('<I4x')
+KNOWN_USERS_ENTRY = struct.Struct('<qQ')
+# Cache entries: guild_id, seconds left (negative for no expiry), name length, value length, name, value
+CACHE_ENTRY = struct.Struct('<qdHI')
+
+CacheEntry = Tuple[int, str, Optional[float], str]
+
+
+class SnapshotError(Exception):
+    """The snapshot file is missing, truncated or from another format version"""
+
+
+def write_snapshot(path: str, sections: Dict[str, bytes]):
+    """Write the sections to `path` atomically (a crash mid-write leaves the old file in place)"""
+    offset = HEADER.size + DIRECTORY_ENTRY.size * len(sections)
+    directory, layout = [], []
+    for name, data in sections.items():
+        offset += -offset % ALIGN
+        directory.append(DIRECTORY_ENTRY.pack(name.encode(), offset, len(data), zlib.crc32(data)))
+        layout.append((offset, data))
+        offset += len(data)
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(sections)))
+        f.write(b''.join(directory))
+        for offset, data in layout:
+            f.write(b'\0' * (offset - f.tell()))
+            f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class Snapshot:
+    """A memory-mapped snapshot file; sections are checksummed and decoded only when asked for"""
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            try:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise SnapshotError("empty file")
+        try:
+            self._sections = self._read_directory()
+        except (SnapshotError, struct.error) as e:
+            self._map.close()
+            raise SnapshotError(str(e))
+
+    def _read_directory(self) -> Dict[str, Tuple[int, int, int]]:
+        magic, version, count = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise SnapshotError("not a warm-state snapshot")
+        if version != FORMAT_VERSION:
+            raise SnapshotError(f"format version {version}, expected {FORMAT_VERSION}")
+        sections = {}
+        for i in range(count):
+            name, offset, length, crc = DIRECTORY_ENTRY.unpack_from(self._map, HEADER.size + i * DIRECTORY_ENTRY.size)
+            if offset + length > len(self._map):
+                raise SnapshotError("truncated")
+            sections[name.rstrip(b'\0').decode()] = (offset, length, crc)
+        return sections
+
+    def section(self, name: str) -> Optional[memoryview]:
+        """A view of the section's bytes, or None if it is absent or fails its checksum"""
+        entry = self._sections.get(name)
+        if entry is None:
+            return None
+        offset, length, crc = entry
+        view = memoryview(self._map)[offset:offset + length]
+        if zlib.crc32(view) != crc:
+            view.release()
+            return None
+        return view
+
+    def close(self):
+        try:
+            self._map.close()
+        except BufferError:
+            # A section view is still referenced (e.g. by a traceback); the mapping goes when it does
+            pass
+
+
+def encode_json(value: Any) -> bytes:
+    return json.dumps(value, separators=(',', ':')).encode()
+
+
+def decode_json(view: memoryview) -> Any:
+    return json.loads(bytes(view))
+
+
+def encode_known_users(guilds: Iterable[Tuple[int, array]]) -> bytes:
+    guilds = list(guilds)
+    parts = [KNOWN_USERS_HEADER.pack(len(guilds))]
+    parts.extend(KNOWN_USERS_ENTRY.pack(guild_id, len(ids)) for guild_id, ids in guilds)
+    for _, ids in guilds:
+        if sys.byteorder == 'big':
+            ids = array('q', ids)
+            ids.byteswap()
+        parts.append(ids.tobytes())
+    return b''.join(parts)
+
+
+def decode_known_users(view: memoryview) -> List[Tuple[int, array]]:
+    """Each guild's sorted user IDs, copied out of the view in one block per guild"""
+    (count,) = KNOWN_USERS_HEADER.unpack_from(view, 0)
+    offset = KNOWN_USERS_HEADER.size + count * KNOWN_USERS_ENTRY.size
+    guilds = []
+    for i in range(count):
+        guild_id, length = KNOWN_USERS_ENTRY.unpack_from(view, KNOWN_USERS_HEADER.size + i * KNOWN_USERS_ENTRY.size)
+        ids = array('q')
+        ids.frombytes(view[offset:offset + length * ids.itemsize])
+        if sys.byteorder == 'big':
+            ids.byteswap()
+        guilds.append((guild_id, ids))
+        offset += length * ids.itemsize
+    return guilds
+
+
+def encode_cache_entries(entries: Iterable[CacheEntry]) -> bytes:
+    parts = []
+    for guild_id, name, ttl, raw in entries:
+        name_bytes, raw_bytes = name.encode(), raw.encode()
+        parts.append(CACHE_ENTRY.pack(guild_id, -1.0 if ttl is None else ttl, len(name_bytes), len(raw_bytes)))
+        parts.append(name_bytes)
+        parts.append(raw_bytes)
+    return b''.join(parts)
+
+
+def decode_cache_entries(view: memoryview) -> List[CacheEntry]:
+    entries = []
+    offset = 0
+    while offset < len(view):
+        guild_id, ttl, name_length, raw_length = CACHE_ENTRY.unpack_from(view, offset)
+        offset += CACHE_ENTRY.size
+        name = bytes(view[offset:offset + name_length]).decode()
+        offset += name_length
+        raw = bytes(view[offset:offset + raw_length]).decode()
+        offset += raw_length
+        entries.append((guild_id, name, None if ttl < 0 else ttl, raw))
+    return entries
@@ -0,0 +1,100 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from typing import Optional
+
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def install_event_loop():
+    """Select the event loop implementation from EVENT_LOOP (asyncio or uvloop); call before bot.run"""
+    kind = os.getenv('EVENT_LOOP', 'asyncio').lower()
+    if kind == 'uvloop':
+        try:
+            import uvloop
+        except ImportError:
+            logger.warning("EVENT_LOOP=uvloop but uvloop is not installed, using the asyncio loop")
+            return
+        uvloop.install()
+        logger.info("Using the uvloop event loop")
+    elif kind != 'asyncio':
+        logger.warning("Unknown EVENT_LOOP '%s', using the asyncio loop", kind)
+
+
+class LoopWatchdog:
+    """Measures event-loop lag and reports what is blocking the loop when it stalls.
+
+    A task on the loop sleeps `interval` seconds at a time and records how
+    late each wake-up was as `loop.lag_ms`. A daemon thread checks the
+    task's heartbeat. If the heartbeat is more than `threshold` seconds
+    old, the loop is blocked, so the thread logs the loop thread's current
+    stack (the code that is holding it) once per stall.
+    """
+
+    def __init__(self, interval: float = 0.25, threshold: float = 0.5):
+        self.interval = interval
+        self.threshold = threshold
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._heartbeat = time.monotonic()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+
+    def start(self):
+        """Start measuring on the running loop if not already doing so"""
+        if self._task is not None and not self._task.done():
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._measure())
+        self._thread = threading.Thread(target=self._watch, name='loop-watchdog', daemon=True)
+        self._thread.start()
+
+    async def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._stop.set()
+
+    async def _measure(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            self._heartbeat = time.monotonic()
+            metrics.observe('loop.lag_ms', lag * 1000)
+            metrics.gauge('loop.lag_ms', lag * 1000)
+
+    def _watch(self):
+        reported = None
+        while not self._stop.wait(self.interval):
+            heartbeat = self._heartbeat
+            stalled = time.monotonic() - heartbeat
+            if stalled < self.threshold + self.interval or heartbeat == reported:
+                continue
+            reported = heartbeat
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = ''.join(traceback.format_stack(frame)) if frame is not None else '(no frame)\n'
+            # Counted on the loop itself once it is free again, not from this thread
+            if not self._loop.is_closed():
+                self._loop.call_soon_threadsafe(metrics.incr, 'loop.stalls')
+            logger.warning("Event loop blocked for %.0fms; loop thread is at:\n%s", stalled * 1000, stack)
+
+
+watchdog = LoopWatchdog(
+    interval=float(os.getenv('LOOP_WATCHDOG_INTERVAL_MS', 250)) / 1000,
+    threshold=float(os.getenv('LOOP_LAG_THRESHOLD_MS', 500)) / 1000,
+)